@@ -0,0 +1,57 @@
+"""
+Лимиты Telegram Bot API для всех запросов python-telegram-bot
+
+BotApiRateLimiter подключается к Application через builder().rate_limiter(...)
+и пропускает каждое сообщение через общий AsyncRateLimiter: ответы
+обработчиков (update.message.reply_text и т.п.) и рассылки заданий делят
+один лимит бота. Приоритет запроса передается в rate_limit_args
+(по умолчанию интерактивный), ответы 429 повторяются после retry_after.
+"""
+import logging
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from outbound import MAX_RETRIES, PRIORITY_INTERACTIVE, AsyncRateLimiter, get_retry_after
+
+logger = logging.getLogger(__name__)
+
+# Методы, отправляющие сообщения в чат: на них распространяются лимиты сообщений
+SENDING_METHODS = ('send', 'copyMessage', 'forwardMessage')
+
+ApiResult = Union[bool, Dict[str, Any], List[Dict[str, Any]]]
+
+
+class BotApiRateLimiter(BaseRateLimiter[int]):
+    """Ограничитель запросов Bot API на основе AsyncRateLimiter"""
+
+    def __init__(self, limiter: AsyncRateLimiter, max_retries: int = MAX_RETRIES):
+        self.limiter = limiter
+        self.max_retries = max_retries
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def process_request(self, callback: Callable[..., Coroutine[Any, Any, ApiResult]],
+                              args: Any, kwargs: Dict[str, Any], endpoint: str,
+                              data: Dict[str, Any], rate_limit_args: Optional[int]) -> ApiResult:
+        chat_id = data.get('chat_id')
+        # Служебные запросы (getUpdates, getFile) и чаты по @username не ограничиваются
+        if not (isinstance(chat_id, int) and endpoint.startswith(SENDING_METHODS)):
+            return await callback(*args, **kwargs)
+
+        priority = PRIORITY_INTERACTIVE if rate_limit_args is None else rate_limit_args
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(chat_id, priority)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                retry_after = get_retry_after(e)
+                logger.warning(f"Лимит Telegram для чата {chat_id}, повтор {endpoint} через {retry_after} с")
+                self.limiter.pause(chat_id, retry_after)
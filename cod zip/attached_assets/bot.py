@@ -1,25 +1,35 @@
 import logging
 import os
 import asyncio
+import signal
+import time
 import nest_asyncio
 from telegram.ext import Application
-from handlers import register_handlers
+from telegram.request import HTTPXRequest
+from handlers import register_handlers, db, on_startup, on_stop  # Общая с обработчиками база данных
+from config import BOT_API_URL, CONCURRENT_UPDATES, METRICS_HOST, METRICS_PORT
+from metrics import MetricsServer, observe_api_call
+from update_processor import ChatOrderedUpdateProcessor
+from api_rate_limiter import BotApiRateLimiter
+from outbound import AsyncRateLimiter
+from utils import reload_admin_ids, setup_logging
 from dotenv import load_dotenv
-from database import Database
-
-# Настройка логирования в файл и консоль
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-    handlers=[
-        logging.FileHandler('bot.log'),
-        logging.StreamHandler()
-    ]
-)
+
 logger = logging.getLogger(__name__)
 
-# Инициализация базы данных
-db = Database("bot_database.db")  # Явно указываем путь к файлу базы данных
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest с учетом длительности и ошибок вызовов Bot API"""
+
+    async def do_request(self, url, method, *args, **kwargs):
+        api_method = url.rsplit('/', 1)[-1]
+        started = time.perf_counter()
+        failed = True
+        try:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+            failed = code >= 400
+            return code, payload
+        finally:
+            observe_api_call(api_method, time.perf_counter() - started, failed=failed)
 
 class TelegramBot:
     """Основной класс бота"""
@@ -31,6 +41,7 @@ class TelegramBot:
 
         # Загрузка переменных окружения
         load_dotenv()
+        reload_admin_ids()
 
         self.token = os.environ.get('BOT_TOKEN')
         if not self.token:
@@ -38,15 +49,40 @@ class TelegramBot:
 
         self.app = None
         self._running = False
+        self.metrics_server = None
+
+    def build_application(self) -> Application:
+        """Создание приложения с зарегистрированными обработчиками"""
+        app = (
+            Application.builder()
+            .token(self.token)
+            .base_url(f"{BOT_API_URL}/bot")
+            .base_file_url(f"{BOT_API_URL}/file/bot")
+            # Длинные запросы getUpdates не учитываются в метриках вызовов API
+            .request(InstrumentedRequest(connection_pool_size=256))
+            # Обновления разных чатов обрабатываются параллельно, одного чата - по порядку
+            .concurrent_updates(ChatOrderedUpdateProcessor(CONCURRENT_UPDATES))
+            # Ответы обработчиков и рассылки делят лимиты Bot API, ответы отправляются первыми
+            .rate_limiter(BotApiRateLimiter(AsyncRateLimiter()))
+            .post_init(on_startup)
+            .post_stop(on_stop)
+            .build()
+        )
+        register_handlers(app)
+        return app
 
     async def start(self):
         """Запуск бота"""
         try:
-            # Инициализация приложения
-            self.app = Application.builder().token(self.token).build()
+            # Инициализация приложения с обработчиками из handlers.py
+            self.app = self.build_application()
+
+            # Список администраторов перечитывается по SIGHUP без перезапуска
+            if hasattr(signal, 'SIGHUP'):
+                signal.signal(signal.SIGHUP, self._reload_handler)
 
-            # Регистрация обработчиков из handlers.py
-            register_handlers(self.app)
+            if METRICS_PORT:
+                self.metrics_server = MetricsServer(METRICS_HOST, METRICS_PORT).start()
 
             # Запуск бота
             self._running = True
@@ -59,18 +95,30 @@ class TelegramBot:
             await self.stop()
             raise
 
+    def _reload_handler(self, signum, frame):
+        """Перечитывание списка администраторов по SIGHUP"""
+        logger.info(f"Получен сигнал {signum}, перечитываем список администраторов")
+        load_dotenv(override=True)
+        reload_admin_ids()
+
     async def stop(self):
         """Остановка бота"""
         try:
             if self.app and self._running:
                 logger.info("Останавливаем бота...")
+                # Недособранные альбомы и статусы доставки сохраняются до остановки приложения
+                await on_stop(self.app)
                 await self.app.stop()
                 self._running = False
+                if self.metrics_server:
+                    self.metrics_server.stop()
                 logger.info("Бот успешно остановлен")
         except Exception as e:
             logger.error(f"Ошибка при остановке бота: {e}", exc_info=True)
 
 if __name__ == "__main__":
+    # Настройка логирования в файл и консоль через фоновый поток
+    setup_logging()
     # Убедимся, что база данных инициализирована перед запуском бота
     try:
         db._ensure_database()
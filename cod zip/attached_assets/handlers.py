@@ -1,13 +1,30 @@
+import asyncio
 import logging
-from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
+import os
+import tempfile
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from telegram import InputMediaAudio, InputMediaDocument, InputMediaPhoto, InputMediaVideo, Update
+from telegram.error import TelegramError
 from telegram.ext import (
+    CallbackQueryHandler,
     ContextTypes, 
     CommandHandler, 
     MessageHandler, 
     filters
 )
-from database import Database
-from navigation_manager import NavigationManager
+from database import AsyncDatabase, Database
+from config import (
+    DB_PATH, DB_POOL_SIZE, DB_QUERY_LOG_SAMPLE_RATE, DB_SLOW_QUERY_MS, DB_STORAGE_PROFILE,
+    DELIVERY_CONCURRENCY, EXPORT_MAX_DOCUMENT_SIZE, LIST_PAGE_SIZE
+)
+from metrics import format_stats, instrument_handler, observe_query, record_handler_error
+from navigation_manager import NavigationManager, SQLiteStateStore
+from pagination import CALLBACK_PREFIX, decode_cursor, page_markup, render_page
+from media_registry import MediaRegistry
+from media_groups import MediaGroupBuffer, plan_delivery
+from delivery_status import DeliveryTracker
+from outbound import PRIORITY_BULK
+from report_export import EXPORT_USAGE, ArchiveTooLarge, ReportExporter, parse_export_args
 from constants import *
 from utils import (
     is_valid_report_format,
@@ -17,28 +34,43 @@ from utils import (
 )
 
 logger = logging.getLogger(__name__)
-db = Database("bot_database.db")  # Используем тот же путь, что и в bot.py
-nav_manager = NavigationManager()
-
+db = Database(
+    DB_PATH,
+    pool_size=DB_POOL_SIZE,
+    storage_profile=DB_STORAGE_PROFILE,
+    slow_query_threshold=DB_SLOW_QUERY_MS / 1000,
+    query_log_sample_rate=DB_QUERY_LOG_SAMPLE_RATE
+)
+db.add_query_observer(observe_query)
+# Обработчики работают с базой через асинхронный фасад, не блокируя цикл событий
+async_db = AsyncDatabase(db)
+# Файлы заданий и ответов: одна запись на уникальный файл Telegram
+media_registry = MediaRegistry(db)
+# Статусы получателей записываются в базу пачками в фоновой задаче
+delivery_tracker = DeliveryTracker(db)
+# Состояния навигации переживают перезапуск: кэш LRU в памяти, копия в таблице user_states
+nav_manager = NavigationManager(SQLiteStateStore(db))
+
+async def get_user_state(user_id: int) -> str:
+    """Текущее состояние пользователя; при промахе кэша оно читается из базы вне цикла событий"""
+    user_state = nav_manager.store.peek(user_id)
+    if user_state is not None:
+        return user_state.name
+    return await async_db.run(nav_manager.get_state, user_id)
+
+@instrument_handler('start')
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command"""
     try:
         logger.info(f"Получена команда /start от пользователя {update.effective_user.id}")
-        keyboard = [
-            [KeyboardButton("📝 Создать новое задание")],
-            [KeyboardButton("📋 Просмотр активных заданий")],
-            [KeyboardButton("👥 Просмотр списка подключенных чатов")],
-            [KeyboardButton("👥 Создать группу чатов")],
-            [KeyboardButton("⚙️ Настройки")],
-            [KeyboardButton("❓ Помощь")]
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-        await update.message.reply_text("Главное меню:", reply_markup=reply_markup)
+        await update.message.reply_text("Главное меню:", reply_markup=nav_manager.get_reply_markup('main_menu'))
         logger.info("Главное меню успешно отображено")
     except Exception as e:
         logger.error(f"Error in start command: {e}", exc_info=True)
         await error_handler(update, context)
 
+@nav_manager.route("❓ Помощь")
+@instrument_handler('help')
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /help command"""
     try:
@@ -49,6 +81,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Error in help command: {e}", exc_info=True)
         await error_handler(update, context)
 
+@instrument_handler('addchat')
 async def add_chat_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /addchat command"""
     try:
@@ -65,7 +98,7 @@ async def add_chat_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.info(f"Попытка добавления чата: ID={chat_id}, Title={chat_title}, Type={update.effective_chat.type}")
 
         # Проверяем, не добавлен ли уже этот чат
-        existing_chat = db.execute_query("SELECT chat_id FROM chats WHERE chat_id = ?", (chat_id,))
+        existing_chat = await async_db.fetch_one("SELECT chat_id FROM chats WHERE chat_id = ?", (chat_id,))
         if existing_chat:
             await update.message.reply_text(
                 "Этот чат уже подключен к боту.\n"
@@ -75,7 +108,7 @@ async def add_chat_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
 
         # Добавляем новый чат
-        db.execute_query(
+        await async_db.execute(
             "INSERT INTO chats (chat_id, title, is_group) VALUES (?, ?, ?)",
             (chat_id, chat_title, is_group)
         )
@@ -91,24 +124,24 @@ async def add_chat_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Error in add chat command: {e}", exc_info=True)
         await error_handler(update, context)
 
+@nav_manager.route("📝 Создать новое задание")
+@instrument_handler('create_task')
 async def create_task_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle task creation"""
     try:
         logger.info(f"Начало создания задания от пользователя {update.effective_user.id}")
-        context.user_data['state'] = 'awaiting_task_text'
-        keyboard = [
-            [KeyboardButton("🔙 Отмена")]
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+        await async_db.run(nav_manager.set_state, update.effective_user.id, 'awaiting_task_text')
         await update.message.reply_text(
             "Введите текст задания или отправьте файлы (фото/документы).\n"
             "Поддерживаемые форматы: pdf, doc, docx, xls, xlsx, txt",
-            reply_markup=reply_markup
+            reply_markup=nav_manager.get_reply_markup('awaiting_task_text')
         )
     except Exception as e:
         logger.error(f"Error in create task command: {e}", exc_info=True)
         await error_handler(update, context)
 
+@nav_manager.route("⚙️ Настройки")
+@instrument_handler('settings')
 async def settings_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle settings command"""
     try:
@@ -118,94 +151,66 @@ async def settings_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text(UNAUTHORIZED)
             return
 
-        keyboard = [
-            [KeyboardButton("👥 Управление чатами")],
-            [KeyboardButton("📊 Настройки уведомлений")],
-            [KeyboardButton("🔙 Назад")]
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-        await update.message.reply_text("Настройки:", reply_markup=reply_markup)
+        await async_db.run(nav_manager.set_state, update.effective_user.id, 'settings')
+        await update.message.reply_text("Настройки:", reply_markup=nav_manager.get_reply_markup('settings'))
     except Exception as e:
         logger.error(f"Error in settings command: {e}", exc_info=True)
         await error_handler(update, context)
 
+@nav_manager.route("👥 Создать группу чатов")
+@instrument_handler('create_chat_group')
 async def create_chat_group_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle chat group creation"""
     try:
         logger.info(f"Начало создания группы чатов пользователем {update.effective_user.id}")
-        context.user_data['state'] = 'creating_chat_group'
-        keyboard = [
-            [KeyboardButton("🔙 Отмена")]
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+        await async_db.run(nav_manager.set_state, update.effective_user.id, 'creating_chat_group')
         await update.message.reply_text(
             "Введите название для новой группы чатов:",
-            reply_markup=reply_markup
+            reply_markup=nav_manager.get_reply_markup('creating_chat_group')
         )
     except Exception as e:
         logger.error(f"Error in create chat group command: {e}", exc_info=True)
         await error_handler(update, context)
 
+@nav_manager.route("👥 Просмотр списка подключенных чатов")
+@instrument_handler('view_connected_chats')
 async def view_connected_chats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle viewing connected chats"""
     try:
         logger.info(f"Получена команда просмотра подключенных чатов от пользователя {update.effective_user.id}")
 
-        # Получаем список подключенных чатов из базы данных
-        chats = db.execute_query("""
-            SELECT chat_id, title, is_group, added_at
-            FROM chats
-            ORDER BY added_at DESC
-        """)
-
-        logger.info(f"Найдено чатов в базе данных: {len(chats) if chats else 0}")
-
-        if not chats:
-            await update.message.reply_text("Нет подключенных чатов. Используйте команду /addchat в чате или группе, чтобы добавить их в список.")
-            logger.info("Подключенные чаты не найдены")
-            return
-
-        # Формируем ответ с информацией о чатах
-        response = "👥 Подключенные чаты:\n\n"
-        for chat in chats:
-            chat_type = "Группа" if chat['is_group'] else "Личный чат"
-            response += f"• {chat['title']}\n"
-            response += f"  Тип: {chat_type}\n"
-            response += f"  ID: {chat['chat_id']}\n"
-            response += f"  Добавлен: {chat['added_at']}\n\n"
-
-        await update.message.reply_text(response)
+        text, reply_markup = await render_chats_page(update.effective_user.id)
+        await update.message.reply_text(text, reply_markup=reply_markup)
         logger.info("Список подключенных чатов успешно отправлен")
 
     except Exception as e:
         logger.error(f"Error in view connected chats command: {e}", exc_info=True)
         await error_handler(update, context)
 
+@nav_manager.route("🔙 Отмена", "🔙 Назад", "🏠 Главное меню")
+@instrument_handler('back_to_main_menu')
+async def back_to_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle cancel and back buttons"""
+    context.user_data.clear()  # Очищаем пользовательские данные
+    await async_db.run(nav_manager.reset_state, update.effective_user.id)
+    await start_command(update, context)
+
+@instrument_handler('text_message')
 async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle text messages"""
     try:
         message_text = update.message.text
         logger.info(f"Получено текстовое сообщение от пользователя {update.effective_user.id}: {message_text}")
 
-        # Обработка кнопок главного меню
-        if message_text == "📝 Создать новое задание":
-            await create_task_command(update, context)
-        elif message_text == "📋 Просмотр активных заданий":
-            await view_active_tasks_command(update, context)
-        elif message_text == "👥 Просмотр списка подключенных чатов":
-            await view_connected_chats_command(update, context)
-        elif message_text == "⚙️ Настройки":
-            await settings_command(update, context)
-        elif message_text == "❓ Помощь":
-            await help_command(update, context)
-        elif message_text == "👥 Создать группу чатов":
-            await create_chat_group_command(update, context)
-        elif message_text == "🔙 Отмена" or message_text == "🔙 Назад":
-            context.user_data.clear()  # Очищаем пользовательские данные
-            await start_command(update, context)
+        # Кнопки меню зарегистрированы в nav_manager декоратором route
+        state = await get_user_state(update.effective_user.id)
+        handler = nav_manager.resolve(state, message_text)
+        if handler is not None:
+            await handler(update, context)
+        elif state == 'awaiting_task_text':
+            await save_task_draft(update, context, [update.message])
         else:
-            # Логируем необработанное сообщение
-            logger.info(f"Необработанное сообщение: {update.to_dict()}")
+            logger.info(f"Необработанное сообщение в чате {update.effective_chat.id}")
             # Отправляем пользователю сообщение о том, что команда не распознана
             await update.message.reply_text(INVALID_COMMAND)
 
@@ -213,12 +218,216 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
         logger.error(f"Error handling text message: {e}", exc_info=True)
         await error_handler(update, context)
 
+# Классы элементов sendMediaGroup по типу файла
+INPUT_MEDIA = {
+    'photo': InputMediaPhoto,
+    'video': InputMediaVideo,
+    'document': InputMediaDocument,
+    'audio': InputMediaAudio,
+}
+
+def get_attachment(message) -> Optional[Dict[str, str]]:
+    """Файл сообщения для вложения задания или None"""
+    if message.photo:
+        photo = message.photo[-1]  # Наибольший из размеров фото
+        return {'file_unique_id': photo.file_unique_id, 'file_id': photo.file_id, 'file_type': 'photo'}
+    for file_type in ('document', 'video', 'audio'):
+        file = getattr(message, file_type)
+        if file is not None:
+            return {'file_unique_id': file.file_unique_id, 'file_id': file.file_id, 'file_type': file_type}
+    return None
+
+async def save_task_draft(update: Update, context: ContextTypes.DEFAULT_TYPE, messages: list):
+    """Сохранение задания из сообщений пользователя и переход к выбору получателей"""
+    user_id = update.effective_user.id
+    text = next((m.text or m.caption for m in messages if m.text or m.caption), '')
+    media = [item for item in map(get_attachment, messages) if item is not None]
+    task_id = await async_db.run(media_registry.create_task_with_media, text, user_id, media)
+
+    context.user_data['draft_task_id'] = task_id
+    await async_db.run(nav_manager.set_state, user_id, 'choosing_recipient_type')
+    await update.effective_message.reply_text(
+        f"Задание #{task_id} сохранено, вложений: {len(media)}.\nВыберите получателей:",
+        reply_markup=nav_manager.get_reply_markup('choosing_recipient_type')
+    )
+
+async def save_album_draft(media_group_id: str, items: list):
+    """Сохранение задания из всех файлов альбома"""
+    items.sort(key=lambda item: item[0].message.message_id)
+    update, context = items[0]
+    logger.info(f"Получен альбом {media_group_id} из {len(items)} файлов от пользователя {update.effective_user.id}")
+    try:
+        await save_task_draft(update, context, [item_update.message for item_update, _ in items])
+    except Exception as e:
+        logger.error(f"Error saving album {media_group_id}: {e}", exc_info=True)
+        await error_handler(update, context)
+
+# Файлы альбома приходят отдельными обновлениями и сохраняются одним заданием
+media_groups = MediaGroupBuffer(save_album_draft)
+
+@instrument_handler('attachment')
+async def handle_attachment(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle photos, videos, audio and documents"""
+    try:
+        message = update.message
+        state = await get_user_state(update.effective_user.id)
+        if state != 'awaiting_task_text':
+            if message.document is not None:
+                await handle_document(update, context)
+            else:
+                await log_unhandled_update(update, context)
+            return
+
+        if message.media_group_id:
+            media_groups.add(message.media_group_id, (update, context))
+            return
+        await save_task_draft(update, context, [message])
+
+    except Exception as e:
+        logger.error(f"Error handling attachment: {e}", exc_info=True)
+        await error_handler(update, context)
+
+async def send_task_messages(bot, chat_id: int, steps: list,
+                             on_sent: Callable[[int], Awaitable[Any]]) -> List[int]:
+    """Отправка сообщений задания, подготовленных plan_delivery, в один чат
+
+    on_sent вызывается с ID первого отправленного сообщения, если в плане
+    больше одного сообщения. Возвращает ID всех сообщений, включая каждое
+    сообщение альбома.
+    """
+    message_ids = []
+    # Рассылка уступает общий лимит бота ответам обработчиков (BotApiRateLimiter)
+    bulk = {'rate_limit_args': PRIORITY_BULK}
+    for index, (kind, payload) in enumerate(steps):
+        if kind == 'text':
+            sent = [await bot.send_message(chat_id, payload, **bulk)]
+        elif kind == 'single':
+            send = getattr(bot, f"send_{payload['file_type']}")
+            sent = [await send(chat_id, payload['file_id'], caption=payload.get('caption'), **bulk)]
+        else:
+            sent = await bot.send_media_group(chat_id, [
+                INPUT_MEDIA[item['file_type']](item['file_id'], caption=item.get('caption'))
+                for item in payload
+            ], **bulk)
+        message_ids.extend(message.message_id for message in sent)
+        if index == 0 and len(steps) > 1:
+            await on_sent(message_ids[0])
+    return message_ids
+
+async def deliver_task(bot, task_id: int, chat_ids: List[int]) -> Tuple[int, int]:
+    """Рассылка задания в чаты, возвращает число успешных и неудачных отправок"""
+    task = await async_db.fetch_one("SELECT text FROM tasks WHERE id = ?", (task_id,))
+    media = await async_db.run(db.get_task_media, task_id)
+    # План одинаков для всех чатов: альбом уходит одним sendMediaGroup на чат
+    steps = plan_delivery(task['text'] if task else '', media)
+    semaphore = asyncio.Semaphore(DELIVERY_CONCURRENCY)
+
+    async def mark(chat_id: int, status: str, message_id: Optional[int] = None) -> bool:
+        # mark читает статусы из базы, если задание вытеснено из памяти другой рассылкой
+        return await async_db.run(delivery_tracker.mark, task_id, chat_id, status, message_id)
+
+    def mark_delivered(chat_id: int, message_ids: List[int]) -> bool:
+        delivery_tracker.add_messages(task_id, chat_id, message_ids)
+        return delivery_tracker.mark(task_id, chat_id, 'delivered', message_ids[0] if message_ids else None)
+
+    async def send(chat_id: int) -> bool:
+        async with semaphore:
+            try:
+                message_ids = await send_task_messages(
+                    bot, chat_id, steps, lambda message_id: mark(chat_id, 'sent', message_id)
+                )
+            except TelegramError as e:
+                logger.error(f"Ошибка отправки задания {task_id} в чат {chat_id}: {e}")
+                await mark(chat_id, 'failed')
+                return False
+            await async_db.run(mark_delivered, chat_id, message_ids)
+            return True
+
+    results = await asyncio.gather(*(send(chat_id) for chat_id in chat_ids))
+    delivered = sum(results)
+    logger.info(f"Задание {task_id} отправлено в чаты: {delivered}, ошибок: {len(results) - delivered}")
+    return delivered, len(results) - delivered
+
+@nav_manager.route("👥 Все чаты", state='choosing_recipient_type')
+@instrument_handler('send_task_to_all_chats')
+async def send_task_to_all_chats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle sending the draft task to all connected chats"""
+    try:
+        user_id = update.effective_user.id
+        task_id = context.user_data.get('draft_task_id')
+        if not task_id:
+            logger.warning(f"Нет сохраненного задания для отправки у пользователя {user_id}")
+            await update.message.reply_text("Задание не найдено. Создайте новое задание.")
+            await back_to_main_menu(update, context)
+            return
+
+        chat_ids = await async_db.run(db.get_chat_ids)
+        if not chat_ids:
+            await update.message.reply_text("Нет подключенных чатов. Используйте команду /addchat в чате или группе.")
+            return
+
+        await async_db.run(db.add_task_recipients, task_id, chat_ids)
+        context.user_data.pop('draft_task_id', None)
+        await async_db.run(nav_manager.reset_state, user_id)
+        # Рассылка идет в фоне, ошибки передаются error_handler вместе с update
+        context.application.create_task(
+            broadcast_task(context.bot, task_id, chat_ids, update.effective_chat.id), update=update
+        )
+        await update.message.reply_text(
+            f"⏳ Отправляем задание #{task_id} в чаты: {len(chat_ids)}. Итоги придут отдельным сообщением.",
+            reply_markup=nav_manager.get_reply_markup('main_menu')
+        )
+
+    except Exception as e:
+        logger.error(f"Error sending task to all chats: {e}", exc_info=True)
+        await error_handler(update, context)
+
+async def broadcast_task(bot, task_id: int, chat_ids: List[int], report_chat_id: int):
+    """Фоновая рассылка задания и отчет о ней администратору"""
+    delivered, failed = await deliver_task(bot, task_id, chat_ids)
+    await bot.send_message(report_chat_id, f"✅ Задание #{task_id} отправлено в чаты: {delivered}, ошибок: {failed}")
+
+class ReplyToBotFilter(filters.MessageFilter):
+    """Ответы на сообщения этого бота"""
+
+    def filter(self, message) -> bool:
+        reply_to = message.reply_to_message
+        return (reply_to is not None and reply_to.from_user is not None
+                and reply_to.from_user.id == message.get_bot().id)
+
+REPLY_TO_BOT = ReplyToBotFilter(name='filters.REPLY_TO_BOT')
+
+@instrument_handler('task_response')
+async def handle_task_response(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle replies to task messages in recipient chats"""
+    try:
+        message = update.message
+        reply_to = message.reply_to_message
+        chat_id = update.effective_chat.id
+        # Ответ может прийти до записи пачки статусов: трекер проверяет и незаписанные сообщения
+        task_id = await async_db.run(delivery_tracker.find_task, chat_id, reply_to.message_id)
+        if task_id is None:
+            return
+
+        attachment = get_attachment(message)
+        if attachment is not None:
+            await async_db.run(media_registry.add_response_media, task_id, chat_id, **attachment)
+        if await async_db.run(delivery_tracker.mark, task_id, chat_id, 'responded'):
+            logger.info(f"Получен ответ на задание {task_id} из чата {chat_id}")
+            await message.reply_text(f"✅ Ответ на задание #{task_id} принят")
+
+    except Exception as e:
+        logger.error(f"Error handling task response: {e}", exc_info=True)
+        await error_handler(update, context)
+
+@instrument_handler('submit_report')
 async def submit_report_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /submit_report command"""
     try:
         logger.info(f"Получена команда /submit_report от пользователя {update.effective_user.id}")
         # Create task in database
-        task_id = db.create_task(
+        task_id = await async_db.run(
+            db.create_task,
             text="New report submission",
             creator_id=update.effective_user.id
         )
@@ -232,6 +441,7 @@ async def submit_report_command(update: Update, context: ContextTypes.DEFAULT_TY
         logger.error(f"Error in submit report command: {e}", exc_info=True)
         await error_handler(update, context)
 
+@instrument_handler('document')
 async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle document messages"""
     try:
@@ -257,11 +467,12 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("Error: No active task found")
             return
 
-        # Save file information using new database structure
-        db.execute_query(
-            "INSERT INTO task_media (task_id, file_id, file_type) VALUES (?, ?, ?)",
-            (task_id, document.file_id, 'document')
+        # Файл сохраняется в реестре по file_unique_id, повторная отправка не создает дубликат
+        added = await async_db.run(
+            media_registry.add_task_media, task_id, document.file_unique_id, document.file_id, 'document'
         )
+        if not added:
+            logger.info(f"Файл {document.file_unique_id} уже прикреплен к заданию {task_id}")
 
         context.user_data['awaiting_report'] = False
         await update.message.reply_text(REPORT_SUBMITTED)
@@ -271,35 +482,20 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Error handling document: {e}", exc_info=True)
         await error_handler(update, context)
 
+@instrument_handler('my_reports')
 async def my_reports_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /my_reports command"""
     try:
         logger.info(f"Получена команда /my_reports от пользователя {update.effective_user.id}")
-        # Get user's tasks from database
-        tasks = db.execute_query("""
-            SELECT t.*, tm.file_id, tm.file_type
-            FROM tasks t
-            LEFT JOIN task_media tm ON t.id = tm.task_id
-            WHERE t.creator_id = ?
-            ORDER BY t.created_at DESC
-        """, (update.effective_user.id,))
-
-        if not tasks:
-            await update.message.reply_text(NO_REPORTS_FOUND)
-            logger.info("Отчеты не найдены для пользователя")
-            return
-
-        response = "Your submitted reports:\n\n"
-        for task in tasks:
-            response += format_report_info(task) + "\n\n"
-
-        await update.message.reply_text(response)
+        text, reply_markup = await render_my_reports_page(update.effective_user.id)
+        await update.message.reply_text(text, reply_markup=reply_markup)
         logger.info(f"Отправлен список отчетов пользователю")
 
     except Exception as e:
         logger.error(f"Error in my reports command: {e}", exc_info=True)
         await error_handler(update, context)
 
+@instrument_handler('collect_reports')
 async def collect_reports_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /collect_reports command (admin only)"""
     try:
@@ -309,36 +505,68 @@ async def collect_reports_command(update: Update, context: ContextTypes.DEFAULT_
             await update.message.reply_text(UNAUTHORIZED)
             return
 
-        # Get all tasks with their media files
-        tasks = db.execute_query("""
-            SELECT t.*, u.username, tm.file_id, tm.file_type
-            FROM tasks t
-            LEFT JOIN users u ON t.creator_id = u.user_id
-            LEFT JOIN task_media tm ON t.id = tm.task_id
-            ORDER BY t.created_at DESC
-        """)
-
-        if not tasks:
-            await update.message.reply_text(NO_REPORTS_FOUND)
-            logger.info("Отчеты не найдены")
+        text, reply_markup = await render_all_reports_page(update.effective_user.id)
+        await update.message.reply_text(text, reply_markup=reply_markup)
+        logger.info("Отправлен список отчетов администратору")
+
+    except Exception as e:
+        logger.error(f"Error in collect reports command: {e}", exc_info=True)
+        await error_handler(update, context)
+
+@instrument_handler('export_reports')
+async def export_reports_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /export_reports command (admin only)"""
+    try:
+        logger.info(f"Получена команда /export_reports от пользователя {update.effective_user.id}")
+        if not is_admin(update.effective_user.id):
+            logger.warning(f"Попытка неавторизованного доступа к команде export_reports")
+            await update.message.reply_text(UNAUTHORIZED)
             return
 
-        response = "All submitted reports:\n\n"
-        current_task_id = None
-        for task in tasks:
-            if current_task_id != task['id']:
-                response += format_report_info(task) + "\n\n"
-                current_task_id = task['id']
+        try:
+            export_filters = parse_export_args(context.args or [])
+        except ValueError:
+            await update.message.reply_text(EXPORT_USAGE)
+            return
 
-        await update.message.reply_text(response)
-        logger.info("Отправлен полный список отчетов администратору")
+        await update.message.reply_text("⏳ Собираем архив отчетов...")
+
+        async def download(file_id: str, path: str) -> str:
+            telegram_file = await context.bot.get_file(file_id)
+            await telegram_file.download_to_drive(path)
+            return telegram_file.file_path
+
+        with tempfile.TemporaryDirectory(prefix='reports-') as tmp_dir:
+            archive_path = os.path.join(tmp_dir, 'reports.zip')
+            try:
+                stats = await ReportExporter(async_db, download).export(
+                    archive_path, max_size=EXPORT_MAX_DOCUMENT_SIZE, **export_filters
+                )
+            except ArchiveTooLarge:
+                await update.message.reply_text(
+                    f"Архив больше лимита отправки {EXPORT_MAX_DOCUMENT_SIZE // (1024 * 1024)} МБ. "
+                    f"Укажите задание или более узкий диапазон дат."
+                )
+                return
+            if not stats['files'] and not stats['failed']:
+                await update.message.reply_text(NO_REPORTS_FOUND)
+                return
+
+            with open(archive_path, 'rb') as archive:
+                await update.message.reply_document(
+                    archive,
+                    filename='reports.zip',
+                    caption=f"Файлов: {stats['files']}, не удалось загрузить: {stats['failed']}"
+                )
+        logger.info("Архив отчетов отправлен администратору")
 
     except Exception as e:
-        logger.error(f"Error in collect reports command: {e}", exc_info=True)
+        logger.error(f"Error in export reports command: {e}", exc_info=True)
         await error_handler(update, context)
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle errors"""
+    record_handler_error()
     logger.error(f"Update {update} caused error {context.error}")
     logger.error(f"Error details: {context.error}", exc_info=True)
     if update:
@@ -347,41 +575,97 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update and update.effective_message:
         await update.effective_message.reply_text("Произошла ошибка. Пожалуйста, попробуйте позже.")
 
+@nav_manager.route("📋 Просмотр активных заданий")
+@instrument_handler('view_active_tasks')
 async def view_active_tasks_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle viewing active tasks"""
     try:
         logger.info(f"Получена команда просмотра активных заданий от пользователя {update.effective_user.id}")
 
-        # Получаем активные задания из базы данных
-        tasks = db.execute_query("""
-            SELECT t.*, tm.file_id, tm.file_type
-            FROM tasks t
-            LEFT JOIN task_media tm ON t.id = tm.task_id
-            WHERE t.status = 'active'
-            ORDER BY t.created_at DESC
-        """)
+        text, reply_markup = await render_active_tasks_page(update.effective_user.id)
+        await update.message.reply_text(text, reply_markup=reply_markup)
+        logger.info("Список активных заданий успешно отправлен")
 
-        if not tasks:
-            await update.message.reply_text("Нет активных заданий")
-            logger.info("Активные задания не найдены")
+    except Exception as e:
+        logger.error(f"Error in view active tasks command: {e}", exc_info=True)
+        await error_handler(update, context)
+
+
+async def render_chats_page(user_id: int, cursor: Optional[tuple] = None,
+                            backward: bool = False) -> Tuple[str, Optional[str]]:
+    """Страница подключенных чатов: текст и inline-клавиатура"""
+    page = await async_db.run(db.get_chats_page, cursor, backward, LIST_PAGE_SIZE)
+    if not page.rows:
+        return "Нет подключенных чатов. Используйте команду /addchat в чате или группе, чтобы добавить их в список.", None
+    items = [
+        f"• {chat['title']}\n"
+        f"  Тип: {'Группа' if chat['is_group'] else 'Личный чат'}\n"
+        f"  ID: {chat['chat_id']}\n"
+        f"  Добавлен: {chat['added_at']}"
+        for chat in page.rows
+    ]
+    return render_page("👥 Подключенные чаты:", items), page_markup('c', page, 'added_at', 'chat_id')
+
+async def render_tasks_page(view: str, title: str, empty_text: str, cursor: Optional[tuple],
+                            backward: bool, **filters) -> Tuple[str, Optional[str]]:
+    """Страница заданий: текст и inline-клавиатура"""
+    page = await async_db.run(db.get_tasks_page, cursor, backward, LIST_PAGE_SIZE, **filters)
+    if not page.rows:
+        return empty_text, None
+    items = [format_report_info(task) for task in page.rows]
+    return render_page(title, items), page_markup(view, page, 'created_at', 'id')
+
+async def render_active_tasks_page(user_id: int, cursor: Optional[tuple] = None,
+                                   backward: bool = False) -> Tuple[str, Optional[str]]:
+    """Страница активных заданий"""
+    return await render_tasks_page('t', "📋 Активные задания:", "Нет активных заданий",
+                                   cursor, backward, status='active')
+
+async def render_my_reports_page(user_id: int, cursor: Optional[tuple] = None,
+                                 backward: bool = False) -> Tuple[str, Optional[str]]:
+    """Страница заданий пользователя"""
+    return await render_tasks_page('m', "Your submitted reports:", NO_REPORTS_FOUND,
+                                   cursor, backward, creator_id=user_id)
+
+async def render_all_reports_page(user_id: int, cursor: Optional[tuple] = None,
+                                  backward: bool = False) -> Tuple[str, Optional[str]]:
+    """Страница всех заданий (для администраторов)"""
+    return await render_tasks_page('r', "All submitted reports:", NO_REPORTS_FOUND, cursor, backward)
+
+# Постраничные списки: код в callback_data -> (функция страницы, только для администраторов)
+PAGE_VIEWS = {
+    'c': (render_chats_page, False),
+    't': (render_active_tasks_page, False),
+    'm': (render_my_reports_page, False),
+    'r': (render_all_reports_page, True),
+}
+
+@instrument_handler('page')
+async def handle_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle next/prev page buttons"""
+    try:
+        query = update.callback_query
+        try:
+            view, backward, cursor = decode_cursor(query.data)
+            render, admin_only = PAGE_VIEWS[view]
+        except (ValueError, KeyError):
+            logger.warning(f"Некорректная кнопка пагинации: {query.data!r}")
+            await query.answer()
             return
 
-        # Формируем ответ с информацией о заданиях
-        response = "📋 Активные задания:\n\n"
-        current_task_id = None
-        for task in tasks:
-            if current_task_id != task['id']:
-                response += format_report_info(task) + "\n\n"
-                current_task_id = task['id']
+        if admin_only and not is_admin(query.from_user.id):
+            await query.answer(UNAUTHORIZED)
+            return
 
-        await update.message.reply_text(response)
-        logger.info("Список активных заданий успешно отправлен")
+        text, reply_markup = await render(query.from_user.id, cursor, backward)
+        await query.answer()
+        await query.edit_message_text(text, reply_markup=reply_markup)
 
     except Exception as e:
-        logger.error(f"Error in view active tasks command: {e}", exc_info=True)
+        logger.error(f"Error in page callback: {e}", exc_info=True)
         await error_handler(update, context)
 
-
+@instrument_handler('debug_db')
 async def debug_db_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /debug_db command (admin only)"""
     try:
@@ -391,24 +675,15 @@ async def debug_db_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text(UNAUTHORIZED)
             return
 
-        # Проверяем таблицы
-        tables = {
-            'chats': db.execute_query("SELECT COUNT(*) as count FROM chats"),
-            'chat_groups': db.execute_query("SELECT COUNT(*) as count FROM chat_groups"),
-            'tasks': db.execute_query("SELECT COUNT(*) as count FROM tasks")
-        }
+        # Число записей читается из материализованных счетчиков, без COUNT(*) по таблицам
+        totals = await async_db.run(db.get_totals)
 
         response = "📊 Статистика базы данных:\n\n"
-        for table_name, count in tables.items():
-            response += f"• {table_name}: {count[0]['count']} записей\n"
+        for table_name in ('chats', 'chat_groups', 'tasks'):
+            response += f"• {table_name}: {totals[table_name]} записей\n"
 
         # Получаем последние добавленные чаты
-        recent_chats = db.execute_query("""
-            SELECT chat_id, title, is_group, added_at
-            FROM chats
-            ORDER BY added_at DESC
-            LIMIT 5
-        """)
+        recent_chats = (await async_db.run(db.get_chats_page, None, False, 5)).rows
 
         if recent_chats:
             response += "\n🆕 Последние добавленные чаты:\n"
@@ -423,6 +698,113 @@ async def debug_db_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Error in debug_db command: {e}", exc_info=True)
         await error_handler(update, context)
 
+@nav_manager.route("📊 Статистика", state='settings')
+@instrument_handler('statistics')
+async def statistics_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle statistics menu (admin only)"""
+    try:
+        if not is_admin(update.effective_user.id):
+            await update.message.reply_text(UNAUTHORIZED)
+            return
+        await async_db.run(nav_manager.set_state, update.effective_user.id, 'statistics')
+        await update.message.reply_text(
+            nav_manager.menu_states['statistics']['text'],
+            reply_markup=nav_manager.get_reply_markup('statistics')
+        )
+    except Exception as e:
+        logger.error(f"Error in statistics command: {e}", exc_info=True)
+        await error_handler(update, context)
+
+@nav_manager.route("📈 Общая статистика", state='statistics')
+@instrument_handler('total_statistics')
+async def total_statistics_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle total statistics (admin only)"""
+    try:
+        if not is_admin(update.effective_user.id):
+            await update.message.reply_text(UNAUTHORIZED)
+            return
+        totals = await async_db.run(db.get_totals)
+        await update.message.reply_text(
+            "📈 Общая статистика:\n\n"
+            f"• Подключенных чатов: {totals['chats']}\n"
+            f"• Групп чатов: {totals['chat_groups']}\n"
+            f"• Заданий всего: {totals['tasks']}\n"
+            f"• Активных заданий: {totals['active_tasks']}"
+        )
+    except Exception as e:
+        logger.error(f"Error in total statistics command: {e}", exc_info=True)
+        await error_handler(update, context)
+
+@nav_manager.route("📊 Активные задания", state='statistics')
+@instrument_handler('active_tasks_statistics')
+async def active_tasks_statistics_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle recipient statistics of the latest active tasks (admin only)"""
+    try:
+        if not is_admin(update.effective_user.id):
+            await update.message.reply_text(UNAUTHORIZED)
+            return
+        page = await async_db.run(db.get_tasks_page, None, False, LIST_PAGE_SIZE, status='active')
+        if not page.rows:
+            await update.message.reply_text("Нет активных заданий")
+            return
+
+        counts = await async_db.run(db.get_recipient_counts, [task['id'] for task in page.rows])
+        items = []
+        for task in page.rows:
+            task_counts = counts[task['id']]
+            items.append(
+                f"• Задание #{task['id']} от {task['created_at']}\n"
+                f"  Получателей: {sum(task_counts.values())}, "
+                f"ожидают: {task_counts.get('pending', 0)}, "
+                f"доставлено: {task_counts.get('sent', 0) + task_counts.get('delivered', 0)}, "
+                f"ошибок: {task_counts.get('failed', 0)}, "
+                f"ответили: {task_counts.get('responded', 0)}"
+            )
+        await update.message.reply_text(render_page("📊 Активные задания:", items))
+    except Exception as e:
+        logger.error(f"Error in active tasks statistics command: {e}", exc_info=True)
+        await error_handler(update, context)
+
+@instrument_handler('stats')
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /stats command (admin only)"""
+    try:
+        logger.info(f"Получена команда /stats от пользователя {update.effective_user.id}")
+        if not is_admin(update.effective_user.id):
+            logger.warning(f"Попытка неавторизованного доступа к stats")
+            await update.message.reply_text(UNAUTHORIZED)
+            return
+
+        await update.message.reply_text(format_stats())
+
+    except Exception as e:
+        logger.error(f"Error in stats command: {e}", exc_info=True)
+        await error_handler(update, context)
+
+async def log_unhandled_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Log updates not matched by other handlers"""
+    # Полное содержимое обновления сериализуется только при включенном DEBUG
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Received update: %s", update.to_dict())
+    else:
+        logger.info(f"Received unhandled update {update.update_id}")
+
+# Фоновые задачи приложения, запущенные в on_startup
+background_tasks: List[asyncio.Task] = []
+
+async def on_startup(application):
+    """Запуск фоновой записи статусов доставки"""
+    background_tasks.append(asyncio.create_task(delivery_tracker.run(async_db.run)))
+
+async def on_stop(application):
+    """Сохранение недособранных альбомов и несохраненных статусов доставки"""
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    await media_groups.drain()
+    await async_db.run(delivery_tracker.flush)
+
 def register_handlers(application):
     """Register all handlers"""
     try:
@@ -434,22 +816,30 @@ def register_handlers(application):
         application.add_handler(CommandHandler("my_reports", my_reports_command))
         application.add_handler(CommandHandler("collect_reports", collect_reports_command))
         application.add_handler(CommandHandler("debug_db", debug_db_command))  # Добавляем новый обработчик
+        application.add_handler(CommandHandler("stats", stats_command))
+        application.add_handler(CommandHandler("export_reports", export_reports_command))
+        application.add_handler(CallbackQueryHandler(handle_page_callback, pattern=f"^{CALLBACK_PREFIX}:"))
 
         # Message handlers
-        application.add_handler(MessageHandler(filters.Document.ALL, handle_document))
+        application.add_handler(MessageHandler(
+            filters.PHOTO | filters.VIDEO | filters.AUDIO | filters.Document.ALL, handle_attachment
+        ))
         application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text_message))
 
         # Add handler for logging all messages
-        application.add_handler(MessageHandler(
-            filters.ALL, 
-            lambda update, context: logger.info(f"Received update: {update.to_dict()}")
-        ))
+        application.add_handler(MessageHandler(filters.ALL, log_unhandled_update))
+
+        # Ответы в чатах получателей на сообщения бота: отдельная группа,
+        # поэтому ответы не перехватываются у остальных обработчиков
+        application.add_handler(
+            MessageHandler(filters.ChatType.GROUPS & REPLY_TO_BOT, handle_task_response), group=1
+        )
 
         # Error handler
         application.add_error_handler(error_handler)
 
         logger.info("Handlers registered successfully")
-        logger.info("Registered commands: /start, /help, /addchat, /submit_report, /my_reports, /collect_reports, /debug_db")
+        logger.info("Registered commands: /start, /help, /addchat, /submit_report, /my_reports, /collect_reports, /debug_db, /stats, /export_reports")
     except Exception as e:
         logger.error(f"Error registering handlers: {e}", exc_info=True)
         raise
\ No newline at end of file
@@ -1,11 +1,199 @@
 """
 Менеджер навигации для отслеживания состояний и истории перемещений в меню
 """
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import NAV_STATE_CACHE_SIZE, NAV_STATE_TTL
+
+logger = logging.getLogger(__name__)
+
+# Постоянные идентификаторы состояний для компактного хранения - индекс в кортеже.
+# Новые состояния добавляются только в конец
+STATES = (
+    'main_menu',
+    'settings',
+    'awaiting_task_text',
+    'choosing_recipient_type',
+    'selecting_recipients',
+    'creating_chat_group',
+    'adding_chats_to_group',
+    'statistics',
+)
+STATE_IDS = {name: state_id for state_id, name in enumerate(STATES)}
+# Число последних состояний в истории навигации
+HISTORY_SIZE = 10
+# Язык меню по умолчанию; для других языков без своих определений используется он же
+DEFAULT_LOCALE = 'ru'
+# Минимальный интервал между удалениями устаревших состояний (в секундах)
+PURGE_INTERVAL = 3600
+
+# Обработчик кнопки меню: корутина (update, context) в python-telegram-bot
+# или функция (message) в pyTelegramBotAPI
+MenuHandler = Callable[..., Any]
+
+class UserState:
+    """Состояние навигации пользователя: идентификатор состояния и история переходов"""
+    __slots__ = ('state', 'history', 'updated_at')
+
+    def __init__(self, state: int = 0, history: bytes = b'', updated_at: float = 0.0):
+        self.state = state
+        # По одному байту на состояние, не более HISTORY_SIZE последних
+        self.history = bytearray(history)
+        self.updated_at = updated_at
+
+    @property
+    def name(self) -> str:
+        """Название текущего состояния"""
+        return STATES[self.state]
+
+    def push(self, state: int) -> None:
+        """Переход в состояние с добавлением его в историю"""
+        self.state = state
+        history = self.history
+        # Не добавляем повторяющиеся состояния подряд
+        if not history or history[-1] != state:
+            history.append(state)
+            if len(history) > HISTORY_SIZE:
+                del history[0]
+
+    def pop(self) -> None:
+        """Возврат к предыдущему состоянию из истории"""
+        if self.history:
+            del self.history[-1]
+        self.state = self.history[-1] if self.history else 0
+
+
+class StateStore:
+    """Хранилище состояний навигации в памяти процесса с вытеснением LRU и TTL
+
+    Состояния пользователей, не менявшиеся дольше ttl секунд, считаются
+    сброшенными. Наследники сохраняют состояния во внешнем хранилище,
+    переопределяя _load, _save, _delete и _purge.
+    """
+
+    def __init__(self, cache_size: int = NAV_STATE_CACHE_SIZE, ttl: float = NAV_STATE_TTL,
+                 clock: Callable[[], float] = time.time):
+        if cache_size < 1:
+            raise ValueError("Размер кэша состояний должен быть не меньше 1")
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self._clock = clock
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_purge = clock()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def peek(self, user_id: int) -> Optional[UserState]:
+        """Состояние из кэша без обращения к хранилищу или None"""
+        with self._lock:
+            user_state = self._cache.get(user_id)
+            if user_state is not None:
+                self._cache.move_to_end(user_id)
+        if user_state is not None and self._expired(user_state):
+            return None
+        return user_state
+
+    def get(self, user_id: int) -> UserState:
+        """Состояние пользователя; отсутствующее или устаревшее заменяется новым"""
+        user_state = self.peek(user_id)
+        if user_state is not None:
+            return user_state
+        user_state = self._load(user_id)
+        if user_state is None or self._expired(user_state):
+            user_state = UserState(updated_at=self._clock())
+        self._remember(user_id, user_state)
+        return user_state
+
+    def save(self, user_id: int, user_state: UserState) -> None:
+        """Сохранение измененного состояния пользователя"""
+        now = self._clock()
+        user_state.updated_at = now
+        self._remember(user_id, user_state)
+        self._save(user_id, user_state)
+        if now - self._last_purge >= PURGE_INTERVAL:
+            self.purge_expired()
+
+    def delete(self, user_id: int) -> None:
+        """Сброс состояния пользователя"""
+        with self._lock:
+            self._cache.pop(user_id, None)
+        self._delete(user_id)
+
+    def purge_expired(self) -> int:
+        """Удаление устаревших состояний из кэша и хранилища"""
+        now = self._clock()
+        self._last_purge = now
+        expired_before = now - self.ttl
+        with self._lock:
+            expired = [user_id for user_id, user_state in self._cache.items()
+                       if user_state.updated_at < expired_before]
+            for user_id in expired:
+                del self._cache[user_id]
+        removed = self._purge(expired_before)
+        logger.info(f"Удалено устаревших состояний навигации: в памяти {len(expired)}, в хранилище {removed}")
+        return removed
+
+    def _expired(self, user_state: UserState) -> bool:
+        return user_state.updated_at < self._clock() - self.ttl
+
+    def _remember(self, user_id: int, user_state: UserState) -> None:
+        with self._lock:
+            self._cache[user_id] = user_state
+            self._cache.move_to_end(user_id)
+            # Вытесняем давно не использовавшиеся состояния
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _load(self, user_id: int) -> Optional[UserState]:
+        return None
+
+    def _save(self, user_id: int, user_state: UserState) -> None:
+        pass
+
+    def _delete(self, user_id: int) -> None:
+        pass
+
+    def _purge(self, expired_before: float) -> int:
+        return 0
+
+
+class SQLiteStateStore(StateStore):
+    """Хранилище состояний навигации в таблице user_states с кэшем LRU в памяти"""
+
+    def __init__(self, db, **kwargs):
+        super().__init__(**kwargs)
+        self.db = db
+
+    def _load(self, user_id: int) -> Optional[UserState]:
+        row = self.db.load_user_state(user_id)
+        if row is None:
+            return None
+        return UserState(row['state'], row['history'], row['updated_at'])
+
+    def _save(self, user_id: int, user_state: UserState) -> None:
+        self.db.save_user_state(user_id, user_state.state, bytes(user_state.history), user_state.updated_at)
+
+    def _delete(self, user_id: int) -> None:
+        self.db.delete_user_state(user_id)
+
+    def _purge(self, expired_before: float) -> int:
+        return self.db.delete_idle_user_states(expired_before)
+
 
 class NavigationManager:
     """Менеджер навигации для отслеживания состояний и истории перемещений в меню"""
 
-    def __init__(self):
+    def __init__(self, store: Optional[StateStore] = None):
+        # Состояния пользователей; по умолчанию хранятся только в памяти процесса
+        self.store = store if store is not None else StateStore()
+        # Определения меню на языке по умолчанию
         self.menu_states = {
             'main_menu': {
                 'keyboard': [
@@ -21,6 +209,7 @@ class NavigationManager:
                 'keyboard': [
                     ["👥 Управление чатами", "🔔 Уведомления"],
                     ["🔐 Права доступа", "⚙️ Конфигурация"],
+                    ["📊 Статистика"],
                     ["🔙 Назад", "🏠 Главное меню"]
                 ],
                 'text': "⚙️ Настройки бота\nВыберите раздел настроек:"
@@ -68,6 +257,68 @@ class NavigationManager:
                 'text': "📊 Выберите тип статистики:"
             }
         }
+        # Определения меню по языкам
+        self._menus: Dict[str, Dict[str, dict]] = {DEFAULT_LOCALE: self.menu_states}
+        # (состояние, язык) -> JSON разметки клавиатуры, готовый к отправке
+        self._markup_cache: Dict[Tuple[str, str], str] = {}
+        # Маршруты кнопок: состояние -> текст кнопки -> обработчик.
+        # Ключ None - кнопки, доступные в любом состоянии
+        self._routes: Dict[Optional[str], Dict[str, MenuHandler]] = {None: {}}
+
+    def route(self, *texts: str, state: Optional[str] = None):
+        """Декоратор, регистрирующий обработчик кнопок меню"""
+        def decorator(handler: MenuHandler) -> MenuHandler:
+            for text in texts:
+                self.add_route(text, handler, state)
+            return handler
+        return decorator
+
+    def add_route(self, text: str, handler: MenuHandler, state: Optional[str] = None) -> None:
+        """Регистрация обработчика кнопки text в состоянии state"""
+        routes = self._routes.setdefault(state, {})
+        if text in routes:
+            raise ValueError(f"Кнопка {text!r} уже зарегистрирована для состояния {state!r}")
+        routes[text] = handler
+        if state is not None and not self._has_button(state, text):
+            logger.warning(f"Кнопка {text!r} отсутствует в клавиатуре состояния {state!r}")
+
+    def _has_button(self, state: str, text: str) -> bool:
+        keyboard = self.menu_states.get(state, {}).get('keyboard', ())
+        return any(text in row for row in keyboard)
+
+    def resolve(self, state: Optional[str], text: str) -> Optional[MenuHandler]:
+        """Обработчик кнопки с учетом текущего состояния или None"""
+        if state is not None:
+            state_routes = self._routes.get(state)
+            if state_routes is not None:
+                handler = state_routes.get(text)
+                if handler is not None:
+                    return handler
+        return self._routes[None].get(text)
+
+    def get_state(self, user_id: int) -> str:
+        """Текущее состояние пользователя"""
+        return self.store.get(user_id).name
+
+    def set_state(self, user_id: int, state: str) -> None:
+        """Переход пользователя в состояние state"""
+        state_id = STATE_IDS.get(state)
+        if state_id is None:
+            raise ValueError(f"Неизвестное состояние навигации: {state}")
+        user_state = self.store.get(user_id)
+        user_state.push(state_id)
+        self.store.save(user_id, user_state)
+
+    def go_back(self, user_id: int) -> str:
+        """Возврат пользователя к предыдущему состоянию"""
+        user_state = self.store.get(user_id)
+        user_state.pop()
+        self.store.save(user_id, user_state)
+        return user_state.name
+
+    def reset_state(self, user_id: int) -> None:
+        """Возврат пользователя в главное меню с очисткой истории"""
+        self.store.delete(user_id)
 
     def get_previous_state(self, user_data: dict) -> str:
         """Определяет предыдущее состояние на основе истории навигации"""
@@ -87,6 +338,32 @@ class NavigationManager:
             return self.menu_states[state]['keyboard'], self.menu_states[state]['text']
         return None, "Выберите действие:"
 
+    def get_reply_markup(self, state: str, locale: str = DEFAULT_LOCALE) -> Optional[str]:
+        """JSON разметки клавиатуры состояния для параметра reply_markup
+
+        Разметка сериализуется один раз; Bot API принимает reply_markup
+        строкой JSON, поэтому библиотеки отправляют ее без повторной сериализации.
+        """
+        key = (state, locale)
+        markup = self._markup_cache.get(key)
+        if markup is None:
+            menu = self._menus.get(locale, {}).get(state) or self.menu_states.get(state)
+            if menu is None:
+                return None
+            markup = json.dumps({
+                'keyboard': [[{'text': text} for text in row] for row in menu['keyboard']],
+                'resize_keyboard': True
+            }, ensure_ascii=False, separators=(',', ':'))
+            self._markup_cache[key] = markup
+        return markup
+
+    def set_menu(self, state: str, keyboard: List[List[str]], text: str, locale: str = DEFAULT_LOCALE) -> None:
+        """Изменение определения меню со сбросом кэша его разметки"""
+        self._menus.setdefault(locale, {})[state] = {'keyboard': keyboard, 'text': text}
+        # Разметка состояния на других языках могла быть построена по этому определению
+        for key in [key for key in self._markup_cache if key[0] == state]:
+            del self._markup_cache[key]
+
     def clear_user_state(self, user_data: dict) -> None:
         """Очищает данные пользовательской сессии, сохраняя важные данные"""
         if not user_data:
@@ -99,7 +376,7 @@ class NavigationManager:
 
     def add_to_history(self, user_data: dict, state: str) -> None:
         """Добавляет состояние в историю навигации"""
-        if not user_data:
+        if user_data is None:
             return
 
         if 'navigation_history' not in user_data:
@@ -117,4 +394,4 @@ class NavigationManager:
         """Получает последнее состояние из истории"""
         if user_data and 'navigation_history' in user_data and user_data['navigation_history']:
             return user_data['navigation_history'][-1]
-        return 'main_menu'
\ No newline at end of file
+        return 'main_menu'
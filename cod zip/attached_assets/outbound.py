@@ -0,0 +1,449 @@
+"""
+Планировщик исходящих сообщений с учетом лимитов Telegram Bot API
+
+Лимиты задаются корзинами токенов: общая на бота (~30 сообщений/с),
+на каждый чат (~1 сообщение/с) и на каждую группу (~20 сообщений/мин).
+Интерактивные ответы отправляются раньше массовых рассылок, ответы 429
+повторяются после паузы retry_after. Те же лимиты для отправки из цикла
+событий asyncio (python-telegram-bot) соблюдает AsyncRateLimiter.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from metrics import observe_api_call
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты: меньшее значение отправляется раньше
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+GLOBAL_RATE = 30.0         # Сообщений в секунду на бота
+CHAT_RATE = 1.0            # Сообщений в секунду в один чат
+CHAT_BURST = 3             # Короткая серия ответов в один чат без задержки
+GROUP_RATE = 20 / 60.0     # Сообщений в секунду в одну группу
+GROUP_BURST = 20
+MAX_RETRIES = 5            # Повторы после ответа 429
+SEND_WORKERS = 8           # Параллельные HTTP-запросы к Bot API
+# Период очистки неиспользуемых корзин токенов (в секундах)
+PRUNE_INTERVAL = 60.0
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше capacity"""
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Время до появления токена (0, если токен доступен)"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self, now: float):
+        """Списание токена"""
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        """Корзина полностью восстановилась"""
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Пауза из ответа 429 Too Many Requests, если это он"""
+    # python-telegram-bot: telegram.error.RetryAfter
+    retry_after = getattr(error, 'retry_after', None)
+    if retry_after is not None:
+        return float(retry_after)
+
+    # pyTelegramBotAPI: ApiTelegramException с result_json
+    if getattr(error, 'error_code', None) == 429:
+        result_json = getattr(error, 'result_json', None) or {}
+        return float(result_json.get('parameters', {}).get('retry_after', 1))
+    return None
+
+
+class RateLimits:
+    """Корзины токенов бота, чатов и групп и паузы чатов после ответа 429 (без блокировок)"""
+
+    def __init__(self, global_rate: float, chat_rate: float, chat_burst: float,
+                 group_rate: float, group_burst: float, now: float):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self._global = TokenBucket(global_rate, global_rate, now)
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._group_buckets: Dict[int, TokenBucket] = {}
+        self._paused_until: Dict[int, float] = {}
+
+    def global_wait(self, now: float) -> float:
+        """Время до разрешения отправки по общему лимиту бота"""
+        return self._global.wait_time(now)
+
+    def chat_wait(self, chat_id: int, now: float) -> float:
+        """Время до разрешения отправки в чат с учетом retry_after и лимитов чата/группы"""
+        wait = 0.0
+        paused_until = self._paused_until.get(chat_id)
+        if paused_until is not None:
+            if paused_until > now:
+                wait = paused_until - now
+            else:
+                del self._paused_until[chat_id]
+
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, now)
+        wait = max(wait, bucket.wait_time(now))
+
+        # Отрицательные ID принадлежат группам, супергруппам и каналам
+        if chat_id < 0:
+            group_bucket = self._group_buckets.get(chat_id)
+            if group_bucket is None:
+                group_bucket = self._group_buckets[chat_id] = TokenBucket(
+                    self.group_rate, self.group_burst, now
+                )
+            wait = max(wait, group_bucket.wait_time(now))
+        return wait
+
+    def consume(self, chat_id: int, now: float):
+        """Списание токенов за сообщение в чат (после chat_wait)"""
+        self._global.consume(now)
+        self._chat_buckets[chat_id].consume(now)
+        if chat_id < 0:
+            self._group_buckets[chat_id].consume(now)
+
+    def pause(self, chat_id: int, until: float):
+        """Пауза отправки в чат до момента until после ответа 429"""
+        self._paused_until[chat_id] = max(until, self._paused_until.get(chat_id, until))
+
+    def prune(self, now: float, keep=()):
+        """Удаление восстановившихся корзин чатов, кроме чатов из keep"""
+        for buckets in (self._chat_buckets, self._group_buckets):
+            for chat_id in [c for c, b in buckets.items() if c not in keep and b.is_full(now)]:
+                del buckets[chat_id]
+
+
+class AsyncRateLimiter:
+    """Лимиты Bot API для отправки из цикла событий asyncio
+
+    Массовые сообщения уступают общий лимит бота интерактивным ответам,
+    которым мешает только он (лимит их чата уже позволяет отправку).
+    """
+
+    def __init__(self, global_rate: float = GLOBAL_RATE, chat_rate: float = CHAT_RATE,
+                 chat_burst: float = CHAT_BURST, group_rate: float = GROUP_RATE,
+                 group_burst: float = GROUP_BURST):
+        now = time.monotonic()
+        self._limits = RateLimits(global_rate, chat_rate, chat_burst, group_rate, group_burst, now)
+        self._last_prune = now
+        self._token_interval = 1 / global_rate
+        # Интерактивные ответы, ожидающие только общего лимита
+        self._ready_interactive = 0
+
+    async def acquire(self, chat_id: int, priority: int = PRIORITY_INTERACTIVE):
+        """Ожидание разрешения на одно сообщение в чат chat_id"""
+        ready = False
+        try:
+            while True:
+                now = time.monotonic()
+                if now - self._last_prune >= PRUNE_INTERVAL:
+                    self._limits.prune(now)
+                    self._last_prune = now
+                chat_wait = self._limits.chat_wait(chat_id, now)
+                global_wait = self._limits.global_wait(now)
+                if priority == PRIORITY_INTERACTIVE and ready != (chat_wait <= 0):
+                    ready = not ready
+                    self._ready_interactive += 1 if ready else -1
+
+                wait = max(chat_wait, global_wait)
+                if wait <= 0:
+                    if priority == PRIORITY_INTERACTIVE or not self._ready_interactive:
+                        self._limits.consume(chat_id, now)
+                        return
+                    # Токен достается ожидающему интерактивному ответу
+                    wait = self._token_interval
+                await asyncio.sleep(wait)
+        finally:
+            if ready:
+                self._ready_interactive -= 1
+
+    def pause(self, chat_id: int, retry_after: float):
+        """Пауза отправки в чат на retry_after секунд после ответа 429"""
+        self._limits.pause(chat_id, time.monotonic() + retry_after)
+
+
+class _Job:
+    """Исходящий запрос к Bot API"""
+    __slots__ = ('priority', 'seq', 'func', 'args', 'kwargs', 'chat_id', 'future', 'attempts')
+
+    def __init__(self, priority: int, seq: int, func: Callable[..., Any],
+                 args: tuple, kwargs: dict, chat_id: int):
+        self.priority = priority
+        self.seq = seq
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.chat_id = chat_id
+        self.future: Future = Future()
+        self.attempts = 0
+
+    def __lt__(self, other: '_Job') -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class OutboundScheduler:
+    """Очередь исходящих сообщений с корзинами токенов и приоритетами"""
+
+    def __init__(self, global_rate: float = GLOBAL_RATE, chat_rate: float = CHAT_RATE,
+                 chat_burst: float = CHAT_BURST, group_rate: float = GROUP_RATE,
+                 group_burst: float = GROUP_BURST, max_retries: int = MAX_RETRIES,
+                 send_workers: int = SEND_WORKERS):
+        now = time.monotonic()
+        self.max_retries = max_retries
+
+        self._cond = threading.Condition()
+        self._limits = RateLimits(global_rate, chat_rate, chat_burst, group_rate, group_burst, now)
+        self._last_prune = now
+
+        # Очередь каждого чата упорядочена по (приоритет, порядок постановки).
+        # Чаты с ожидающими сообщениями стоят в куче готовых или отложенных;
+        # устаревшие записи куч пропускаются по номеру в _scheduled.
+        self._chat_jobs: Dict[int, List[_Job]] = {}
+        self._ready: List[Tuple[int, int, int]] = []
+        self._delayed: List[Tuple[float, int, int]] = []
+        self._scheduled: Dict[int, Tuple[int, int]] = {}
+        self._seq = itertools.count()
+        # Чаты с сообщением в отправке: следующее сообщение чата ждет ее
+        # завершения, иначе рабочие потоки могут доставить их не по порядку
+        self._busy: Set[int] = set()
+
+        self._pending = {PRIORITY_INTERACTIVE: 0, PRIORITY_BULK: 0}
+        self._in_flight = 0
+        self._sent = 0
+        self._retried = 0
+        self._failed = 0
+
+        self._running = True
+        self._executor = ThreadPoolExecutor(max_workers=send_workers, thread_name_prefix='outbound')
+        self._thread = threading.Thread(target=self._run, name='outbound-scheduler', daemon=True)
+        self._thread.start()
+
+    def submit(self, func: Callable[..., Any], *args, chat_id: int,
+               priority: int = PRIORITY_INTERACTIVE, **kwargs) -> Future:
+        """Постановка вызова Bot API в очередь чата chat_id"""
+        with self._cond:
+            if not self._running:
+                raise RuntimeError("Планировщик исходящих сообщений остановлен")
+            job = _Job(priority, next(self._seq), func, args, kwargs, chat_id)
+            self._enqueue(job)
+            self._cond.notify()
+        return job.future
+
+    def broadcast(self, func: Callable[..., Any], chat_ids: Iterable[int], *args,
+                  on_done: Optional[Callable[[int, int], None]] = None, **kwargs) -> List[Future]:
+        """Массовая рассылка func(chat_id, *args) в чаты с приоритетом PRIORITY_BULK
+
+        on_done(отправлено, ошибок) вызывается после завершения всех отправок.
+        """
+        futures = [
+            self.submit(func, chat_id, *args, chat_id=chat_id, priority=PRIORITY_BULK, **kwargs)
+            for chat_id in chat_ids
+        ]
+        if on_done is None:
+            return futures
+        if not futures:
+            on_done(0, 0)
+            return futures
+
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def finished(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            failed = sum(1 for future in futures if future.cancelled() or future.exception() is not None)
+            on_done(len(futures) - failed, failed)
+
+        for future in futures:
+            future.add_done_callback(finished)
+        return futures
+
+    @property
+    def queue_depth(self) -> int:
+        """Число сообщений, ожидающих отправки"""
+        with self._cond:
+            return sum(self._pending.values())
+
+    def stats(self) -> Dict[str, int]:
+        """Состояние очереди и счетчики отправки"""
+        with self._cond:
+            return {
+                'pending_interactive': self._pending[PRIORITY_INTERACTIVE],
+                'pending_bulk': self._pending[PRIORITY_BULK],
+                'in_flight': self._in_flight,
+                'sent': self._sent,
+                'retried': self._retried,
+                'failed': self._failed,
+            }
+
+    def stop(self):
+        """Остановка планировщика: ожидающие сообщения отменяются, отправляемые завершаются"""
+        with self._cond:
+            self._running = False
+            for jobs in self._chat_jobs.values():
+                for job in jobs:
+                    job.future.cancel()
+            self._chat_jobs.clear()
+            self._scheduled.clear()
+            self._ready.clear()
+            self._delayed.clear()
+            self._pending = {PRIORITY_INTERACTIVE: 0, PRIORITY_BULK: 0}
+            self._busy.clear()
+            self._cond.notify()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def _enqueue(self, job: _Job):
+        """Добавление сообщения в очередь чата (под блокировкой)"""
+        heapq.heappush(self._chat_jobs.setdefault(job.chat_id, []), job)
+        self._pending[job.priority] += 1
+        if job.chat_id in self._busy:
+            return
+        scheduled = self._scheduled.get(job.chat_id)
+        # Новое сообщение с более высоким приоритетом поднимает чат в очереди
+        if scheduled is None or job.priority < scheduled[1]:
+            self._schedule_ready(job.chat_id)
+
+    def _schedule_ready(self, chat_id: int):
+        seq = next(self._seq)
+        priority = self._chat_jobs[chat_id][0].priority
+        heapq.heappush(self._ready, (priority, seq, chat_id))
+        self._scheduled[chat_id] = (seq, priority)
+
+    def _schedule_delayed(self, chat_id: int, not_before: float):
+        seq = next(self._seq)
+        heapq.heappush(self._delayed, (not_before, seq, chat_id))
+        self._scheduled[chat_id] = (seq, self._chat_jobs[chat_id][0].priority)
+
+    def _is_current(self, chat_id: int, seq: int) -> bool:
+        scheduled = self._scheduled.get(chat_id)
+        return scheduled is not None and scheduled[0] == seq
+
+    def _next_job(self) -> Tuple[Optional[_Job], Optional[float]]:
+        """Выбор следующего сообщения (под блокировкой): (задание, None) или (None, ожидание)"""
+        now = time.monotonic()
+        if now - self._last_prune >= PRUNE_INTERVAL:
+            # Корзины чатов с ожидающими сообщениями сохраняются
+            self._limits.prune(now, self._chat_jobs)
+            self._last_prune = now
+
+        while self._delayed and self._delayed[0][0] <= now:
+            _, seq, chat_id = heapq.heappop(self._delayed)
+            if self._is_current(chat_id, seq):
+                self._schedule_ready(chat_id)
+
+        while self._ready:
+            _, seq, chat_id = self._ready[0]
+            if not self._is_current(chat_id, seq):
+                heapq.heappop(self._ready)
+                continue
+
+            chat_wait = self._limits.chat_wait(chat_id, now)
+            if chat_wait > 0:
+                heapq.heappop(self._ready)
+                self._schedule_delayed(chat_id, now + chat_wait)
+                continue
+
+            global_wait = self._limits.global_wait(now)
+            if global_wait > 0:
+                return None, global_wait
+
+            heapq.heappop(self._ready)
+            del self._scheduled[chat_id]
+            jobs = self._chat_jobs[chat_id]
+            job = heapq.heappop(jobs)
+            if not jobs:
+                del self._chat_jobs[chat_id]
+            # Остальные сообщения чата планируются после завершения отправки
+            self._busy.add(chat_id)
+
+            self._limits.consume(chat_id, now)
+            self._pending[job.priority] -= 1
+            return job, None
+
+        if self._delayed:
+            return None, self._delayed[0][0] - now
+        return None, None
+
+    def _run(self):
+        """Цикл планировщика"""
+        while True:
+            with self._cond:
+                job, wait = self._next_job()
+                if job is None:
+                    if not self._running:
+                        break
+                    self._cond.wait(wait)
+                    continue
+                self._in_flight += 1
+            self._executor.submit(self._send, job)
+
+    def _send(self, job: _Job):
+        """Выполнение запроса к Bot API"""
+        method = getattr(job.func, '__name__', 'unknown')
+        started = time.perf_counter()
+        try:
+            result = job.func(*job.args, **job.kwargs)
+        except Exception as e:
+            observe_api_call(method, time.perf_counter() - started, failed=True)
+            retry_after = get_retry_after(e)
+            with self._cond:
+                self._in_flight -= 1
+                self._busy.discard(job.chat_id)
+                if retry_after is not None and job.attempts < self.max_retries and self._running:
+                    job.attempts += 1
+                    self._retried += 1
+                    self._limits.pause(job.chat_id, time.monotonic() + retry_after)
+                    # Прежний номер в очереди сохраняет сообщение первым в своем чате
+                    self._enqueue(job)
+                    self._cond.notify()
+                    logger.warning(f"Лимит Telegram для чата {job.chat_id}, повтор через {retry_after} с")
+                    return
+                self._failed += 1
+                self._release_chat(job.chat_id)
+            logger.error(f"Ошибка отправки сообщения в чат {job.chat_id}: {e}")
+            job.future.set_exception(e)
+            return
+
+        observe_api_call(method, time.perf_counter() - started)
+        with self._cond:
+            self._in_flight -= 1
+            self._sent += 1
+            self._busy.discard(job.chat_id)
+            self._release_chat(job.chat_id)
+        job.future.set_result(result)
+
+    def _release_chat(self, chat_id: int):
+        """Планирование следующего сообщения чата после отправки (под блокировкой)"""
+        if chat_id in self._chat_jobs and chat_id not in self._scheduled:
+            self._schedule_ready(chat_id)
+            self._cond.notify()
@@ -0,0 +1,114 @@
+"""
+Бенчмарк Database.get_active_tasks: N+1 запросов против постоянного числа запросов
+
+Запуск из корня проекта:
+    python benchmarks/bench_active_tasks.py [--tasks 250 500 1000] [--recipients 50]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database  # noqa: E402
+
+
+def seed(db: Database, tasks: int, recipients: int):
+    """Заполнение базы заданиями, получателями и медиафайлами"""
+    with db.connection() as conn:
+        conn.executemany(
+            "INSERT INTO chats (chat_id, title, is_group) VALUES (?, ?, ?)",
+            [(chat_id, f"Chat {chat_id}", True) for chat_id in range(recipients)]
+        )
+        conn.executemany(
+            "INSERT INTO tasks (id, text, creator_id) VALUES (?, ?, ?)",
+            [(task_id, f"Task {task_id}", 1) for task_id in range(1, tasks + 1)]
+        )
+        conn.executemany(
+            "INSERT INTO task_recipients (task_id, chat_id) VALUES (?, ?)",
+            [(task_id, chat_id)
+             for task_id in range(1, tasks + 1) for chat_id in range(recipients)]
+        )
+        conn.executemany(
+            "INSERT INTO task_media (task_id, file_id, file_type) VALUES (?, ?, ?)",
+            [(task_id, f"file-{task_id}-{n}", 'document')
+             for task_id in range(1, tasks + 1) for n in range(2)]
+        )
+        conn.executemany(
+            "INSERT INTO response_media (task_id, chat_id, file_id, file_type) VALUES (?, ?, ?, ?)",
+            [(task_id, chat_id, f"resp-{task_id}-{chat_id}", 'photo')
+             for task_id in range(1, tasks + 1) for chat_id in range(0, recipients, 5)]
+        )
+        conn.commit()
+
+
+def get_active_tasks_n_plus_one(db: Database) -> dict:
+    """Прежняя реализация: два дополнительных запроса на каждое задание"""
+    tasks = {}
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT t.id, t.text, t.created_at, t.status,
+                   tr.chat_id, tr.status as recipient_status,
+                   c.title as chat_title
+            FROM tasks t
+            JOIN task_recipients tr ON t.id = tr.task_id
+            JOIN chats c ON tr.chat_id = c.chat_id
+            WHERE t.status = 'active'
+            ORDER BY t.created_at DESC
+        """)
+        for row in cursor.fetchall():
+            task = tasks.setdefault(row['id'], {
+                'text': row['text'], 'created_at': row['created_at'],
+                'status': row['status'], 'recipients': {}, 'media': []
+            })
+            task['recipients'][row['chat_id']] = {
+                'chat_title': row['chat_title'], 'status': row['recipient_status'], 'media': []
+            }
+        for task_id in tasks:
+            cursor.execute("SELECT file_id, file_type FROM task_media WHERE task_id = ?", (task_id,))
+            tasks[task_id]['media'] = [dict(m) for m in cursor.fetchall()]
+            cursor.execute(
+                "SELECT chat_id, file_id, file_type FROM response_media WHERE task_id = ?", (task_id,)
+            )
+            for media in cursor.fetchall():
+                recipient = tasks[task_id]['recipients'].get(media['chat_id'])
+                if recipient is not None:
+                    recipient['media'].append({'file_id': media['file_id'], 'file_type': media['file_type']})
+    return tasks
+
+
+def measure(func, repeat: int = 3) -> float:
+    """Лучшее время из repeat запусков"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, nargs='+', default=[250, 500, 1000])
+    parser.add_argument('--recipients', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'заданий':>8} {'строк':>8} {'N+1, с':>10} {'новый, с':>10} {'мкс/строка':>11}")
+    for tasks in args.tasks:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = Database(os.path.join(tmp, 'bench.db'))
+            seed(db, tasks, args.recipients)
+
+            assert db.get_active_tasks() == get_active_tasks_n_plus_one(db)
+            before = measure(lambda: get_active_tasks_n_plus_one(db))
+            after = measure(db.get_active_tasks)
+            rows = tasks * args.recipients
+            print(f"{tasks:>8} {rows:>8} {before:>10.3f} {after:>10.3f} {after / rows * 1e6:>11.2f}")
+            db.close()
+
+
+if __name__ == '__main__':
+    main()
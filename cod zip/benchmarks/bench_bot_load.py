@@ -0,0 +1,198 @@
+"""
+Нагрузочный бенчмарк бота на локальном поддельном Bot API
+
+Бот (TelegramBot на pyTelegramBotAPI или приложение python-telegram-bot из
+attached_assets) получает обновления через getUpdates от FakeBotAPI. Выводятся
+пропускная способность, задержка обработки обновления (p50/p95/p99)
+и время работы с базой данных на одно обновление.
+
+Запуск из корня проекта:
+    python benchmarks/bench_bot_load.py --target telebot [--updates 2000] [--chats 200]
+    python benchmarks/bench_bot_load.py --target ptb [--updates 2000] [--chats 200]
+"""
+import argparse
+import asyncio
+import functools
+import inspect
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_bot_api import FakeBotAPI  # noqa: E402
+
+# Сценарий: команды и кнопки меню, на каждое сообщение бот отвечает одним сообщением
+SCENARIO = (
+    '/start',
+    '/help',
+    '/addchat',
+    '❓ Помощь',
+    '👥 Просмотр списка подключенных чатов',
+    'произвольный текст',
+)
+
+
+class DatabaseTimer:
+    """Учет времени в публичных методах Database (вложенные вызовы не суммируются)"""
+
+    def __init__(self):
+        self.total = 0.0
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def instrument(self, db):
+        for name, method in inspect.getmembers(db, inspect.ismethod):
+            if not name.startswith('_') and name != 'close':
+                setattr(db, name, self._wrap(method))
+
+    def _wrap(self, method):
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            depth = getattr(self._local, 'depth', 0)
+            self._local.depth = depth + 1
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._local.depth = depth
+                if depth == 0:
+                    elapsed = time.perf_counter() - started
+                    with self._lock:
+                        self.total += elapsed
+                        self.calls += 1
+        return timed
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль по отсортированному списку"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def messages(updates: int, chats: int):
+    """Сообщения сценария, равномерно распределенные по чатам"""
+    for n in range(updates):
+        yield 1000 + n % chats, SCENARIO[n % len(SCENARIO)]
+
+
+def run_telebot(api: FakeBotAPI, timer: DatabaseTimer, args) -> bool:
+    """Прогон TelegramBot (pyTelegramBotAPI) в режиме polling"""
+    sys.path.insert(0, ROOT)
+    import bot as bot_module
+    from outbound import OutboundScheduler
+
+    # Логирование настраивается при импорте бота, каждое сообщение пишется в INFO
+    logging.getLogger().setLevel(args.log_level)
+    timer.instrument(bot_module.db)
+    bot_module.db.ensure_database()
+    telegram_bot = bot_module.TelegramBot()
+    if not args.respect_limits:
+        # Лимиты Telegram ограничили бы пропускную способность 30 ответами в секунду
+        telegram_bot.outbound.stop()
+        telegram_bot.outbound = OutboundScheduler(global_rate=1e9, chat_rate=1e9, chat_burst=1e9,
+                                                  group_rate=1e9, group_burst=1e9)
+
+    # Цикл polling без restart_on_change, который следит за файлами рабочей директории
+    polling = threading.Thread(
+        target=telegram_bot.bot.infinity_polling,
+        kwargs={'timeout': 5, 'long_polling_timeout': 1, 'allowed_updates': ["message"]},
+        daemon=True
+    )
+    polling.start()
+    api.push_text(messages(args.updates, args.chats))
+    done = api.wait_for_responses(args.updates, args.timeout)
+    telegram_bot.stop()
+    bot_module.db.close()
+    return done
+
+
+def run_ptb(api: FakeBotAPI, timer: DatabaseTimer, args) -> bool:
+    """Прогон приложения python-telegram-bot из attached_assets"""
+    sys.path.insert(0, os.path.join(ROOT, 'attached_assets'))
+    import bot as bot_module
+    import handlers
+
+    logging.getLogger().setLevel(args.log_level)
+    timer.instrument(handlers.db)
+    handlers.db.ensure_database()
+    telegram_bot = bot_module.TelegramBot()
+
+    async def run() -> bool:
+        app = telegram_bot.build_application()
+        async with app:
+            await app.start()
+            await app.updater.start_polling(poll_interval=0.0, timeout=1)
+            api.push_text(messages(args.updates, args.chats))
+            loop = asyncio.get_running_loop()
+            done = await loop.run_in_executor(None, api.wait_for_responses, args.updates, args.timeout)
+            await app.updater.stop()
+            await app.stop()
+        return done
+
+    done = asyncio.run(run())
+    handlers.db.close()
+    return done
+
+
+def report(api: FakeBotAPI, timer: DatabaseTimer, args, done: bool) -> Dict[str, float]:
+    latencies = api.latencies
+    if not latencies:
+        print(f"цель: {args.target}: бот не ответил ни на одно обновление")
+        return {}
+    elapsed = api.last_response_at - api.first_update_at
+    result = {
+        'updates_per_sec': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'db_ms_per_update': timer.total / len(latencies) * 1000,
+        'db_calls_per_update': timer.calls / len(latencies),
+    }
+    print(f"цель: {args.target}, обновлений: {len(latencies)}/{args.updates}, чатов: {args.chats}")
+    if not done:
+        print(f"ВНИМАНИЕ: получены не все ответы за {args.timeout} с")
+    for name, value in result.items():
+        print(f"{name:>20}: {value:10.2f}")
+    print(f"{'вызовы Bot API':>20}: {dict(api.calls)}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', choices=['telebot', 'ptb'], default='telebot')
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--chats', type=int, default=200)
+    parser.add_argument('--api-latency', type=float, default=0.0, help="задержка ответа Bot API, с")
+    parser.add_argument('--respect-limits', action='store_true', help="оставить лимиты Telegram на отправку")
+    parser.add_argument('--timeout', type=float, default=300.0)
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+
+    api = FakeBotAPI(latency=args.api_latency).start()
+    with tempfile.TemporaryDirectory() as tmp:
+        # Конфигурация читается из окружения при импорте модулей бота
+        os.environ.update({
+            'BOT_TOKEN': '123456:bench',
+            'BOT_API_URL': api.base_url,
+            'BOT_MODE': 'polling',
+            'DB_PATH': os.path.join(tmp, 'bench.db'),
+        })
+        os.chdir(tmp)  # Логи и PID-файл бота создаются в рабочей директории
+
+        runner = run_telebot if args.target == 'telebot' else run_ptb
+        timer = DatabaseTimer()
+        done = runner(api, timer, args)
+        api.stop()
+        report(api, timer, args, done)
+
+
+if __name__ == '__main__':
+    main()
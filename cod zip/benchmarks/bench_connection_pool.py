@@ -0,0 +1,83 @@
+"""
+Микробенчмарк: соединение на каждый запрос против пула соединений
+
+Запуск из корня проекта:
+    python benchmarks/bench_connection_pool.py [--queries N] [--threads N]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database  # noqa: E402
+
+SELECT_CHAT = "SELECT chat_id FROM chats WHERE chat_id = ?"
+
+
+def connect_per_query(db_path: str, query: str, params: tuple):
+    """Поведение до пула: новое соединение на каждый запрос"""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        return [dict(row) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def run(label: str, func, queries: int, threads: int) -> float:
+    """Выполнение queries запросов в threads потоках, возвращает запросов/с"""
+    per_thread = queries // threads
+
+    def worker(offset: int):
+        for i in range(per_thread):
+            func(((offset + i) % 1000,))
+
+    workers = [threading.Thread(target=worker, args=(n * per_thread,)) for n in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    qps = per_thread * threads / elapsed
+    print(f"{label:<28} {qps:>12,.0f} запросов/с ({elapsed:.3f} с)")
+    return qps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--queries', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        db = Database(db_path, pool_size=args.threads)
+        with db.connection() as conn:
+            conn.executemany(
+                "INSERT INTO chats (chat_id, title, is_group) VALUES (?, ?, ?)",
+                [(i, f"Chat {i}", i % 2) for i in range(1000)]
+            )
+            conn.commit()
+
+        print(f"Запросов: {args.queries}, потоков: {args.threads}")
+        for threads in sorted({1, args.threads}):
+            before = run(f"connect-per-query x{threads}",
+                         lambda p: connect_per_query(db_path, SELECT_CHAT, p),
+                         args.queries, threads)
+            after = run(f"pool x{threads}",
+                        lambda p: db.execute_query(SELECT_CHAT, p),
+                        args.queries, threads)
+            print(f"Ускорение x{threads}: {after / before:.1f}x\n")
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
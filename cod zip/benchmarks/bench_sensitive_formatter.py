@@ -0,0 +1,122 @@
+"""
+Бенчмарк SensitiveFormatter: накладные расходы на запись лога относительно logging.Formatter
+
+Второй раздел измеряет запись через setup_logging: время вызова logger.info
+в потоке бота (маскирование в QueueHandler) и общее время с дозаписью очереди
+в файл, с маскированием и без него.
+
+Запуск из корня проекта:
+    python benchmarks/bench_sensitive_formatter.py [--records 200000]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import LOG_FORMAT  # noqa: E402
+from utils import SensitiveFormatter, setup_logging, stop_logging  # noqa: E402
+
+
+class LegacySensitiveFormatter(logging.Formatter):
+    """Прежняя реализация: поиск каждого ключа в message.lower()"""
+    def __init__(self, fmt=None, datefmt=None):
+        super().__init__(fmt, datefmt)
+        self.sensitive_keys = ['bot_token', 'api_key', 'password']
+
+    def format(self, record):
+        message = super().format(record)
+        for key in self.sensitive_keys:
+            if key in message.lower():
+                message = message.replace(getattr(record, 'msg', ''), '[СКРЫТО]')
+        return message
+
+
+# Типичные записи: постоянное сообщение, шаблоны с числовыми и строковыми
+# аргументами и запись с секретом
+CASES = {
+    'постоянное': ("Главное меню успешно отображено", None),
+    'числа': ("Получена команда /start от пользователя %s в чате %s", (5171183387, -1001234567890)),
+    'строка': ("Получено текстовое сообщение от пользователя %s: %s", (5171183387, "❓ Помощь")),
+    'с секретом': ("Подключение к API: api_key=%s", ('sk-1234567890abcdef',)),
+}
+
+
+def measure(funcs: dict, record: logging.LogRecord, records: int, repeat: int = 7) -> dict:
+    """Лучшее среднее время вызова для одной записи в наносекундах
+
+    Прогоны чередуются, чтобы колебания частоты процессора одинаково
+    влияли на все варианты.
+    """
+    best = dict.fromkeys(funcs, float('inf'))
+    for _ in range(repeat):
+        for name, func in funcs.items():
+            started = time.perf_counter()
+            for _ in range(records):
+                func(record)
+            best[name] = min(best[name], (time.perf_counter() - started) / records * 1e9)
+    return best
+
+
+def measure_queue(msg, msg_args, records: int, redacting: bool, log_dir: str) -> tuple:
+    """Время вызова logger.info и общее время с дозаписью очереди, нс на запись"""
+    setup_logging(os.path.join(log_dir, 'bench.log'), level='INFO', when='', console=False)
+    if not redacting:
+        # Без маскирования QueueHandler подставляет аргументы обычным Formatter
+        logging.getLogger().handlers[0].setFormatter(None)
+    log = logging.getLogger('bench')
+    args = msg_args or ()
+    started = time.perf_counter()
+    for _ in range(records):
+        log.info(msg, *args)
+    logged = time.perf_counter()
+    stop_logging()
+    finished = time.perf_counter()
+    return (logged - started) / records * 1e9, (finished - started) / records * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--records', type=int, default=50000)
+    args = parser.parse_args()
+
+    plain = logging.Formatter(LOG_FORMAT)
+    legacy = LegacySensitiveFormatter(LOG_FORMAT)
+    redacting = SensitiveFormatter(LOG_FORMAT)
+
+    # Полное форматирование записи; накладные расходы маскирования точнее
+    # видны по formatMessage, где не участвует форматирование времени
+    print(f"{'запись':>12} {'Formatter, нс':>14} {'прежний, нс':>12} {'новый, нс':>10} {'маскирование, нс':>17}")
+    for case, (msg, msg_args) in CASES.items():
+        record = logging.LogRecord('bench', logging.INFO, __file__, 1, msg, msg_args, None)
+        record.message = record.getMessage()
+        message = record.message
+
+        def format_message(formatter):
+            def run(rec):
+                rec.message = message
+                formatter.formatMessage(rec)
+            return run
+
+        full = measure({'plain': plain.format, 'legacy': legacy.format, 'new': redacting.format},
+                       record, args.records)
+        partial = measure({'plain': format_message(plain), 'new': format_message(redacting)},
+                          record, args.records)
+        overhead = partial['new'] - partial['plain']
+        print(f"{case:>12} {full['plain']:>14.0f} {full['legacy']:>12.0f} {full['new']:>10.0f} {overhead:>17.0f}")
+
+    print()
+    print("setup_logging (QueueHandler -> QueueListener -> файл)")
+    print(f"{'запись':>12} {'вызов, нс':>10} {'с маскир., нс':>14} {'всего, нс':>10} {'с маскир., нс':>14}")
+    with tempfile.TemporaryDirectory() as log_dir:
+        for case, (msg, msg_args) in CASES.items():
+            plain_call, plain_total = measure_queue(msg, msg_args, args.records, False, log_dir)
+            call, total = measure_queue(msg, msg_args, args.records, True, log_dir)
+            print(f"{case:>12} {plain_call:>10.0f} {call:>14.0f} {plain_total:>10.0f} {total:>14.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Бенчмарк рассылки задания: add_task_recipient в цикле против add_task_recipients
+
+Запуск из корня проекта:
+    python benchmarks/bench_task_fanout.py [--chats 2000] [--profile wal]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--chats', type=int, default=2000)
+    parser.add_argument('--profile', default='default', choices=['default', 'wal'])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'), storage_profile=args.profile)
+        with db.connection() as conn:
+            conn.executemany(
+                "INSERT INTO chats (chat_id, title, is_group) VALUES (?, ?, ?)",
+                [(chat_id, f"Chat {chat_id}", True) for chat_id in range(args.chats)]
+            )
+            conn.execute("INSERT INTO chat_groups (id, name) VALUES (1, 'All')")
+            conn.executemany(
+                "INSERT INTO group_chats (group_id, chat_id) VALUES (1, ?)",
+                [(chat_id,) for chat_id in range(args.chats)]
+            )
+            conn.commit()
+
+        task_id = db.create_task("По одному", creator_id=1)
+        started = time.perf_counter()
+        for chat in db.get_group_chats(1):
+            db.add_task_recipient(task_id, chat['chat_id'], 1)
+        single = time.perf_counter() - started
+
+        task_id = db.create_task("Пакетом", creator_id=1)
+        started = time.perf_counter()
+        inserted = db.add_task_recipients(task_id, group_ids=[1])
+        bulk = time.perf_counter() - started
+
+        print(f"Профиль: {args.profile}, получателей: {inserted}")
+        print(f"add_task_recipient x{args.chats}: {single * 1000:10.1f} мс")
+        print(f"add_task_recipients:        {bulk * 1000:10.1f} мс ({single / bulk:.0f}x)")
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""
+Локальный поддельный Telegram Bot API для нагрузочных тестов
+
+Поддерживает getMe, getUpdates (с long polling), deleteWebhook, setWebhook
+и методы отправки sendMessage, sendDocument, sendPhoto и т.п. Каждое
+обновление связывается с первым ответом бота в тот же чат, что позволяет
+измерить задержку обработки обновления.
+"""
+import email
+import itertools
+import json
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+BOT_INFO = {
+    'id': 100000001,
+    'is_bot': True,
+    'first_name': 'FakeBot',
+    'username': 'fake_bot',
+    'can_join_groups': True,
+    'can_read_all_group_messages': False,
+    'supports_inline_queries': False,
+}
+
+# Ответ без результата для служебных методов
+_TRUE_METHODS = {'deleteWebhook', 'setWebhook', 'answerCallbackQuery', 'setMyCommands', 'close', 'logOut'}
+
+
+def make_update(update_id: int, chat_id: int, text: str, user_id: Optional[int] = None) -> Dict[str, Any]:
+    """Синтетическое обновление с текстовым сообщением из личного чата"""
+    user_id = user_id or chat_id
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': chat_id, 'type': 'private', 'first_name': f"User {user_id}"},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': f"User {user_id}"},
+        'text': text,
+    }
+    if text.startswith('/'):
+        command = text.split()[0]
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+    return {'update_id': update_id, 'message': message}
+
+
+def _parse_multipart(content_type: str, body: bytes) -> Dict[str, str]:
+    """Текстовые поля multipart/form-data (содержимое файлов пропускается)"""
+    message = email.message_from_bytes(
+        b'Content-Type: ' + content_type.encode('latin-1') + b'\r\n\r\n' + body
+    )
+    fields = {}
+    for part in message.get_payload() or []:
+        name = part.get_param('name', header='content-disposition')
+        if name and part.get_filename() is None:
+            fields[name] = part.get_payload(decode=True).decode('utf-8', 'replace')
+    return fields
+
+
+class FakeBotAPI:
+    """HTTP-сервер, имитирующий Bot API, со статистикой ответов бота"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0):
+        self.latency = latency
+        self._cond = threading.Condition()
+        self._updates: deque = deque()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        # Время постановки обновлений, ожидающих ответа, по чатам
+        self._awaiting: Dict[int, deque] = defaultdict(deque)
+        self.latencies: List[float] = []
+        self.calls: Counter = Counter()
+        self.first_update_at: Optional[float] = None
+        self.last_response_at: Optional[float] = None
+        self._closing = False
+
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                self._handle()
+
+            def do_POST(self):
+                self._handle()
+
+            def _handle(self):
+                url = urlsplit(self.path)
+                params = dict(parse_qsl(url.query))
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length) if length else b''
+                content_type = self.headers.get('Content-Type', '')
+                if content_type.startswith('application/json') and body:
+                    params.update(json.loads(body))
+                elif content_type.startswith('application/x-www-form-urlencoded'):
+                    params.update(parse_qsl(body.decode('utf-8')))
+                elif content_type.startswith('multipart/form-data'):
+                    params.update(_parse_multipart(content_type, body))
+
+                method = url.path.rsplit('/', 1)[-1]
+                status, payload = api.call(method, params)
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        """Адрес сервера для BOT_API_URL"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'FakeBotAPI':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-bot-api', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def push_text(self, messages: Iterable[Tuple[int, str]]) -> int:
+        """Постановка текстовых сообщений (chat_id, текст) в очередь getUpdates"""
+        count = 0
+        with self._cond:
+            now = time.perf_counter()
+            if self.first_update_at is None:
+                self.first_update_at = now
+            for chat_id, text in messages:
+                self._updates.append(make_update(next(self._update_ids), chat_id, text))
+                self._awaiting[chat_id].append(now)
+                count += 1
+            self._cond.notify_all()
+        return count
+
+    def wait_for_responses(self, count: int, timeout: float) -> bool:
+        """Ожидание count ответов бота"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while len(self.latencies) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def call(self, method: str, params: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """Обработка вызова метода Bot API"""
+        self.calls[method] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        if method == 'getUpdates':
+            return 200, {'ok': True, 'result': self._get_updates(params)}
+        if method == 'getMe':
+            return 200, {'ok': True, 'result': BOT_INFO}
+        if method in _TRUE_METHODS:
+            return 200, {'ok': True, 'result': True}
+        if method.startswith('send'):
+            return 200, {'ok': True, 'result': self._record_response(params)}
+        return 404, {'ok': False, 'error_code': 404, 'description': 'Not Found: method not found'}
+
+    def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(params.get('offset', 0) or 0)
+        limit = int(params.get('limit', 100) or 100)
+        timeout = float(params.get('timeout', 0) or 0)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            # Подтвержденные смещением обновления удаляются
+            while self._updates and self._updates[0]['update_id'] < offset:
+                self._updates.popleft()
+            while not self._updates and not self._closing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return list(itertools.islice(self._updates, limit))
+
+    def _record_response(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        chat_id = int(params.get('chat_id', 0))
+        with self._cond:
+            now = time.perf_counter()
+            awaiting = self._awaiting.get(chat_id)
+            if awaiting:
+                self.latencies.append(now - awaiting.popleft())
+                self.last_response_at = now
+                self._cond.notify_all()
+            message_id = next(self._message_ids)
+        return {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private', 'first_name': f"User {chat_id}"},
+            'from': BOT_INFO,
+            'text': params.get('text', ''),
+        }
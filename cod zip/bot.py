@@ -1,35 +1,55 @@
 import os
+import html
 import logging
 import telebot
 from dotenv import load_dotenv
 from database import Database
+from dispatcher import ChatOrderedDispatcher, update_key
+from webhook_server import WebhookServer
+from outbound import OutboundScheduler, PRIORITY_INTERACTIVE
+from navigation_manager import NavigationManager
+from metrics import (
+    REGISTRY, MetricsServer, format_stats, instrument_handler, observe_query, record_handler_error
+)
+from utils import ChatAdminCache, is_admin, reload_admin_ids, setup_logging
+from config import (
+    BOT_API_URL, BOT_MODE, BOT_WORKERS, DB_PATH, DB_POOL_SIZE, DB_QUERY_LOG_SAMPLE_RATE,
+    DB_SLOW_QUERY_MS, DB_STORAGE_PROFILE, METRICS_HOST, METRICS_PORT,
+    WEBHOOK_HOST, WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET, WEBHOOK_URL
+)
 import sys
 import signal
-import time
 import requests
 from requests.exceptions import RequestException
 from threading import Lock
+from concurrent.futures import Future
 import atexit
 import fcntl
 import errno
 
-# Создаем директорию для логов, если её нет
-if not os.path.exists('logs'):
-    os.makedirs('logs')
-
-# Настройка логирования
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-    handlers=[
-        logging.FileHandler('logs/bot.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
 # Инициализация базы данных
-db = Database("bot_database.db")  # Используем тот же путь, что и в bot.py
+db = Database(
+    DB_PATH,
+    pool_size=DB_POOL_SIZE,
+    storage_profile=DB_STORAGE_PROFILE,
+    slow_query_threshold=DB_SLOW_QUERY_MS / 1000,
+    query_log_sample_rate=DB_QUERY_LOG_SAMPLE_RATE
+)
+db.add_query_observer(observe_query)
+
+class ChatOrderedTeleBot(telebot.TeleBot):
+    """TeleBot с параллельной обработкой разных чатов и строгим порядком внутри чата"""
+
+    def __init__(self, token, dispatcher: ChatOrderedDispatcher, **kwargs):
+        # Обработчики выполняет диспетчер, поэтому встроенный пул потоков не нужен
+        super().__init__(token, threaded=False, **kwargs)
+        self.dispatcher = dispatcher
+
+    def _exec_task(self, task, *args, **kwargs):
+        key = update_key(args[0]) if args else None
+        self.dispatcher.submit(key, super()._exec_task, task, *args, **kwargs)
 
 class TelegramBot:
     """Основной класс бота"""
@@ -57,6 +77,7 @@ class TelegramBot:
                 # Загрузка переменных окружения
                 load_dotenv()
                 logger.info("Loading environment variables...")
+                reload_admin_ids()
 
                 # Получение токена
                 self.token = os.getenv('BOT_TOKEN')
@@ -65,22 +86,45 @@ class TelegramBot:
                     raise ValueError("BOT_TOKEN не найден в переменных окружения")
                 logger.info("BOT_TOKEN successfully loaded")
 
-                # Очистка старых соединений
-                self._clear_webhook()
-                self._clear_pending_updates()
-
-                # Инициализация бота с таймаутом и параметрами
-                self.bot = telebot.TeleBot(
+                self.mode = BOT_MODE
+                self.webhook_server = None
+                self.metrics_server = None
+                if self.mode == 'webhook':
+                    # Адрес webhook регистрируется при запуске
+                    if not WEBHOOK_URL or not WEBHOOK_SECRET:
+                        raise ValueError("Для режима webhook нужны WEBHOOK_URL и WEBHOOK_SECRET")
+                elif self.mode == 'polling':
+                    # Очистка старых соединений
+                    self._clear_webhook()
+                    self._clear_pending_updates()
+                else:
+                    raise ValueError(f"Неизвестный режим работы бота: {self.mode}")
+
+                # Инициализация бота: разные чаты обрабатываются параллельно,
+                # обновления одного чата - строго по порядку
+                self.dispatcher = ChatOrderedDispatcher(BOT_WORKERS)
+                self.bot = ChatOrderedTeleBot(
                     self.token,
-                    parse_mode='HTML',
-                    threaded=True,
-                    num_threads=1  # Один поток для избежания конфликтов
+                    self.dispatcher,
+                    parse_mode='HTML'
                 )
+                # Исходящие сообщения отправляются с учетом лимитов Telegram
+                self.outbound = OutboundScheduler()
+                # Администраторы групп запрашиваются у Bot API не чаще раза в CHAT_ADMIN_CACHE_TTL
+                self.chat_admins = ChatAdminCache(
+                    lambda chat_id: [member.user.id for member in self.bot.get_chat_administrators(chat_id)]
+                )
+                REGISTRY.gauge('bot_outbound_queue_depth', 'Сообщения, ожидающие отправки',
+                               lambda: self.outbound.queue_depth)
+                REGISTRY.gauge('bot_pending_updates', 'Обновления, ожидающие обработки',
+                               self.dispatcher.pending)
 
                 # Устанавливаем параметры запросов к API
                 telebot.apihelper.RETRY_ON_ERROR = True
                 telebot.apihelper.CONNECT_TIMEOUT = 3.5
                 telebot.apihelper.READ_TIMEOUT = 10
+                telebot.apihelper.API_URL = BOT_API_URL + "/bot{0}/{1}"
+                telebot.apihelper.FILE_URL = BOT_API_URL + "/file/bot{0}/{1}"
 
                 self._setup_handlers()
                 self._initialized = True
@@ -89,6 +133,8 @@ class TelegramBot:
                 # Настройка обработчика сигналов для корректного завершения
                 signal.signal(signal.SIGINT, self._signal_handler)
                 signal.signal(signal.SIGTERM, self._signal_handler)
+                if hasattr(signal, 'SIGHUP'):
+                    signal.signal(signal.SIGHUP, self._reload_handler)
 
                 # Регистрация очистки при выходе
                 atexit.register(self._cleanup)
@@ -135,7 +181,7 @@ class TelegramBot:
     def _clear_webhook(self):
         """Очистка webhook'а перед запуском polling"""
         try:
-            api_url = f"https://api.telegram.org/bot{self.token}/deleteWebhook"
+            api_url = f"{BOT_API_URL}/bot{self.token}/deleteWebhook"
             response = requests.get(api_url, timeout=5)
             if response.status_code == 200:
                 logger.info("Successfully cleared webhook")
@@ -147,7 +193,7 @@ class TelegramBot:
     def _clear_pending_updates(self):
         """Очистка очереди обновлений перед запуском"""
         try:
-            api_url = f"https://api.telegram.org/bot{self.token}/getUpdates"
+            api_url = f"{BOT_API_URL}/bot{self.token}/getUpdates"
             params = {'offset': -1, 'limit': 1, 'timeout': 1}
             response = requests.get(api_url, params=params, timeout=5)
             if response.status_code == 200:
@@ -163,57 +209,80 @@ class TelegramBot:
         self.stop()
         sys.exit(0)
 
+    def _reload_handler(self, signum, frame):
+        """Перечитывание списка администраторов по SIGHUP"""
+        logger.info(f"Received signal {signum}, reloading admin list")
+        load_dotenv(override=True)
+        reload_admin_ids()
+        self.chat_admins.invalidate()
+
+    def _can_manage_chat(self, message) -> bool:
+        """Право подключать чат: в группе - у администраторов бота и группы, в личном чате - у всех"""
+        user_id = message.from_user.id
+        if is_admin(user_id):
+            return True
+        if message.chat.type in ('group', 'supergroup'):
+            return self.chat_admins.is_admin(message.chat.id, user_id)
+        return True
+
+    def _reply(self, message, text: str, **kwargs) -> Future:
+        """Ответ на сообщение через очередь исходящих с приоритетом интерактивных ответов"""
+        return self.outbound.submit(
+            self.bot.reply_to, message, text,
+            chat_id=message.chat.id, priority=PRIORITY_INTERACTIVE, **kwargs
+        )
+
     def _setup_handlers(self):
         """Настройка обработчиков команд"""
         try:
             logger.info("Setting up command handlers...")
+            # Кнопки меню: текст кнопки -> обработчик
+            self.navigation = NavigationManager()
 
             @self.bot.message_handler(commands=['start'])
+            @instrument_handler('start')
             def start_command(message):
                 try:
                     logger.info(f"Received /start command from user {message.from_user.id}")
-                    markup = telebot.types.ReplyKeyboardMarkup(resize_keyboard=True)
-                    markup.row(
-                        telebot.types.KeyboardButton("📝 Создать новое задание"),
-                        telebot.types.KeyboardButton("📋 Просмотр активных заданий")
-                    )
-                    markup.row(
-                        telebot.types.KeyboardButton("👥 Просмотр списка подключенных чатов"),
-                        telebot.types.KeyboardButton("👥 Создать группу чатов")
-                    )
-                    markup.row(
-                        telebot.types.KeyboardButton("⚙️ Настройки"),
-                        telebot.types.KeyboardButton("❓ Помощь")
-                    )
-                    self.bot.reply_to(message, "Главное меню:", reply_markup=markup)
+                    # Готовый JSON клавиатуры telebot передает в Bot API без изменений
+                    self._reply(message, "Главное меню:", reply_markup=self.navigation.get_reply_markup('main_menu'))
                     logger.info("Main menu displayed successfully")
                 except Exception as e:
                     logger.error(f"Error in start command: {e}", exc_info=True)
-                    self.bot.reply_to(message, "Произошла ошибка. Пожалуйста, попробуйте позже.")
+                    record_handler_error()
+                    self._reply(message, "Произошла ошибка. Пожалуйста, попробуйте позже.")
 
+            @self.navigation.route("❓ Помощь")
             @self.bot.message_handler(commands=['help'])
+            @instrument_handler('help')
             def help_command(message):
                 try:
                     from constants import HELP_TEXT
                     logger.info(f"Received /help command from user {message.from_user.id}")
-                    self.bot.reply_to(message, HELP_TEXT)
+                    self._reply(message, HELP_TEXT)
                     logger.info("Help message sent successfully")
                 except Exception as e:
                     logger.error(f"Error in help command: {e}", exc_info=True)
-                    self.bot.reply_to(message, "Произошла ошибка. Пожалуйста, попробуйте позже.")
+                    record_handler_error()
+                    self._reply(message, "Произошла ошибка. Пожалуйста, попробуйте позже.")
 
             @self.bot.message_handler(commands=['addchat'])
+            @instrument_handler('addchat')
             def add_chat_command(message):
                 try:
                     logger.info(f"Received /addchat command in chat {message.chat.id}")
                     chat_id = message.chat.id
                     chat_title = message.chat.title or f"Личный чат с {message.from_user.first_name}"
                     is_group = message.chat.type in ['group', 'supergroup']
+                    if not self._can_manage_chat(message):
+                        from constants import UNAUTHORIZED
+                        self._reply(message, UNAUTHORIZED)
+                        return
 
                     # Проверка существующего чата
                     existing_chat = db.execute_query("SELECT chat_id FROM chats WHERE chat_id = ?", (chat_id,))
                     if existing_chat:
-                        self.bot.reply_to(message, "Этот чат уже подключен к боту.")
+                        self._reply(message, "Этот чат уже подключен к боту.")
                         return
 
                     # Добавление нового чата
@@ -221,28 +290,79 @@ class TelegramBot:
                         "INSERT INTO chats (chat_id, title, is_group) VALUES (?, ?, ?)",
                         (chat_id, chat_title, is_group)
                     )
-                    self.bot.reply_to(message, "Чат успешно подключен к боту!")
+                    self._reply(message, "Чат успешно подключен к боту!")
                     logger.info(f"Chat {chat_id} successfully added")
 
                 except Exception as e:
                     logger.error(f"Error in add chat command: {e}", exc_info=True)
-                    self.bot.reply_to(message, "Произошла ошибка. Пожалуйста, попробуйте позже.")
+                    record_handler_error()
+                    self._reply(message, "Произошла ошибка. Пожалуйста, попробуйте позже.")
+
+            @self.bot.message_handler(commands=['stats'])
+            @instrument_handler('stats')
+            def stats_command(message):
+                try:
+                    logger.info(f"Received /stats command from user {message.from_user.id}")
+                    if not is_admin(message.from_user.id):
+                        from constants import UNAUTHORIZED
+                        self._reply(message, UNAUTHORIZED)
+                        return
+                    # Бот отправляет сообщения в режиме HTML
+                    self._reply(message, html.escape(format_stats()))
+                except Exception as e:
+                    logger.error(f"Error in stats command: {e}", exc_info=True)
+                    record_handler_error()
+                    self._reply(message, "Произошла ошибка. Пожалуйста, попробуйте позже.")
+
+            @self.bot.message_handler(commands=['broadcast'])
+            @instrument_handler('broadcast')
+            def broadcast_command(message):
+                try:
+                    logger.info(f"Received /broadcast command from user {message.from_user.id}")
+                    if not is_admin(message.from_user.id):
+                        from constants import UNAUTHORIZED
+                        self._reply(message, UNAUTHORIZED)
+                        return
+                    text = message.text.partition(' ')[2].strip()
+                    if not text:
+                        self._reply(message, "Использование: /broadcast <текст>")
+                        return
+
+                    def done(sent, failed):
+                        logger.info(f"Broadcast finished: sent {sent}, failed {failed}")
+                        self._reply(message, f"✅ Рассылка завершена: отправлено {sent}, ошибок {failed}")
+
+                    chat_ids = db.get_chat_ids()
+                    self._reply(message, f"Рассылка в чаты: {len(chat_ids)}")
+                    # Рассылка идет с приоритетом PRIORITY_BULK и уступает очередь ответам
+                    self.outbound.broadcast(self.bot.send_message, chat_ids, html.escape(text), on_done=done)
+                except Exception as e:
+                    logger.error(f"Error in broadcast command: {e}", exc_info=True)
+                    record_handler_error()
+                    self._reply(message, "Произошла ошибка. Пожалуйста, попробуйте позже.")
+
+            @self.navigation.route("📝 Создать новое задание")
+            def create_task(message):
+                self._reply(message, "Функция создания задания в разработке")
+
+            @self.navigation.route("📋 Просмотр активных заданий")
+            def view_active_tasks(message):
+                self._reply(message, "Функция просмотра заданий в разработке")
 
             @self.bot.message_handler(func=lambda message: True)
+            @instrument_handler('text')
             def handle_text(message):
                 try:
                     logger.info(f"Received message from user {message.from_user.id}: {message.text}")
-                    if message.text == "❓ Помощь":
-                        help_command(message)
-                    elif message.text == "📝 Создать новое задание":
-                        self.bot.reply_to(message, "Функция создания задания в разработке")
-                    elif message.text == "📋 Просмотр активных заданий":
-                        self.bot.reply_to(message, "Функция просмотра заданий в разработке")
+                    handler = self.navigation.resolve(None, message.text)
+                    if handler is not None:
+                        handler(message)
                     else:
-                        self.bot.reply_to(message, "Команда не распознана")
+                        self._reply(message, "Команда не распознана")
                 except Exception as e:
                     logger.error(f"Error handling message: {e}", exc_info=True)
-                    self.bot.reply_to(message, "Произошла ошибка. Пожалуйста, попробуйте позже.")
+                    record_handler_error()
+                    self._reply(message, "Произошла ошибка. Пожалуйста, попробуйте позже.")
 
             logger.info("All handlers registered successfully")
 
@@ -254,7 +374,12 @@ class TelegramBot:
         """Запуск бота"""
         try:
             with self._lock:
-                logger.info("Starting Telegram bot...")
+                logger.info(f"Starting Telegram bot in {self.mode} mode...")
+                if METRICS_PORT:
+                    self.metrics_server = MetricsServer(METRICS_HOST, METRICS_PORT).start()
+                if self.mode == 'webhook':
+                    self._start_webhook()
+                    return
                 self.bot.infinity_polling(
                     skip_pending=True,
                     timeout=10,
@@ -267,18 +392,49 @@ class TelegramBot:
             self.stop()
             raise
 
+    def _start_webhook(self):
+        """Регистрация webhook и запуск встроенного HTTP-сервера"""
+        self.webhook_server = WebhookServer(
+            self._process_webhook_update,
+            WEBHOOK_SECRET,
+            host=WEBHOOK_HOST,
+            port=WEBHOOK_PORT,
+            path=WEBHOOK_PATH
+        )
+        self.bot.set_webhook(
+            url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=["message"],
+            drop_pending_updates=True
+        )
+        logger.info("Webhook registered successfully")
+        self.webhook_server.run()
+
+    def _process_webhook_update(self, data: dict):
+        """Передача обновления из webhook в общий реестр обработчиков"""
+        update = telebot.types.Update.de_json(data)
+        self.bot.process_new_updates([update])
+
     def stop(self):
         """Остановка бота"""
         try:
             if self.bot:
                 logger.info("Stopping bot...")
-                self.bot.stop_polling()
-                time.sleep(1)  # Даем время на завершение всех процессов
+                if self.webhook_server:
+                    self.webhook_server.shutdown()
+                else:
+                    self.bot.stop_polling()
+                self.dispatcher.stop()  # Дожидаемся обработки полученных обновлений
+                self.outbound.stop()
+                if self.metrics_server:
+                    self.metrics_server.stop()
                 logger.info("Bot stopped successfully")
         except Exception as e:
             logger.error(f"Error stopping bot: {e}", exc_info=True)
 
 if __name__ == "__main__":
+    # Настройка логирования: запись в файл и консоль выполняет фоновый поток
+    setup_logging()
     try:
         # Инициализация базы данных
         db.ensure_database()
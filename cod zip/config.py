@@ -1,20 +1,74 @@
 import os
 
+from dotenv import find_dotenv, load_dotenv
+
+# .env из рабочего каталога загружается до чтения настроек ниже;
+# переменные, уже заданные в окружении, имеют приоритет
+load_dotenv(find_dotenv(usecwd=True))
+
 # Telegram Bot Configuration
 BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', 'YOUR_BOT_TOKEN_HERE')
+BOT_WORKERS = int(os.getenv('BOT_WORKERS', '4'))  # Потоки обработки обновлений
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '64'))  # Обновления разных чатов, обрабатываемые одновременно (python-telegram-bot)
+BOT_API_URL = os.getenv('BOT_API_URL', 'https://api.telegram.org').rstrip('/')  # Локальный Bot API или тестовый сервер
+
+# Webhook Configuration
+# Встроенный сервер принимает только HTTP: снаружи нужен обратный прокси с TLS,
+# который передает запросы на WEBHOOK_HOST:WEBHOOK_PORT (например, 127.0.0.1)
+BOT_MODE = os.getenv('BOT_MODE', 'polling')  # 'polling' или 'webhook'
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')  # Публичный адрес, например https://bot.example.com
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+
+# Metrics Configuration
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9464'))  # 0 отключает эндпоинт /metrics
 
 # Database Configuration
 DATA_DIR = 'data'
 REPORTS_FILE = os.path.join(DATA_DIR, 'reports.json')
 USERS_FILE = os.path.join(DATA_DIR, 'users.json')
 
+# SQLite Configuration
+DB_PATH = os.getenv('DB_PATH', 'bot_database.db')
+DB_STORAGE_PROFILE = os.getenv('DB_STORAGE_PROFILE', 'wal')  # 'default' или 'wal'
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', '100'))  # Порог журнала медленных запросов
+DB_QUERY_LOG_SAMPLE_RATE = float(os.getenv('DB_QUERY_LOG_SAMPLE_RATE', '0.01'))  # Доля запросов в DEBUG-логе
+
+# List Configuration
+LIST_PAGE_SIZE = int(os.getenv('LIST_PAGE_SIZE', '10'))  # Строк на странице списков чатов, заданий и отчетов
+
+# Navigation State Configuration
+NAV_STATE_CACHE_SIZE = int(os.getenv('NAV_STATE_CACHE_SIZE', '10000'))  # Состояния пользователей в памяти
+NAV_STATE_TTL = int(os.getenv('NAV_STATE_TTL', str(7 * 24 * 3600)))  # Сброс состояния неактивных пользователей, с
+
 # Logging Configuration
 LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-LOG_LEVEL = 'INFO'
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_FILE = os.getenv('LOG_FILE', 'logs/bot.log')
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))  # Ротация по размеру
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '10'))
+LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN', '')  # Ротация по времени, например 'midnight'
+LOG_JSON = os.getenv('LOG_JSON', 'false').lower() in ('1', 'true', 'yes')  # Формат JSON Lines
 
 # Report Configuration
 ALLOWED_REPORT_FORMATS = ['.pdf', '.doc', '.docx', '.txt']
 MAX_REPORT_SIZE = 20 * 1024 * 1024  # 20MB
 
+# Media Configuration
+MEDIA_GROUP_WINDOW = float(os.getenv('MEDIA_GROUP_WINDOW', '1.0'))  # Ожидание следующего файла альбома, с
+DELIVERY_CONCURRENCY = int(os.getenv('DELIVERY_CONCURRENCY', '8'))  # Чаты, которым задание отправляется одновременно
+DELIVERY_FLUSH_SIZE = int(os.getenv('DELIVERY_FLUSH_SIZE', '500'))  # Переходов статусов в одной записи в базу
+DELIVERY_FLUSH_INTERVAL = float(os.getenv('DELIVERY_FLUSH_INTERVAL', '2.0'))  # Максимальная задержка записи статусов, с
+DELIVERY_TRACKED_TASKS = int(os.getenv('DELIVERY_TRACKED_TASKS', '1000'))  # Задания со статусами получателей в памяти
+
+# Report Export Configuration
+EXPORT_CONCURRENCY = int(os.getenv('EXPORT_CONCURRENCY', '4'))  # Одновременные загрузки файлов из Telegram
+EXPORT_MAX_DOCUMENT_SIZE = int(os.getenv('EXPORT_MAX_DOCUMENT_SIZE', str(50 * 1024 * 1024)))  # Лимит sendDocument Bot API
+
 # Admin Configuration
-ADMIN_IDS = [123456789]  # Replace with actual admin Telegram IDs
+ADMIN_IDS = ()  # Постоянные ID администраторов в дополнение к переменной окружения ADMIN_ID
+CHAT_ADMIN_CACHE_TTL = int(os.getenv('CHAT_ADMIN_CACHE_TTL', '300'))  # Время жизни списка администраторов группы, с
@@ -2,157 +2,929 @@
 Модуль для работы с базой данных SQLite
 """
 import sqlite3
+import asyncio
+import functools
+import json
 import logging
 import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Any
+
+from migrations import SCHEMA_VERSION, migrate
 
 logger = logging.getLogger(__name__)
+# Отдельный логгер запросов: уровень и обработчики настраиваются независимо
+query_logger = logging.getLogger(f"{__name__}.queries")
+
+# Наблюдатель запросов: (SQL, длительность в секундах, ошибка или None)
+QueryObserver = Callable[[str, float, Optional[BaseException]], None]
+
+# Размер пула соединений по умолчанию
+DEFAULT_POOL_SIZE = 5
+# Время ожидания свободного соединения из пула (в секундах)
+DEFAULT_POOL_TIMEOUT = 30.0
+
+# Профили хранения: PRAGMA для каждого нового соединения и режим записи.
+# В профиле 'wal' читатели не ждут писателей, а все изменения проходят
+# через один поток записи с групповой фиксацией транзакций.
+STORAGE_PROFILES = {
+    'default': {
+        'pragmas': {},
+        'single_writer': False,
+    },
+    'wal': {
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'cache_size': -16000,  # ~16 МБ на соединение
+            'mmap_size': 256 * 1024 * 1024,
+            'busy_timeout': 5000,
+            'temp_store': 'MEMORY',
+        },
+        'single_writer': True,
+    },
+}
+
+# Максимальное число запросов записи в одной групповой транзакции
+WRITER_BATCH_SIZE = 100
+
+# Число строк на странице списков по умолчанию
+DEFAULT_PAGE_SIZE = 10
+
+# Итоговые счетчики таблицы counters (scope_id = 0), поддерживаемые триггерами
+TOTAL_COUNTERS = ('chats', 'chat_groups', 'tasks', 'active_tasks')
+
+# Запросы дольше порога пишутся в лог всегда (в секундах)
+DEFAULT_SLOW_QUERY_THRESHOLD = 0.1
+# Доля успешных запросов, попадающих в лог на уровне DEBUG
+DEFAULT_QUERY_LOG_SAMPLE_RATE = 0.01
+
+
+def redact_params(params: Optional[tuple]) -> str:
+    """Параметры запроса без значений: только типы и длины строк"""
+    if not params:
+        return '()'
+    redacted = []
+    for value in params:
+        if isinstance(value, (str, bytes)):
+            redacted.append(f"<{type(value).__name__}:{len(value)}>")
+        else:
+            redacted.append(f"<{type(value).__name__}>")
+    return '(' + ', '.join(redacted) + ')'
+
+class Page:
+    """Страница списка: строки и наличие соседних страниц"""
+    __slots__ = ('rows', 'has_prev', 'has_next')
+
+    def __init__(self, rows: List[Dict[str, Any]], has_prev: bool, has_next: bool):
+        self.rows = rows
+        self.has_prev = has_prev
+        self.has_next = has_next
+
+
+class DatabaseWriter:
+    """Выделенный поток записи с групповой фиксацией транзакций"""
+
+    def __init__(self, conn: sqlite3.Connection, batch_size: int = WRITER_BATCH_SIZE):
+        # Транзакциями управляем вручную: BEGIN/SAVEPOINT/COMMIT
+        conn.isolation_level = None
+        self._conn = conn
+        self._batch_size = batch_size
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, work: Callable[[sqlite3.Connection], Any]) -> Future:
+        """Постановка функции записи в очередь, work не должна вызывать commit"""
+        future: Future = Future()
+        self._queue.put((work, future))
+        return future
+
+    def stop(self):
+        """Остановка потока записи после обработки очереди"""
+        self._queue.put(None)
+        self._thread.join()
+        self._conn.close()
+
+    def _run(self):
+        """Цикл потока записи"""
+        running = True
+        while running:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            # Забираем все накопившиеся запросы в одну транзакцию
+            batch = [item]
+            while len(batch) < self._batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+
+            self._commit_batch(batch)
+
+    def _commit_batch(self, batch: list):
+        """Выполнение пачки запросов в одной транзакции"""
+        results = []
+        try:
+            self._conn.execute("BEGIN IMMEDIATE")
+            for work, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                # Точка сохранения изолирует ошибку одного запроса от остальных
+                self._conn.execute("SAVEPOINT write_request")
+                try:
+                    result = work(self._conn)
+                except Exception as e:
+                    self._conn.execute("ROLLBACK TO write_request")
+                    self._conn.execute("RELEASE write_request")
+                    results.append((future, None, e))
+                else:
+                    self._conn.execute("RELEASE write_request")
+                    results.append((future, result, None))
+            self._conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка групповой записи в базу данных: {e}", exc_info=True)
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+            for work, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
 
 class Database:
-    def __init__(self, db_path: str = "bot_database.db"):
+    def __init__(self, db_path: str = "bot_database.db",
+                 pool_size: int = DEFAULT_POOL_SIZE,
+                 pool_timeout: float = DEFAULT_POOL_TIMEOUT,
+                 storage_profile: str = 'default',
+                 slow_query_threshold: float = DEFAULT_SLOW_QUERY_THRESHOLD,
+                 query_log_sample_rate: float = DEFAULT_QUERY_LOG_SAMPLE_RATE):
         """Инициализация базы данных"""
+        if pool_size < 1:
+            raise ValueError("Размер пула соединений должен быть не меньше 1")
+        if storage_profile not in STORAGE_PROFILES:
+            raise ValueError(f"Неизвестный профиль хранения: {storage_profile}")
         self.db_path = db_path
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self.storage_profile = storage_profile
+        self._profile = STORAGE_PROFILES[storage_profile]
+        # Пул долгоживущих соединений: соединение выдается потоку на время
+        # запроса и возвращается обратно вместо закрытия
+        self._pool: queue.LifoQueue = queue.LifoQueue(maxsize=pool_size)
+        self._pool_lock = threading.Lock()
+        self._pool_created = 0
+        self._closed = False
+        self._writer: Optional[DatabaseWriter] = None
+        self._query_observers: List[QueryObserver] = []
+        self.slow_query_threshold = slow_query_threshold
+        self.query_log_sample_rate = query_log_sample_rate
         self.ensure_database()
+        if self._profile['single_writer']:
+            self._writer = DatabaseWriter(self.get_connection())
 
     def ensure_database(self):
-        """Создание базы данных и необходимых таблиц"""
+        """Создание базы данных и применение миграций схемы"""
+        conn = None
         try:
             # Проверяем наличие директории для базы данных
             db_dir = os.path.dirname(self.db_path)
             if db_dir and not os.path.exists(db_dir):
                 os.makedirs(db_dir)
 
-            conn = self.get_connection()
+            conn = self._acquire_connection()
+            # Актуальная схема проверяется одним чтением PRAGMA user_version
+            applied = migrate(conn)
+            if applied:
+                logger.info(f"База данных успешно инициализирована, схема версии {SCHEMA_VERSION}")
+
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при инициализации базы данных: {e}", exc_info=True)
+            raise
+        finally:
+            if conn is not None:
+                self._release_connection(conn)
+
+    # Совместимость со старым именем метода
+    _ensure_database = ensure_database
+
+    def get_connection(self) -> sqlite3.Connection:
+        """Создание нового соединения с базой данных (вне пула)"""
+        # Соединение из пула может достаться любому потоку, но в каждый
+        # момент времени им пользуется только один поток
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma, value in self._profile['pragmas'].items():
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        return conn
+
+    def _acquire_connection(self) -> sqlite3.Connection:
+        """Получение соединения из пула"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("База данных закрыта")
+
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+
+        # Свободных соединений нет: создаем новое, если не достигнут лимит
+        with self._pool_lock:
+            can_create = self._pool_created < self.pool_size
+            if can_create:
+                self._pool_created += 1
+
+        if can_create:
+            try:
+                return self.get_connection()
+            except sqlite3.Error:
+                with self._pool_lock:
+                    self._pool_created -= 1
+                raise
+
+        try:
+            return self._pool.get(timeout=self.pool_timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(
+                f"Нет свободных соединений в пуле (ожидание {self.pool_timeout} с)"
+            )
+
+    def _release_connection(self, conn: sqlite3.Connection):
+        """Возврат соединения в пул"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error as e:
+            # Поврежденное соединение в пул не возвращаем
+            logger.warning(f"Соединение исключено из пула: {e}")
+            self._discard_connection(conn)
+            return
+
+        if self._closed:
+            self._discard_connection(conn)
+            return
+        self._pool.put_nowait(conn)
+
+    def _discard_connection(self, conn: sqlite3.Connection):
+        """Закрытие соединения с освобождением места в пуле"""
+        with self._pool_lock:
+            self._pool_created -= 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Соединение из пула на время блока with"""
+        conn = self._acquire_connection()
+        try:
+            yield conn
+        finally:
+            self._release_connection(conn)
+
+    def _run_write(self, work: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Выполнение функции записи с фиксацией транзакции"""
+        if self._writer is not None:
+            return self._writer.submit(work).result()
+
+        conn = self._acquire_connection()
+        try:
+            result = work(conn)
+            conn.commit()
+            return result
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        finally:
+            self._release_connection(conn)
+
+    def close(self):
+        """Закрытие потока записи и всех соединений пула"""
+        if self._writer is not None:
+            self._writer.stop()
+            self._writer = None
+        self._closed = True
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            self._discard_connection(conn)
+
+    def add_query_observer(self, observer: QueryObserver):
+        """Подписка на длительность запросов execute_query (например, для метрик)"""
+        self._query_observers.append(observer)
+
+    def execute_query(self, query: str, params: Optional[tuple] = None) -> List[Dict[str, Any]]:
+        """Выполнение SQL запроса"""
+        started = time.perf_counter()
+        error = None
+        rows = 0
+        try:
+            result = self._execute_query(query, params)
+            rows = len(result)
+            return result
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            if error is None:
+                self._log_query(query, params, duration, rows)
+            for observer in self._query_observers:
+                try:
+                    observer(query, duration, error)
+                except Exception as e:
+                    logger.error(f"Ошибка наблюдателя запросов: {e}")
+
+    def _execute_query(self, query: str, params: Optional[tuple] = None) -> List[Dict[str, Any]]:
+        conn = None
+        try:
+            if query.strip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')):
+                self._run_write(lambda write_conn: write_conn.execute(query, params or ()))
+                return []
+
+            conn = self._acquire_connection()
             cursor = conn.cursor()
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+            return [dict(row) for row in cursor.fetchall()]
 
-            # Создание таблицы чатов с явным указанием DEFAULT для added_at
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS chats (
-                    chat_id INTEGER PRIMARY KEY,
-                    title TEXT NOT NULL,
-                    is_group BOOLEAN NOT NULL,
-                    added_at TIMESTAMP DEFAULT (datetime('now'))
-                )
-            """)
+        except sqlite3.Error as e:
+            # Значения параметров могут содержать личные данные, в лог попадают только типы
+            query_logger.error(
+                "Ошибка выполнения запроса: %s\nЗапрос: %s\nПараметры: %s",
+                e, query, redact_params(params), exc_info=True,
+                extra={'event': 'sql_error', 'sql': query}
+            )
+            raise
+        finally:
+            if conn:
+                self._release_connection(conn)
 
-            # Создание таблицы групп чатов
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS chat_groups (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL UNIQUE,
-                    created_at TIMESTAMP DEFAULT (datetime('now'))
-                )
-            """)
+    def _log_query(self, query: str, params: Optional[tuple], duration: float, rows: int):
+        """Журнал медленных запросов и выборка успешных; форматирование только при записи"""
+        if duration >= self.slow_query_threshold:
+            level = logging.WARNING
+            message = "Медленный SQL запрос (%.1f мс, строк: %d): %s, параметры: %s"
+        elif random.random() < self.query_log_sample_rate:
+            level = logging.DEBUG
+            message = "SQL запрос (%.1f мс, строк: %d): %s, параметры: %s"
+        else:
+            return
+        if not query_logger.isEnabledFor(level):
+            return
 
-            # Создание таблицы связей групп и чатов
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS group_chats (
-                    group_id INTEGER,
-                    chat_id INTEGER,
-                    FOREIGN KEY (group_id) REFERENCES chat_groups (id),
-                    FOREIGN KEY (chat_id) REFERENCES chats (chat_id),
-                    PRIMARY KEY (group_id, chat_id)
-                )
-            """)
+        sql = ' '.join(query.split())
+        duration_ms = duration * 1000
+        redacted = redact_params(params)
+        query_logger.log(
+            level, message, duration_ms, rows, sql, redacted,
+            extra={'event': 'sql', 'sql': sql, 'duration_ms': round(duration_ms, 3),
+                   'rows': rows, 'params': redacted}
+        )
 
-            # Создание таблицы заданий
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS tasks (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    text TEXT NOT NULL,
-                    creator_id INTEGER NOT NULL,
-                    status TEXT DEFAULT 'active',
-                    created_at TIMESTAMP DEFAULT (datetime('now'))
-                )
-            """)
+    def get_active_tasks(self) -> Dict:
+        """Получение активных заданий с дополнительной информацией"""
+        conn = None
+        try:
+            tasks = {}
+            conn = self._acquire_connection()
+            cursor = conn.cursor()
 
-            # Создание таблицы получателей заданий
+            # Получаем основную информацию о заданиях
             cursor.execute("""
-                CREATE TABLE IF NOT EXISTS task_recipients (
-                    task_id INTEGER,
-                    chat_id INTEGER,
-                    group_id INTEGER,
-                    status TEXT DEFAULT 'pending',
-                    FOREIGN KEY (task_id) REFERENCES tasks (id),
-                    FOREIGN KEY (chat_id) REFERENCES chats (chat_id),
-                    FOREIGN KEY (group_id) REFERENCES chat_groups (id),
-                    PRIMARY KEY (task_id, chat_id)
-                )
+                SELECT t.id, t.text, t.created_at, t.status,
+                       tr.chat_id, tr.status as recipient_status,
+                       c.title as chat_title
+                FROM tasks t
+                JOIN task_recipients tr ON t.id = tr.task_id
+                JOIN chats c ON tr.chat_id = c.chat_id
+                WHERE t.status = 'active'
+                ORDER BY t.created_at DESC
             """)
 
-            # Создание таблицы медиафайлов задания
+            task_rows = cursor.fetchall()
+
+            for row in task_rows:
+                task_id = row['id']
+                if task_id not in tasks:
+                    tasks[task_id] = {
+                        'text': row['text'],
+                        'created_at': row['created_at'],
+                        'status': row['status'],
+                        'recipients': {},
+                        'media': []
+                    }
+
+                # Добавляем информацию о получателе
+                chat_id = row['chat_id']
+                tasks[task_id]['recipients'][chat_id] = {
+                    'chat_title': row['chat_title'],
+                    'status': row['recipient_status'],
+                    'media': []
+                }
+
+            # Медиафайлы всех активных заданий получаем одним запросом,
+            # а не отдельным запросом на каждое задание
             cursor.execute("""
-                CREATE TABLE IF NOT EXISTS task_media (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    task_id INTEGER,
-                    file_id TEXT NOT NULL,
-                    file_type TEXT NOT NULL,
-                    FOREIGN KEY (task_id) REFERENCES tasks (id)
-                )
+                SELECT tm.task_id, COALESCE(mf.file_id, tm.file_id) AS file_id, tm.file_type
+                FROM task_media tm
+                LEFT JOIN media_files mf ON mf.id = tm.media_id
+                WHERE tm.task_id IN (SELECT id FROM tasks WHERE status = 'active')
+                ORDER BY tm.task_id, tm.id
             """)
 
-            # Создание таблицы медиафайлов ответов
+            for media in cursor.fetchall():
+                task = tasks.get(media['task_id'])
+                if task is not None:
+                    task['media'].append({
+                        'file_id': media['file_id'],
+                        'file_type': media['file_type']
+                    })
+
+            # Медиафайлы ответов всех активных заданий
             cursor.execute("""
-                CREATE TABLE IF NOT EXISTS response_media (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    task_id INTEGER,
-                    chat_id INTEGER,
-                    file_id TEXT NOT NULL,
-                    file_type TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT (datetime('now')),
-                    FOREIGN KEY (task_id) REFERENCES tasks (id),
-                    FOREIGN KEY (chat_id) REFERENCES chats (chat_id)
-                )
+                SELECT rm.task_id, rm.chat_id, COALESCE(mf.file_id, rm.file_id) AS file_id, rm.file_type
+                FROM response_media rm
+                LEFT JOIN media_files mf ON mf.id = rm.media_id
+                WHERE rm.task_id IN (SELECT id FROM tasks WHERE status = 'active')
+                ORDER BY rm.task_id, rm.id
             """)
 
-            conn.commit()
-            logger.info("База данных успешно инициализирована")
+            for media in cursor.fetchall():
+                task = tasks.get(media['task_id'])
+                if task is None:
+                    continue
+                recipient = task['recipients'].get(media['chat_id'])
+                if recipient is not None:
+                    recipient['media'].append({
+                        'file_id': media['file_id'],
+                        'file_type': media['file_type']
+                    })
+
+            return tasks
 
         except sqlite3.Error as e:
-            logger.error(f"Ошибка при инициализации базы данных: {e}", exc_info=True)
+            logger.error(f"Ошибка при получении активных заданий: {e}")
             raise
         finally:
-            if 'conn' in locals():
-                conn.close()
+            if conn:
+                self._release_connection(conn)
 
-    def get_connection(self) -> sqlite3.Connection:
-        """Получение соединения с базой данных"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+    def create_task(self, text: str, creator_id: int) -> int:
+        """Создание нового задания"""
+        try:
+            def work(conn: sqlite3.Connection) -> int:
+                cursor = conn.execute("""
+                    INSERT INTO tasks (text, creator_id)
+                    VALUES (?, ?)
+                """, (text, creator_id))
+                return cursor.lastrowid
 
-    def execute_query(self, query: str, params: Optional[tuple] = None) -> List[Dict[str, Any]]:
-        """Выполнение SQL запроса"""
+            return self._run_write(work)
+
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при создании задания: {e}")
+            raise
+
+    def add_task_recipient(self, task_id: int, chat_id: int, group_id: Optional[int] = None):
+        """Добавление получателя задания"""
+        try:
+            self._run_write(lambda conn: conn.execute("""
+                INSERT INTO task_recipients (task_id, chat_id, group_id)
+                VALUES (?, ?, ?)
+            """, (task_id, chat_id, group_id)))
+
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при добавлении получателя задания: {e}")
+            raise
+
+    def add_task_recipients(self, task_id: int, chat_ids: Optional[List[int]] = None,
+                            group_ids: Optional[List[int]] = None) -> int:
+        """Массовое добавление получателей задания, возвращает число добавленных"""
+        chat_ids = list(chat_ids or [])
+        group_ids = list(group_ids or [])
+
+        def work(conn: sqlite3.Connection) -> int:
+            # Явно указанные чаты имеют приоритет над чатами из групп
+            recipients = {chat_id: None for chat_id in chat_ids}
+            if group_ids:
+                cursor = conn.execute("""
+                    SELECT group_id, chat_id
+                    FROM group_chats
+                    WHERE group_id IN (SELECT value FROM json_each(?))
+                    ORDER BY group_id, chat_id
+                """, (json.dumps(group_ids),))
+                for row in cursor:
+                    recipients.setdefault(row['chat_id'], row['group_id'])
+
+            # rowcount, а не total_changes: изменения счетчиков в триггерах не учитываются
+            return conn.executemany("""
+                INSERT OR IGNORE INTO task_recipients (task_id, chat_id, group_id)
+                VALUES (?, ?, ?)
+            """, [(task_id, chat_id, group_id) for chat_id, group_id in recipients.items()]).rowcount
+
+        try:
+            inserted = self._run_write(work)
+            logger.info(f"Добавлено получателей задания {task_id}: {inserted}")
+            return inserted
+
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при массовом добавлении получателей задания: {e}")
+            raise
+
+    def get_chat_groups(self, user_id: int) -> List[Dict[str, Any]]:
+        """Получение списка групп чатов"""
         conn = None
         try:
-            conn = self.get_connection()
+            conn = self._acquire_connection()
             cursor = conn.cursor()
 
-            # Логируем запрос до выполнения
-            logger.info(f"Выполняется SQL запрос: {query}")
-            if params:
-                logger.info(f"Параметры запроса: {params}")
+            cursor.execute("""
+                SELECT id, name, created_at
+                FROM chat_groups
+                ORDER BY name
+            """)
 
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
+            return [dict(row) for row in cursor.fetchall()]
 
-            if query.strip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')):
-                conn.commit()
-                logger.info("Запрос успешно выполнен (INSERT/UPDATE/DELETE)")
-                return []
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при получении групп чатов: {e}")
+            raise
+        finally:
+            if conn:
+                self._release_connection(conn)
 
-            result = [dict(row) for row in cursor.fetchall()]
-            logger.info(f"Получено результатов: {len(result)}")
-            return result
+    def get_group_chats(self, group_id: int) -> List[Dict[str, Any]]:
+        """Получение списка чатов в группе"""
+        conn = None
+        try:
+            conn = self._acquire_connection()
+            cursor = conn.cursor()
+
+            cursor.execute("""
+                SELECT c.chat_id, c.title
+                FROM chats c
+                JOIN group_chats gc ON c.chat_id = gc.chat_id
+                WHERE gc.group_id = ?
+                ORDER BY c.title
+            """, (group_id,))
+
+            return [dict(row) for row in cursor.fetchall()]
 
         except sqlite3.Error as e:
-            logger.error(f"Ошибка выполнения запроса: {e}\nЗапрос: {query}\nПараметры: {params}", exc_info=True)
-            if conn:
-                conn.rollback()
+            logger.error(f"Ошибка при получении чатов группы: {e}")
             raise
         finally:
             if conn:
-                conn.close()
\ No newline at end of file
+                self._release_connection(conn)
+
+    def _fetch_page(self, select: str, conditions: List[str], params: list,
+                    sort_column: str, id_column: str, cursor: Optional[tuple],
+                    backward: bool, limit: int) -> Page:
+        """Страница по ключу (sort_column, id_column) в порядке убывания
+
+        cursor - ключ последней строки предыдущей страницы (или первой строки
+        следующей при backward=True). Запрос читает не больше limit + 1 строк
+        по индексу независимо от размера таблицы.
+        """
+        conditions = list(conditions)
+        params = list(params)
+        if cursor is not None:
+            conditions.append(f"({sort_column}, {id_column}) {'>' if backward else '<'} (?, ?)")
+            params.extend(cursor)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = 'ASC' if backward else 'DESC'
+        rows = self.execute_query(
+            f"{select} {where} ORDER BY {sort_column} {order}, {id_column} {order} LIMIT ?",
+            tuple(params) + (limit + 1,)
+        )
+        # Лишняя строка показывает, что за страницей есть еще строки
+        has_more = len(rows) > limit
+        del rows[limit:]
+        if backward:
+            rows.reverse()
+            return Page(rows, has_prev=has_more, has_next=True)
+        return Page(rows, has_prev=cursor is not None, has_next=has_more)
+
+    def get_chats_page(self, cursor: Optional[tuple] = None, backward: bool = False,
+                       limit: int = DEFAULT_PAGE_SIZE) -> Page:
+        """Страница подключенных чатов, новые первыми; курсор (added_at, chat_id)"""
+        return self._fetch_page(
+            "SELECT chat_id, title, is_group, added_at FROM chats", [], [],
+            'added_at', 'chat_id', cursor, backward, limit
+        )
+
+    def get_tasks_page(self, cursor: Optional[tuple] = None, backward: bool = False,
+                       limit: int = DEFAULT_PAGE_SIZE, status: Optional[str] = None,
+                       creator_id: Optional[int] = None) -> Page:
+        """Страница заданий, новые первыми; курсор (created_at, id)"""
+        conditions, params = [], []
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status)
+        if creator_id is not None:
+            conditions.append("creator_id = ?")
+            params.append(creator_id)
+        return self._fetch_page(
+            "SELECT id, text, creator_id, status, created_at FROM tasks", conditions, params,
+            'created_at', 'id', cursor, backward, limit
+        )
+
+    @staticmethod
+    def _register_media(conn: sqlite3.Connection, file_unique_id: str, file_id: str, file_type: str) -> int:
+        """ID файла в реестре; file_id обновляется на последний полученный"""
+        conn.execute("""
+            INSERT INTO media_files (file_unique_id, file_id, file_type)
+            VALUES (?, ?, ?)
+            ON CONFLICT (file_unique_id) DO UPDATE SET file_id = excluded.file_id
+        """, (file_unique_id, file_id, file_type))
+        return conn.execute(
+            "SELECT id FROM media_files WHERE file_unique_id = ?", (file_unique_id,)
+        ).fetchone()[0]
+
+    @classmethod
+    def _link_media(cls, conn: sqlite3.Connection, table: str, columns: Dict[str, Any],
+                    file_unique_id: str, file_id: str, file_type: str) -> bool:
+        """Ссылка на файл из реестра в table в текущей транзакции"""
+        media_id = cls._register_media(conn, file_unique_id, file_id, file_type)
+        names = ', '.join(columns)
+        placeholders = ', '.join('?' * len(columns))
+        cursor = conn.execute(
+            f"INSERT OR IGNORE INTO {table} ({names}, file_id, file_type, media_id) "
+            f"VALUES ({placeholders}, ?, ?, ?)",
+            (*columns.values(), file_id, file_type, media_id)
+        )
+        if cursor.rowcount:
+            conn.execute("UPDATE media_files SET ref_count = ref_count + 1 WHERE id = ?", (media_id,))
+        return cursor.rowcount > 0
+
+    def _attach_media(self, table: str, columns: Dict[str, Any], file_unique_id: str,
+                      file_id: str, file_type: str) -> bool:
+        """Ссылка на файл из реестра в table, возвращает False для уже существующей ссылки"""
+        try:
+            return self._run_write(lambda conn: self._link_media(
+                conn, table, columns, file_unique_id, file_id, file_type
+            ))
+
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при сохранении файла {file_unique_id} в {table}: {e}")
+            raise
+
+    def add_task_media(self, task_id: int, file_unique_id: str, file_id: str, file_type: str) -> bool:
+        """Добавление файла к заданию без повторов одного файла"""
+        return self._attach_media('task_media', {'task_id': task_id}, file_unique_id, file_id, file_type)
+
+    def add_response_media(self, task_id: int, chat_id: int, file_unique_id: str,
+                           file_id: str, file_type: str) -> bool:
+        """Добавление файла к ответу чата без повторов одного файла"""
+        return self._attach_media('response_media', {'task_id': task_id, 'chat_id': chat_id},
+                                  file_unique_id, file_id, file_type)
+
+    def create_task_with_media(self, text: str, creator_id: int, media: List[Dict[str, str]]) -> int:
+        """Создание задания вместе с вложениями в одной транзакции
+
+        media - словари file_unique_id, file_id, file_type в порядке отправки.
+        """
+        def work(conn: sqlite3.Connection) -> int:
+            task_id = conn.execute("""
+                INSERT INTO tasks (text, creator_id)
+                VALUES (?, ?)
+            """, (text, creator_id)).lastrowid
+            for item in media:
+                self._link_media(conn, 'task_media', {'task_id': task_id},
+                                 item['file_unique_id'], item['file_id'], item['file_type'])
+            return task_id
+
+        try:
+            task_id = self._run_write(work)
+            logger.info(f"Создано задание {task_id} с вложениями: {len(media)}")
+            return task_id
+
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при создании задания с вложениями: {e}")
+            raise
+
+    def get_task_media(self, task_id: int) -> List[Dict[str, Any]]:
+        """Вложения задания в порядке добавления с актуальным file_id"""
+        return self.execute_query("""
+            SELECT tm.id, COALESCE(mf.file_id, tm.file_id) AS file_id, tm.file_type
+            FROM task_media tm
+            LEFT JOIN media_files mf ON mf.id = tm.media_id
+            WHERE tm.task_id = ?
+            ORDER BY tm.id
+        """, (task_id,))
+
+    def get_chat_ids(self) -> List[int]:
+        """ID всех подключенных чатов"""
+        return [row['chat_id'] for row in self.execute_query("SELECT chat_id FROM chats ORDER BY chat_id")]
+
+    def get_media_file_id(self, file_unique_id: str) -> Optional[str]:
+        """Актуальный file_id файла из реестра или None"""
+        rows = self.execute_query(
+            "SELECT file_id FROM media_files WHERE file_unique_id = ?", (file_unique_id,)
+        )
+        return rows[0]['file_id'] if rows else None
+
+    def get_report_media_batch(self, after_id: int, limit: int, task_id: Optional[int] = None,
+                               created_from: Optional[str] = None,
+                               created_to: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Файлы отчетов с данными заданий для экспорта: следующие limit записей после after_id"""
+        conditions, params = ["tm.id > ?"], [after_id]
+        if task_id is not None:
+            conditions.append("tm.task_id = ?")
+            params.append(task_id)
+        if created_from is not None:
+            conditions.append("t.created_at >= ?")
+            params.append(created_from)
+        if created_to is not None:
+            conditions.append("t.created_at < ?")
+            params.append(created_to)
+        params.append(limit)
+        return self.execute_query(f"""
+            SELECT tm.id, tm.task_id, COALESCE(mf.file_id, tm.file_id) AS file_id, tm.file_type,
+                   t.created_at, t.creator_id, t.status, t.text,
+                   (SELECT IFNULL(SUM(c.value), 0) FROM counters c
+                    WHERE c.scope_id = tm.task_id AND substr(c.name, 1, 11) = 'recipients_') AS recipients,
+                   (SELECT IFNULL(SUM(c.value), 0) FROM counters c
+                    WHERE c.scope_id = tm.task_id AND c.name = 'recipients_pending') AS pending_recipients
+            FROM task_media tm
+            JOIN tasks t ON t.id = tm.task_id
+            LEFT JOIN media_files mf ON mf.id = tm.media_id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY tm.id
+            LIMIT ?
+        """, tuple(params))
+
+    def get_recipient_statuses(self, task_id: int) -> List[Dict[str, Any]]:
+        """Статусы всех получателей задания"""
+        return self.execute_query(
+            "SELECT chat_id, status FROM task_recipients WHERE task_id = ?", (task_id,)
+        )
+
+    def update_recipient_statuses(self, updates: List[tuple], messages: Sequence[tuple] = ()) -> int:
+        """Пакетная запись статусов получателей, возвращает число измененных строк
+
+        updates - кортежи (статус, ID сообщения или None, ID задания, ID чата),
+        messages - кортежи (ID чата, ID сообщения, ID задания) всех отправленных
+        сообщений заданий; записываются в той же транзакции.
+        """
+        def work(conn: sqlite3.Connection) -> int:
+            changed = conn.executemany("""
+                UPDATE task_recipients
+                SET status = ?, message_id = COALESCE(?, message_id), status_updated_at = datetime('now')
+                WHERE task_id = ? AND chat_id = ?
+            """, updates).rowcount
+            if messages:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO task_messages (chat_id, message_id, task_id) VALUES (?, ?, ?)",
+                    messages
+                )
+            return changed
+
+        try:
+            return self._run_write(work)
+
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при записи статусов получателей ({len(updates)} шт.): {e}")
+            raise
+
+    def get_task_by_message(self, chat_id: int, message_id: int) -> Optional[int]:
+        """ID задания, отправленного в чат сообщением message_id, или None"""
+        rows = self.execute_query(
+            "SELECT task_id FROM task_messages WHERE chat_id = ? AND message_id = ?",
+            (chat_id, message_id)
+        )
+        return rows[0]['task_id'] if rows else None
+
+    def get_totals(self) -> Dict[str, int]:
+        """Итоговые счетчики: чаты, группы, задания и активные задания"""
+        totals = dict.fromkeys(TOTAL_COUNTERS, 0)
+        for row in self.execute_query("SELECT name, value FROM counters WHERE scope_id = 0"):
+            if row['name'] in totals:
+                totals[row['name']] = row['value']
+        return totals
+
+    def get_recipient_counts(self, task_ids: List[int]) -> Dict[int, Dict[str, int]]:
+        """Число получателей заданий по статусам: ID задания -> статус -> число"""
+        counts: Dict[int, Dict[str, int]] = {task_id: {} for task_id in task_ids}
+        rows = self.execute_query("""
+            SELECT scope_id, substr(name, 12) AS status, value
+            FROM counters
+            WHERE scope_id IN (SELECT value FROM json_each(?)) AND substr(name, 1, 11) = 'recipients_'
+        """, (json.dumps(list(task_ids)),))
+        for row in rows:
+            counts[row['scope_id']][row['status']] = row['value']
+        return counts
+
+    def get_group_chat_counts(self, group_ids: List[int]) -> Dict[int, int]:
+        """Число чатов в группах: ID группы -> число"""
+        counts = dict.fromkeys(group_ids, 0)
+        rows = self.execute_query("""
+            SELECT scope_id, value
+            FROM counters
+            WHERE scope_id IN (SELECT value FROM json_each(?)) AND name = 'group_chats'
+        """, (json.dumps(list(group_ids)),))
+        for row in rows:
+            counts[row['scope_id']] = row['value']
+        return counts
+
+    def load_user_state(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Сохраненное состояние навигации пользователя или None"""
+        rows = self.execute_query(
+            "SELECT state, history, updated_at FROM user_states WHERE user_id = ?", (user_id,)
+        )
+        return rows[0] if rows else None
+
+    def save_user_state(self, user_id: int, state: int, history: bytes, updated_at: float):
+        """Сохранение состояния навигации пользователя"""
+        try:
+            self._run_write(lambda conn: conn.execute("""
+                INSERT INTO user_states (user_id, state, history, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    state = excluded.state,
+                    history = excluded.history,
+                    updated_at = excluded.updated_at
+            """, (user_id, state, history, updated_at)))
+
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при сохранении состояния пользователя {user_id}: {e}")
+            raise
+
+    def delete_user_state(self, user_id: int):
+        """Удаление состояния навигации пользователя"""
+        try:
+            self._run_write(lambda conn: conn.execute(
+                "DELETE FROM user_states WHERE user_id = ?", (user_id,)
+            ))
+
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при удалении состояния пользователя {user_id}: {e}")
+            raise
+
+    def delete_idle_user_states(self, updated_before: float) -> int:
+        """Удаление состояний, не менявшихся с updated_before, возвращает число удаленных"""
+        try:
+            return self._run_write(lambda conn: conn.execute(
+                "DELETE FROM user_states WHERE updated_at < ?", (updated_before,)
+            ).rowcount)
+
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при удалении устаревших состояний пользователей: {e}")
+            raise
+
+
+class AsyncDatabase:
+    """Асинхронный фасад над Database для обработчиков python-telegram-bot"""
+
+    def __init__(self, db: Database, max_workers: Optional[int] = None):
+        self.db = db
+        # По одному потоку на соединение пула: задачи не ждут свободного соединения
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or db.pool_size,
+            thread_name_prefix='db-async'
+        )
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Выполнение блокирующей функции базы данных вне цикла событий"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def fetch_all(self, query: str, params: Optional[tuple] = None) -> List[Dict[str, Any]]:
+        """Получение всех строк результата запроса"""
+        return await self.run(self.db.execute_query, query, params)
+
+    async def fetch_one(self, query: str, params: Optional[tuple] = None) -> Optional[Dict[str, Any]]:
+        """Получение первой строки результата запроса"""
+        rows = await self.run(self.db.execute_query, query, params)
+        return rows[0] if rows else None
+
+    async def execute(self, query: str, params: Optional[tuple] = None) -> None:
+        """Выполнение запроса на изменение данных"""
+        await self.run(self.db.execute_query, query, params)
+
+    def close(self):
+        """Остановка пула потоков"""
+        self._executor.shutdown(wait=True)
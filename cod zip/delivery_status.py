@@ -0,0 +1,174 @@
+"""
+Статусы доставки заданий получателям
+
+Переходы статусов (отправлено, доставлено, ошибка, получен ответ) копятся в
+памяти и записываются в task_recipients одним executemany: по таймеру или
+при накоплении flush_size переходов. Повторные переходы одного получателя
+до записи схлопываются в одну строку. Число получателей в каждом статусе
+ведут триггеры базы в таблице counters (Database.get_recipient_counts).
+
+ID всех сообщений задания в чате (текст, каждый файл альбома) записываются
+в task_messages той же пачкой; find_task находит задание по ответу и до
+записи пачки.
+"""
+import asyncio
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from config import DELIVERY_FLUSH_INTERVAL, DELIVERY_FLUSH_SIZE, DELIVERY_TRACKED_TASKS
+
+logger = logging.getLogger(__name__)
+
+# Статусы в порядке продвижения: переход возможен только вперед, поэтому
+# запоздалая отметка об отправке не отменяет полученный ответ, а повторная
+# отправка после ошибки разрешена
+STATUSES = ('pending', 'failed', 'sent', 'delivered', 'responded')
+STATUS_RANK = {status: rank for rank, status in enumerate(STATUSES)}
+
+# Выполнение блокирующей функции вне цикла событий, например AsyncDatabase.run
+Offload = Callable[..., Awaitable[Any]]
+
+
+class DeliveryTracker:
+    """Буфер переходов статусов получателей"""
+
+    def __init__(self, db, flush_size: int = DELIVERY_FLUSH_SIZE,
+                 flush_interval: float = DELIVERY_FLUSH_INTERVAL,
+                 max_tasks: int = DELIVERY_TRACKED_TASKS):
+        if flush_size < 1 or max_tasks < 1:
+            raise ValueError("Размер пачки и число заданий в памяти должны быть не меньше 1")
+        self.db = db
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_tasks = max_tasks
+        # ID задания -> {ID чата: статус}, вытеснение LRU
+        self._statuses: OrderedDict = OrderedDict()
+        # (ID задания, ID чата) -> (статус, ID сообщения): еще не записанные и записываемые
+        self._pending: Dict[Tuple[int, int], Tuple[str, Optional[int]]] = {}
+        self._inflight: Dict[Tuple[int, int], Tuple[str, Optional[int]]] = {}
+        # (ID чата, ID сообщения) -> ID задания: еще не записанные и записываемые
+        self._messages: Dict[Tuple[int, int], int] = {}
+        self._inflight_messages: Dict[Tuple[int, int], int] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def load_task(self, task_id: int) -> None:
+        """Загрузка статусов получателей задания, если их нет в памяти"""
+        with self._lock:
+            if task_id in self._statuses:
+                self._statuses.move_to_end(task_id)
+                return
+        rows = self.db.get_recipient_statuses(task_id)
+        with self._lock:
+            if task_id in self._statuses:
+                return
+            statuses = {row['chat_id']: row['status'] for row in rows}
+            # Переходы, еще не попавшие в базу, новее прочитанных строк
+            for source in (self._inflight, self._pending):
+                for (pending_task_id, chat_id), (status, _) in source.items():
+                    if pending_task_id == task_id and chat_id in statuses:
+                        statuses[chat_id] = status
+            self._statuses[task_id] = statuses
+            while len(self._statuses) > self.max_tasks:
+                self._statuses.popitem(last=False)
+
+    def mark(self, task_id: int, chat_id: int, status: str, message_id: Optional[int] = None) -> bool:
+        """Переход получателя в статус status; False, если он не получатель или статус не новее"""
+        if status not in STATUS_RANK:
+            raise ValueError(f"Неизвестный статус доставки: {status}")
+        self.load_task(task_id)
+        with self._lock:
+            statuses = self._statuses.get(task_id)
+            current = statuses.get(chat_id) if statuses is not None else None
+            if current is None:
+                return False
+            if message_id is not None:
+                self._messages[(chat_id, message_id)] = task_id
+            if STATUS_RANK[status] <= STATUS_RANK.get(current, 0):
+                return False
+            statuses[chat_id] = status
+
+            key = (task_id, chat_id)
+            previous = self._pending.get(key)
+            if message_id is None and previous is not None:
+                message_id = previous[1]
+            self._pending[key] = (status, message_id)
+            full = len(self._pending) >= self.flush_size
+        if full:
+            self._wake()
+        return True
+
+    def add_messages(self, task_id: int, chat_id: int, message_ids: Iterable[int]) -> None:
+        """Запоминание всех сообщений, которыми задание отправлено в чат"""
+        with self._lock:
+            for message_id in message_ids:
+                self._messages[(chat_id, message_id)] = task_id
+
+    def find_task(self, chat_id: int, message_id: int) -> Optional[int]:
+        """ID задания, отправленного в чат сообщением message_id, с учетом незаписанных"""
+        key = (chat_id, message_id)
+        with self._lock:
+            task_id = self._messages.get(key) or self._inflight_messages.get(key)
+        if task_id is not None:
+            return task_id
+        return self.db.get_task_by_message(chat_id, message_id)
+
+    def flush(self) -> int:
+        """Запись накопленных переходов и сообщений одной транзакцией, возвращает число переходов"""
+        with self._lock:
+            if not self._pending and not self._messages:
+                return 0
+            batch, self._pending = self._pending, {}
+            messages, self._messages = self._messages, {}
+            self._inflight = batch
+            self._inflight_messages = messages
+        try:
+            self.db.update_recipient_statuses([
+                (status, message_id, task_id, chat_id)
+                for (task_id, chat_id), (status, message_id) in batch.items()
+            ], [(chat_id, message_id, task_id) for (chat_id, message_id), task_id in messages.items()])
+        except sqlite3.Error:
+            # Переходы и сообщения возвращаются в буфер и записываются при следующем сбросе
+            with self._lock:
+                for key, (status, message_id) in batch.items():
+                    newer = self._pending.get(key)
+                    self._pending[key] = (newer[0], newer[1] or message_id) if newer else (status, message_id)
+                for key, task_id in messages.items():
+                    self._messages.setdefault(key, task_id)
+            raise
+        finally:
+            with self._lock:
+                self._inflight = {}
+                self._inflight_messages = {}
+        logger.debug(f"Записано переходов статусов доставки: {len(batch)}")
+        return len(batch)
+
+    async def run(self, offload: Offload) -> None:
+        """Сброс переходов по таймеру и при заполнении буфера до отмены задачи"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                try:
+                    await offload(self.flush)
+                except sqlite3.Error:
+                    pass  # Ошибка записана в лог базой данных, повтор при следующем сбросе
+        finally:
+            self._loop = None
+
+    def _wake(self) -> None:
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._wakeup.set)
@@ -0,0 +1,75 @@
+"""
+Параллельная обработка обновлений с сохранением порядка внутри чата
+"""
+import logging
+import queue
+import threading
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Маркер остановки рабочего потока
+_STOP = object()
+
+
+def update_key(update: Any) -> Optional[int]:
+    """Ключ упорядочивания обновления: ID чата, иначе ID пользователя"""
+    chat = getattr(update, 'chat', None)
+    if chat is not None:
+        return chat.id
+
+    # CallbackQuery и подобные обновления содержат исходное сообщение
+    message = getattr(update, 'message', None)
+    if message is not None and getattr(message, 'chat', None) is not None:
+        return message.chat.id
+
+    user = getattr(update, 'from_user', None)
+    if user is not None:
+        return user.id
+    return None
+
+
+class ChatOrderedDispatcher:
+    """Пул рабочих потоков: один чат всегда обрабатывается одним потоком"""
+
+    def __init__(self, num_workers: int = 4, name: str = 'update-worker'):
+        if num_workers < 1:
+            raise ValueError("Число рабочих потоков должно быть не меньше 1")
+        self.num_workers = num_workers
+        self._queues: List[queue.Queue] = [queue.Queue() for _ in range(num_workers)]
+        self._threads = [
+            threading.Thread(target=self._worker, args=(q,), name=f"{name}-{n}", daemon=True)
+            for n, q in enumerate(self._queues)
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"Запущено рабочих потоков обработки обновлений: {num_workers}")
+
+    def submit(self, key: Optional[int], func: Callable[..., Any], *args, **kwargs):
+        """Постановка задачи в очередь потока, закрепленного за ключом"""
+        index = hash(key) % self.num_workers if key is not None else 0
+        self._queues[index].put((func, args, kwargs))
+
+    def pending(self) -> int:
+        """Число задач, ожидающих обработки"""
+        return sum(q.qsize() for q in self._queues)
+
+    def stop(self, wait: bool = True):
+        """Остановка рабочих потоков после обработки очередей"""
+        for q in self._queues:
+            q.put(_STOP)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _worker(self, tasks: queue.Queue):
+        """Цикл рабочего потока"""
+        while True:
+            item = tasks.get()
+            if item is _STOP:
+                break
+            func, args, kwargs = item
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Ошибка при обработке обновления: {e}", exc_info=True)
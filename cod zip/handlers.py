@@ -10,6 +10,9 @@ from telegram.ext import (
     Filters
 )
 from database import Database
+from config import (
+    DB_PATH, DB_POOL_SIZE, DB_QUERY_LOG_SAMPLE_RATE, DB_SLOW_QUERY_MS, DB_STORAGE_PROFILE
+)
 from navigation_manager import NavigationManager
 from constants import *
 from utils import (
@@ -20,7 +23,13 @@ from utils import (
 )
 
 logger = logging.getLogger(__name__)
-db = Database("bot_database.db")
+db = Database(
+    DB_PATH,
+    pool_size=DB_POOL_SIZE,
+    storage_profile=DB_STORAGE_PROFILE,
+    slow_query_threshold=DB_SLOW_QUERY_MS / 1000,
+    query_log_sample_rate=DB_QUERY_LOG_SAMPLE_RATE
+)
 nav_manager = NavigationManager()
 
 def start_command(update: Update, context: CallbackContext):
@@ -0,0 +1,111 @@
+"""
+Альбомы (media group) во вложениях заданий
+
+Telegram присылает каждый файл альбома отдельным обновлением с общим
+media_group_id. MediaGroupBuffer собирает такие обновления, пока между ними
+проходит не больше window секунд, и передает альбом целиком одним вызовом,
+поэтому задание с альбомом сохраняется одной транзакцией.
+
+plan_delivery раскладывает текст и вложения задания на минимальное число
+сообщений: до 10 файлов в одном sendMediaGroup вместо отдельного sendPhoto
+или sendDocument на каждый файл.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import MEDIA_GROUP_WINDOW
+
+logger = logging.getLogger(__name__)
+
+# Обработка собранного альбома: (media_group_id, элементы в порядке поступления)
+FlushCallback = Callable[[str, List[Any]], Awaitable[None]]
+
+# Ограничения Bot API
+MEDIA_GROUP_LIMIT = 10
+CAPTION_LIMIT = 1024
+# Типы файлов, которые можно смешивать в одном альбоме; документы и аудио
+# отправляются только альбомами из файлов своего типа
+VISUAL_TYPES = frozenset(('photo', 'video'))
+
+
+class MediaGroupBuffer:
+    """Сбор обновлений альбома по media_group_id с окном ожидания"""
+
+    def __init__(self, flush: FlushCallback, window: float = MEDIA_GROUP_WINDOW):
+        if window <= 0:
+            raise ValueError("Окно ожидания альбома должно быть больше 0")
+        self.flush = flush
+        self.window = window
+        self._groups: Dict[str, List[Any]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        # Ссылки на запущенные обработки, чтобы задачи не собрал сборщик мусора
+        self._tasks: set = set()
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    def add(self, media_group_id: str, item: Any) -> None:
+        """Добавление элемента альбома; окно ожидания отсчитывается заново"""
+        self._groups.setdefault(media_group_id, []).append(item)
+        timer = self._timers.pop(media_group_id, None)
+        if timer is not None:
+            timer.cancel()
+        loop = asyncio.get_running_loop()
+        self._timers[media_group_id] = loop.call_later(self.window, self._release, media_group_id)
+
+    async def drain(self) -> None:
+        """Немедленная обработка всех собранных альбомов, например при остановке"""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for media_group_id in list(self._groups):
+            self._release(media_group_id)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _release(self, media_group_id: str) -> None:
+        self._timers.pop(media_group_id, None)
+        items = self._groups.pop(media_group_id, None)
+        if not items:
+            return
+        task = asyncio.get_running_loop().create_task(self._run(media_group_id, items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, media_group_id: str, items: List[Any]) -> None:
+        try:
+            await self.flush(media_group_id, items)
+        except Exception as e:
+            logger.error(f"Ошибка обработки альбома {media_group_id}: {e}", exc_info=True)
+
+
+def plan_delivery(text: str, media: List[Dict[str, str]]) -> List[Tuple[str, Any]]:
+    """Сообщения для отправки задания одному чату
+
+    Возвращает шаги ('text', текст), ('single', файл) и ('group', [файлы]);
+    файл - словарь file_id, file_type и caption. Текст становится подписью
+    первого файла, если помещается в лимит подписи.
+    """
+    text = text or ''
+    steps: List[Tuple[str, Any]] = []
+    caption: Optional[str] = text or None
+    if text and (not media or len(text) > CAPTION_LIMIT):
+        steps.append(('text', text))
+        caption = None
+
+    # Файлы группируются по совместимости типов с сохранением порядка групп
+    batches: Dict[str, List[Dict[str, Any]]] = {}
+    for item in media:
+        kind = 'visual' if item['file_type'] in VISUAL_TYPES else item['file_type']
+        batches.setdefault(kind, []).append({'file_id': item['file_id'], 'file_type': item['file_type']})
+
+    for files in batches.values():
+        for start in range(0, len(files), MEDIA_GROUP_LIMIT):
+            chunk = files[start:start + MEDIA_GROUP_LIMIT]
+            chunk[0]['caption'], caption = caption, None
+            if len(chunk) == 1:
+                steps.append(('single', chunk[0]))
+            else:
+                steps.append(('group', chunk))
+    return steps
@@ -0,0 +1,34 @@
+"""
+Реестр файлов Telegram по file_unique_id
+
+Один и тот же файл, полученный от разных пользователей или повторно, имеет
+одинаковый file_unique_id. Реестр хранит одну строку на уникальный файл со
+счетчиком ссылок и последний известный file_id; читатели вложений получают
+его через соединение с media_files, так что рассылка одного вложения тысячам
+чатов не требует повторной загрузки.
+"""
+from typing import Dict, List, Optional
+
+
+class MediaRegistry:
+    """Реестр файлов в базе данных (таблица media_files)"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def add_task_media(self, task_id: int, file_unique_id: str, file_id: str, file_type: str) -> bool:
+        """Добавление файла к заданию, False если он уже добавлен"""
+        return self.db.add_task_media(task_id, file_unique_id, file_id, file_type)
+
+    def create_task_with_media(self, text: str, creator_id: int, media: List[Dict[str, str]]) -> int:
+        """Создание задания с вложениями одной транзакцией"""
+        return self.db.create_task_with_media(text, creator_id, media)
+
+    def add_response_media(self, task_id: int, chat_id: int, file_unique_id: str,
+                           file_id: str, file_type: str) -> bool:
+        """Добавление файла к ответу чата, False если он уже добавлен"""
+        return self.db.add_response_media(task_id, chat_id, file_unique_id, file_id, file_type)
+
+    def get_file_id(self, file_unique_id: str) -> Optional[str]:
+        """file_id для повторной отправки файла или None, если файл неизвестен"""
+        return self.db.get_media_file_id(file_unique_id)
@@ -0,0 +1,351 @@
+"""
+Метрики бота: счетчики, гистограммы задержек и экспорт в формате Prometheus
+"""
+import bisect
+import contextvars
+import functools
+import inspect
+import logging
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Границы гистограмм (в секундах)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Labels, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """Монотонный счетчик с метками"""
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: Any):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self) -> List[Tuple[Labels, float]]:
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+                for key, value in sorted(self.samples())]
+
+
+class Gauge:
+    """Текущее значение, вычисляемое при экспорте"""
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, func: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.func = func
+
+    def render(self) -> List[str]:
+        try:
+            return [f"{self.name} {self.func()}"]
+        except Exception as e:
+            logger.error(f"Ошибка вычисления метрики {self.name}: {e}")
+            return []
+
+
+class Histogram:
+    """Гистограмма длительностей с метками"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Для каждого набора меток: [счетчики по корзинам + переполнение, сумма, количество]
+        self._series: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self) -> List[Tuple[Labels, List[int], float, int]]:
+        with self._lock:
+            return [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+
+    def quantile(self, q: float, **labels: Any) -> Optional[float]:
+        """Оценка квантиля сверху по границам корзин"""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                return None
+            counts, _, count = list(series[0]), series[1], series[2]
+        return _bucket_quantile(self.buckets, counts, count, q)
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, counts, total, count in sorted(self.samples()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+def _bucket_quantile(buckets: Sequence[float], counts: List[int], count: int, q: float) -> Optional[float]:
+    if not count:
+        return None
+    rank = q * count
+    cumulative = 0
+    for bound, bucket_count in zip(buckets, counts):
+        cumulative += bucket_count
+        if cumulative >= rank:
+            return bound
+    return float('inf')
+
+
+class MetricsRegistry:
+    """Реестр метрик с экспортом в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, func: Callable[[], float]) -> Gauge:
+        """Регистрация (или замена) вычисляемой метрики"""
+        gauge = Gauge(name, documentation, func)
+        with self._lock:
+            self._metrics[name] = gauge
+        return gauge
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+HANDLER_REQUESTS = REGISTRY.counter(
+    'bot_handler_requests_total', 'Число вызовов обработчиков', ('handler',))
+HANDLER_ERRORS = REGISTRY.counter(
+    'bot_handler_errors_total', 'Число ошибок в обработчиках', ('handler',))
+HANDLER_LATENCY = REGISTRY.histogram(
+    'bot_handler_duration_seconds', 'Длительность обработки обновления', ('handler',))
+DB_QUERY_LATENCY = REGISTRY.histogram(
+    'bot_db_query_duration_seconds', 'Длительность SQL-запросов', ('query',), DB_BUCKETS)
+DB_QUERY_ERRORS = REGISTRY.counter(
+    'bot_db_query_errors_total', 'Число ошибок SQL-запросов', ('query',))
+API_CALL_LATENCY = REGISTRY.histogram(
+    'bot_api_call_duration_seconds', 'Длительность вызовов Bot API', ('method',))
+API_CALL_ERRORS = REGISTRY.counter(
+    'bot_api_call_errors_total', 'Число ошибок вызовов Bot API', ('method',))
+
+# Обработчик, выполняемый в текущем потоке или задаче asyncio
+_current_handler: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('current_handler', default=None)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+
+@functools.lru_cache(maxsize=512)
+def normalize_query(query: str) -> str:
+    """Нормализация SQL для метки метрики: литералы и списки IN заменяются на ?"""
+    normalized = _WHITESPACE_RE.sub(' ', query).strip()
+    normalized = _STRING_RE.sub('?', normalized)
+    normalized = _NUMBER_RE.sub('?', normalized)
+    return _IN_LIST_RE.sub('(?)', normalized)
+
+
+def observe_query(query: str, duration: float, error: Optional[BaseException] = None):
+    """Наблюдатель Database: учет времени выполнения запроса"""
+    label = normalize_query(query)
+    DB_QUERY_LATENCY.observe(duration, query=label)
+    if error is not None:
+        DB_QUERY_ERRORS.inc(query=label)
+
+
+def observe_api_call(method: str, duration: float, failed: bool = False):
+    """Учет времени вызова Bot API"""
+    API_CALL_LATENCY.observe(duration, method=method)
+    if failed:
+        API_CALL_ERRORS.inc(method=method)
+
+
+def record_handler_error():
+    """Учет ошибки, перехваченной внутри текущего обработчика"""
+    handler = _current_handler.get()
+    if handler is not None:
+        HANDLER_ERRORS.inc(handler=handler)
+
+
+def instrument_handler(name: str):
+    """Декоратор обработчика: число вызовов, ошибки и длительность (sync и async)"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                token = _current_handler.set(name)
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    HANDLER_ERRORS.inc(handler=name)
+                    raise
+                finally:
+                    _finish_handler(name, started, token)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            token = _current_handler.set(name)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                HANDLER_ERRORS.inc(handler=name)
+                raise
+            finally:
+                _finish_handler(name, started, token)
+        return wrapper
+    return decorator
+
+
+def _finish_handler(name: str, started: float, token: contextvars.Token):
+    HANDLER_LATENCY.observe(time.perf_counter() - started, handler=name)
+    HANDLER_REQUESTS.inc(handler=name)
+    _current_handler.reset(token)
+
+
+def format_stats(top: int = 10) -> str:
+    """Сводка метрик для команды /stats"""
+    lines = ["📊 Статистика обработчиков:"]
+    handlers = sorted(HANDLER_LATENCY.samples(), key=lambda s: s[2], reverse=True)
+    if not handlers:
+        lines.append("нет данных")
+    for key, counts, total, count in handlers[:top]:
+        errors = HANDLER_ERRORS.value(handler=key[0])
+        p95 = _bucket_quantile(HANDLER_LATENCY.buckets, counts, count, 0.95)
+        lines.append(f"• {key[0]}: {count} вызовов, ошибок {errors:g} ({errors / count:.1%}), "
+                     f"среднее {total / count * 1000:.1f} мс, p95 ≤ {p95 * 1000:.0f} мс")
+
+    lines.append("\n🗄 Самые затратные SQL-запросы:")
+    queries = sorted(DB_QUERY_LATENCY.samples(), key=lambda s: s[2], reverse=True)
+    if not queries:
+        lines.append("нет данных")
+    for key, _, total, count in queries[:top]:
+        lines.append(f"• {key[0][:80]}: {count} раз, всего {total * 1000:.1f} мс, "
+                     f"среднее {total / count * 1000:.2f} мс")
+
+    lines.append("\n📤 Вызовы Bot API:")
+    calls = sorted(API_CALL_LATENCY.samples(), key=lambda s: s[2], reverse=True)
+    if not calls:
+        lines.append("нет данных")
+    for key, _, total, count in calls[:top]:
+        errors = API_CALL_ERRORS.value(method=key[0])
+        lines.append(f"• {key[0]}: {count} вызовов, ошибок {errors:g}, "
+                     f"среднее {total / count * 1000:.1f} мс")
+    return '\n'.join(lines)
+
+
+class MetricsServer:
+    """HTTP-сервер с эндпоинтом /metrics для Prometheus"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 9464, registry: MetricsRegistry = REGISTRY):
+        self.registry = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'MetricsServer':
+        """Запуск сервера в фоновом потоке"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name='metrics-server', daemon=True)
+        self._thread.start()
+        logger.info(f"Метрики доступны на порту {self.port} (/metrics)")
+        return self
+
+    def stop(self):
+        """Остановка сервера"""
+        self._server.shutdown()
+        self._server.server_close()
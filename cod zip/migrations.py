@@ -0,0 +1,275 @@
+"""
+Версионные миграции схемы базы данных SQLite
+
+Текущая версия схемы хранится в PRAGMA user_version. Миграции применяются
+строго по порядку, каждая в отдельной транзакции. База данных актуальной
+версии проверяется одним чтением PRAGMA без выполнения DDL.
+"""
+import sqlite3
+import logging
+from typing import Callable, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Шаг миграции: SQL-инструкция или функция, получающая соединение
+MigrationStep = Union[str, Callable[[sqlite3.Connection], None]]
+
+
+def add_column(table: str, column: str, definition: str) -> Callable[[sqlite3.Connection], None]:
+    """Шаг миграции: добавление столбца, если его еще нет"""
+    def step(conn: sqlite3.Connection):
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return step
+
+
+def bump_counter(name: str, scope_id: str, delta: str) -> str:
+    """SQL изменения материализованного счетчика для тела триггера"""
+    return (
+        f"INSERT INTO counters (scope_id, name, value) VALUES ({scope_id}, {name}, {delta}) "
+        f"ON CONFLICT (scope_id, name) DO UPDATE SET value = value + ({delta});"
+    )
+
+
+# Миграции: (версия, описание, шаги). Новые миграции добавляются только в конец.
+MIGRATIONS: Tuple[Tuple[int, str, Sequence[MigrationStep]], ...] = (
+    (1, "Базовые таблицы", (
+        # Таблица чатов с явным указанием DEFAULT для added_at
+        """CREATE TABLE IF NOT EXISTS chats (
+            chat_id INTEGER PRIMARY KEY,
+            title TEXT NOT NULL,
+            is_group BOOLEAN NOT NULL,
+            added_at TIMESTAMP DEFAULT (datetime('now'))
+        )""",
+        # Группы чатов
+        """CREATE TABLE IF NOT EXISTS chat_groups (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            created_at TIMESTAMP DEFAULT (datetime('now'))
+        )""",
+        # Связи групп и чатов
+        """CREATE TABLE IF NOT EXISTS group_chats (
+            group_id INTEGER,
+            chat_id INTEGER,
+            FOREIGN KEY (group_id) REFERENCES chat_groups (id),
+            FOREIGN KEY (chat_id) REFERENCES chats (chat_id),
+            PRIMARY KEY (group_id, chat_id)
+        )""",
+        # Задания
+        """CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            text TEXT NOT NULL,
+            creator_id INTEGER NOT NULL,
+            status TEXT DEFAULT 'active',
+            created_at TIMESTAMP DEFAULT (datetime('now'))
+        )""",
+        # Получатели заданий
+        """CREATE TABLE IF NOT EXISTS task_recipients (
+            task_id INTEGER,
+            chat_id INTEGER,
+            group_id INTEGER,
+            status TEXT DEFAULT 'pending',
+            FOREIGN KEY (task_id) REFERENCES tasks (id),
+            FOREIGN KEY (chat_id) REFERENCES chats (chat_id),
+            FOREIGN KEY (group_id) REFERENCES chat_groups (id),
+            PRIMARY KEY (task_id, chat_id)
+        )""",
+        # Медиафайлы заданий
+        """CREATE TABLE IF NOT EXISTS task_media (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER,
+            file_id TEXT NOT NULL,
+            file_type TEXT NOT NULL,
+            FOREIGN KEY (task_id) REFERENCES tasks (id)
+        )""",
+        # Медиафайлы ответов
+        """CREATE TABLE IF NOT EXISTS response_media (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER,
+            chat_id INTEGER,
+            file_id TEXT NOT NULL,
+            file_type TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT (datetime('now')),
+            FOREIGN KEY (task_id) REFERENCES tasks (id),
+            FOREIGN KEY (chat_id) REFERENCES chats (chat_id)
+        )""",
+    )),
+    (2, "Вторичные индексы для горячих запросов", (
+        # Частичный индекс: только активные задания в порядке создания
+        """CREATE INDEX IF NOT EXISTS idx_tasks_active_created_at
+           ON tasks (created_at) WHERE status = 'active'""",
+        # Задания по статусу и автору в порядке создания
+        "CREATE INDEX IF NOT EXISTS idx_tasks_status_created_at ON tasks (status, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_creator_created_at ON tasks (creator_id, created_at)",
+        # Покрывающие индексы для статусов получателей
+        "CREATE INDEX IF NOT EXISTS idx_task_recipients_task_status ON task_recipients (task_id, status)",
+        "CREATE INDEX IF NOT EXISTS idx_task_recipients_chat_status ON task_recipients (chat_id, status)",
+        # Медиафайлы по заданию
+        "CREATE INDEX IF NOT EXISTS idx_task_media_task ON task_media (task_id)",
+        "CREATE INDEX IF NOT EXISTS idx_response_media_task ON response_media (task_id)",
+        # Чаты в порядке подключения и обратная связь чат -> группы
+        "CREATE INDEX IF NOT EXISTS idx_chats_added_at ON chats (added_at)",
+        "CREATE INDEX IF NOT EXISTS idx_group_chats_chat ON group_chats (chat_id)",
+    )),
+    (3, "Состояния навигации пользователей", (
+        # Идентификатор текущего состояния и история переходов по одному байту
+        # на состояние (см. navigation_manager.STATES)
+        """CREATE TABLE IF NOT EXISTS user_states (
+            user_id INTEGER PRIMARY KEY,
+            state INTEGER NOT NULL,
+            history BLOB NOT NULL,
+            updated_at REAL NOT NULL
+        )""",
+        # Удаление состояний неактивных пользователей
+        "CREATE INDEX IF NOT EXISTS idx_user_states_updated_at ON user_states (updated_at)",
+    )),
+    (4, "Индекс для постраничного списка всех заданий", (
+        "CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks (created_at)",
+    )),
+    (5, "Реестр файлов Telegram по file_unique_id", (
+        # Одна строка на уникальный файл; ref_count - число ссылок из task_media и response_media
+        """CREATE TABLE IF NOT EXISTS media_files (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_unique_id TEXT NOT NULL UNIQUE,
+            file_id TEXT NOT NULL,
+            file_type TEXT NOT NULL,
+            ref_count INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT (datetime('now'))
+        )""",
+        add_column('task_media', 'media_id', 'INTEGER REFERENCES media_files (id)'),
+        add_column('response_media', 'media_id', 'INTEGER REFERENCES media_files (id)'),
+        # Повторная отправка того же файла не создает новую ссылку
+        """CREATE UNIQUE INDEX IF NOT EXISTS idx_task_media_task_media
+           ON task_media (task_id, media_id) WHERE media_id IS NOT NULL""",
+        """CREATE UNIQUE INDEX IF NOT EXISTS idx_response_media_task_chat_media
+           ON response_media (task_id, chat_id, media_id) WHERE media_id IS NOT NULL""",
+        # Удаление файлов без ссылок
+        "CREATE INDEX IF NOT EXISTS idx_media_files_unreferenced ON media_files (id) WHERE ref_count <= 0",
+    )),
+    (6, "Статусы доставки заданий получателям", (
+        # Сообщение задания в чате получателя: ответ на него отмечает задание отвеченным
+        add_column('task_recipients', 'message_id', 'INTEGER'),
+        add_column('task_recipients', 'status_updated_at', 'TIMESTAMP'),
+        """CREATE INDEX IF NOT EXISTS idx_task_recipients_chat_message
+           ON task_recipients (chat_id, message_id) WHERE message_id IS NOT NULL""",
+    )),
+    (7, "Материализованные счетчики", (
+        # Итоги (scope_id = 0), получатели задания по статусам (scope_id = ID задания,
+        # name = 'recipients_<статус>') и чаты группы (scope_id = ID группы);
+        # поддерживаются триггерами. Все счетчики одного объекта лежат рядом в ключе
+        """CREATE TABLE IF NOT EXISTS counters (
+            scope_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            value INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (scope_id, name)
+        ) WITHOUT ROWID""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_chats_insert_counters AFTER INSERT ON chats BEGIN
+            {bump_counter("'chats'", '0', '1')}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_chats_delete_counters AFTER DELETE ON chats BEGIN
+            {bump_counter("'chats'", '0', '-1')}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_chat_groups_insert_counters AFTER INSERT ON chat_groups BEGIN
+            {bump_counter("'chat_groups'", '0', '1')}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_chat_groups_delete_counters AFTER DELETE ON chat_groups BEGIN
+            {bump_counter("'chat_groups'", '0', '-1')}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_group_chats_insert_counters AFTER INSERT ON group_chats BEGIN
+            {bump_counter("'group_chats'", 'NEW.group_id', '1')}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_group_chats_delete_counters AFTER DELETE ON group_chats BEGIN
+            {bump_counter("'group_chats'", 'OLD.group_id', '-1')}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_tasks_insert_counters AFTER INSERT ON tasks BEGIN
+            {bump_counter("'tasks'", '0', '1')}
+            {bump_counter("'active_tasks'", '0', "NEW.status IS 'active'")}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_tasks_delete_counters AFTER DELETE ON tasks BEGIN
+            {bump_counter("'tasks'", '0', '-1')}
+            {bump_counter("'active_tasks'", '0', "-(OLD.status IS 'active')")}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_tasks_status_counters AFTER UPDATE OF status ON tasks
+            WHEN (OLD.status IS 'active') != (NEW.status IS 'active') BEGIN
+            {bump_counter("'active_tasks'", '0', "(NEW.status IS 'active') - (OLD.status IS 'active')")}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_task_recipients_insert_counters AFTER INSERT ON task_recipients BEGIN
+            {bump_counter("'recipients_' || IFNULL(NEW.status, 'pending')", 'NEW.task_id', '1')}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_task_recipients_delete_counters AFTER DELETE ON task_recipients BEGIN
+            {bump_counter("'recipients_' || IFNULL(OLD.status, 'pending')", 'OLD.task_id', '-1')}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_task_recipients_status_counters AFTER UPDATE OF status ON task_recipients
+            WHEN OLD.status IS NOT NEW.status BEGIN
+            {bump_counter("'recipients_' || IFNULL(OLD.status, 'pending')", 'OLD.task_id', '-1')}
+            {bump_counter("'recipients_' || IFNULL(NEW.status, 'pending')", 'NEW.task_id', '1')}
+        END""",
+        # Начальные значения по уже существующим данным
+        "DELETE FROM counters",
+        """INSERT INTO counters (scope_id, name, value)
+           SELECT 0, 'chats', COUNT(*) FROM chats
+           UNION ALL SELECT 0, 'chat_groups', COUNT(*) FROM chat_groups
+           UNION ALL SELECT 0, 'tasks', COUNT(*) FROM tasks
+           UNION ALL SELECT 0, 'active_tasks', COUNT(*) FROM tasks WHERE status = 'active'
+           UNION ALL SELECT group_id, 'group_chats', COUNT(*) FROM group_chats GROUP BY group_id
+           UNION ALL SELECT task_id, 'recipients_' || IFNULL(status, 'pending'), COUNT(*)
+                     FROM task_recipients GROUP BY task_id, IFNULL(status, 'pending')""",
+    )),
+    (8, "Все сообщения заданий в чатах получателей", (
+        # Задание может уйти в чат несколькими сообщениями (текст, альбом):
+        # ответ на любое из них относится к заданию
+        """CREATE TABLE IF NOT EXISTS task_messages (
+            chat_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            task_id INTEGER NOT NULL,
+            PRIMARY KEY (chat_id, message_id),
+            FOREIGN KEY (task_id) REFERENCES tasks (id)
+        ) WITHOUT ROWID""",
+        """INSERT OR IGNORE INTO task_messages (chat_id, message_id, task_id)
+           SELECT chat_id, message_id, task_id FROM task_recipients WHERE message_id IS NOT NULL""",
+    )),
+)
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Текущая версия схемы базы данных"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Применение недостающих миграций, возвращает число примененных"""
+    current = get_schema_version(conn)
+    if current >= SCHEMA_VERSION:
+        return 0
+
+    applied = 0
+    for version, description, steps in MIGRATIONS:
+        if version <= current:
+            continue
+
+        # BEGIN IMMEDIATE сериализует миграции нескольких процессов,
+        # поэтому версию перечитываем уже внутри транзакции
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+
+            logger.info(f"Применение миграции {version}: {description}")
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+            applied += 1
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error(f"Ошибка миграции {version} ({description}): {e}", exc_info=True)
+            raise
+
+    return applied
@@ -0,0 +1,53 @@
+"""
+Постраничный вывод списков с inline-кнопками «назад/вперед»
+
+Кнопки несут курсор (ключ сортировки и ID крайней строки страницы), поэтому
+соседняя страница выбирается по индексу без OFFSET и без состояния на сервере.
+"""
+import json
+from typing import Any, List, Optional, Tuple
+
+# Префикс callback_data кнопок пагинации
+CALLBACK_PREFIX = 'pg'
+# Ограничения Bot API
+MAX_CALLBACK_DATA_LENGTH = 64
+MAX_MESSAGE_LENGTH = 4096
+
+
+def encode_cursor(view: str, backward: bool, sort_value: Any, row_id: int) -> str:
+    """callback_data кнопки перехода к соседней странице"""
+    # Значение сортировки последнее: метка времени сама содержит ':'
+    data = f"{CALLBACK_PREFIX}:{view}:{'p' if backward else 'n'}:{row_id}:{sort_value}"
+    if len(data.encode('utf-8')) > MAX_CALLBACK_DATA_LENGTH:
+        raise ValueError(f"Курсор длиннее {MAX_CALLBACK_DATA_LENGTH} байт: {data}")
+    return data
+
+
+def decode_cursor(data: str) -> Tuple[str, bool, Tuple[str, int]]:
+    """Разбор callback_data: (представление, назад, (значение сортировки, ID))"""
+    prefix, view, direction, row_id, sort_value = data.split(':', 4)
+    if prefix != CALLBACK_PREFIX or direction not in ('p', 'n'):
+        raise ValueError(f"Некорректный курсор: {data}")
+    return view, direction == 'p', (sort_value, int(row_id))
+
+
+def page_markup(view: str, page, sort_key: str, id_key: str) -> Optional[str]:
+    """JSON inline-клавиатуры с кнопками соседних страниц или None"""
+    buttons = []
+    if page.rows and page.has_prev:
+        first = page.rows[0]
+        buttons.append({'text': "⬅️ Назад", 'callback_data': encode_cursor(view, True, first[sort_key], first[id_key])})
+    if page.rows and page.has_next:
+        last = page.rows[-1]
+        buttons.append({'text': "Вперед ➡️", 'callback_data': encode_cursor(view, False, last[sort_key], last[id_key])})
+    if not buttons:
+        return None
+    return json.dumps({'inline_keyboard': [buttons]}, ensure_ascii=False, separators=(',', ':'))
+
+
+def render_page(title: str, items: List[str]) -> str:
+    """Текст страницы: заголовок и элементы через пустую строку"""
+    text = '\n\n'.join([title, *items])
+    if len(text) > MAX_MESSAGE_LENGTH:
+        text = text[:MAX_MESSAGE_LENGTH - 1] + '…'
+    return text
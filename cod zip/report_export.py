@@ -0,0 +1,193 @@
+"""
+Экспорт файлов отчетов в ZIP-архив для администраторов
+
+Файлы загружаются из Telegram параллельно (не больше concurrency одновременно)
+во временные файлы и по одному дописываются в архив на диске. В памяти и на
+диске одновременно находится не больше 2 * concurrency файлов, поэтому расход
+памяти не зависит от общего объема отчетов. Описание всех файлов и заданий
+записывается в manifest.csv внутри архива. Если задан max_size, сборка
+прерывается, как только архив превышает этот размер.
+"""
+import asyncio
+import csv
+import logging
+import os
+import tempfile
+import zipfile
+from datetime import date, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from config import EXPORT_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+# Загрузка файла: (file_id, путь назначения) -> путь файла на серверах Telegram
+Downloader = Callable[[str, str], Awaitable[Optional[str]]]
+
+MANIFEST_NAME = 'manifest.csv'
+MANIFEST_FIELDS = (
+    'media_id', 'task_id', 'task_created_at', 'task_status', 'creator_id',
+    'recipients', 'pending_recipients', 'file_type', 'file', 'error', 'task_text'
+)
+# Число записей task_media, читаемых из базы за один запрос
+EXPORT_BATCH_SIZE = 200
+# Уже сжатые форматы записываются без повторного сжатия
+STORED_SUFFIXES = frozenset((
+    '.zip', '.gz', '.7z', '.rar', '.pdf', '.docx', '.xlsx', '.pptx',
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.mp3', '.mp4', '.mov', '.ogg', '.oga'
+))
+
+EXPORT_USAGE = (
+    "Использование:\n"
+    "/export_reports - все отчеты\n"
+    "/export_reports <ID задания>\n"
+    "/export_reports <ГГГГ-ММ-ДД> [ГГГГ-ММ-ДД] - задания, созданные в эти дни"
+)
+
+
+class ArchiveTooLarge(Exception):
+    """Архив превысил допустимый размер, сборка прервана"""
+
+    def __init__(self, max_size: int):
+        super().__init__(f"Архив больше {max_size} байт")
+        self.max_size = max_size
+
+
+def parse_export_args(args: List[str]) -> Dict[str, object]:
+    """Фильтры экспорта из аргументов команды: ID задания или диапазон дат"""
+    if not args:
+        return {}
+    if len(args) == 1 and args[0].isdigit():
+        return {'task_id': int(args[0])}
+    if len(args) > 2:
+        raise ValueError("Слишком много аргументов")
+    first = date.fromisoformat(args[0])
+    last = date.fromisoformat(args[1]) if len(args) == 2 else first
+    if last < first:
+        raise ValueError("Конец диапазона раньше начала")
+    # created_at хранится как 'ГГГГ-ММ-ДД ЧЧ:ММ:СС', конец диапазона не включается
+    return {'created_from': first.isoformat(), 'created_to': (last + timedelta(days=1)).isoformat()}
+
+
+class ReportExporter:
+    """Потоковая сборка ZIP-архива файлов отчетов"""
+
+    def __init__(self, async_db, download: Downloader, concurrency: int = EXPORT_CONCURRENCY,
+                 batch_size: int = EXPORT_BATCH_SIZE):
+        if concurrency < 1:
+            raise ValueError("Число одновременных загрузок должно быть не меньше 1")
+        self.async_db = async_db
+        self.download = download
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+
+    async def export(self, archive_path: str, max_size: Optional[int] = None, **filters) -> Dict[str, int]:
+        """Запись архива в archive_path, возвращает число записанных и незагруженных файлов
+
+        Если архив становится больше max_size байт, сборка прекращается с ArchiveTooLarge.
+        """
+        stats = {'files': 0, 'failed': 0}
+        # Очереди ограничены, поэтому загрузки не опережают запись в архив
+        pending: asyncio.Queue = asyncio.Queue(self.concurrency)
+        downloaded: asyncio.Queue = asyncio.Queue(self.concurrency)
+
+        with tempfile.TemporaryDirectory(prefix='reports-export-') as tmp_dir:
+            manifest_path = os.path.join(tmp_dir, MANIFEST_NAME)
+            with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as archive, \
+                    open(manifest_path, 'w', newline='', encoding='utf-8-sig') as manifest:
+                writer = csv.writer(manifest)
+                writer.writerow(MANIFEST_FIELDS)
+
+                try:
+                    async with asyncio.TaskGroup() as group:
+                        group.create_task(self._produce(pending, filters))
+                        for _ in range(self.concurrency):
+                            group.create_task(self._download_worker(pending, downloaded, tmp_dir))
+                        group.create_task(self._write(downloaded, archive, writer, stats, max_size))
+                except* ArchiveTooLarge as too_large:
+                    logger.warning(f"Экспорт отчетов прерван: архив больше {max_size} байт")
+                    raise too_large.exceptions[0] from None
+
+                manifest.close()
+                archive.write(manifest_path, MANIFEST_NAME)
+                if max_size is not None and archive.fp.tell() > max_size:
+                    raise ArchiveTooLarge(max_size)
+
+        logger.info(f"Экспорт отчетов: записано файлов {stats['files']}, ошибок загрузки {stats['failed']}")
+        return stats
+
+    async def _produce(self, pending: asyncio.Queue, filters: dict):
+        """Чтение записей task_media из базы пачками по возрастанию id"""
+        after_id = 0
+        while True:
+            rows = await self.async_db.run(
+                self.async_db.db.get_report_media_batch, after_id, self.batch_size, **filters
+            )
+            for row in rows:
+                await pending.put(row)
+            if len(rows) < self.batch_size:
+                break
+            after_id = rows[-1]['id']
+        for _ in range(self.concurrency):
+            await pending.put(None)
+
+    async def _download_worker(self, pending: asyncio.Queue, downloaded: asyncio.Queue, tmp_dir: str):
+        """Загрузка файлов во временную директорию"""
+        while True:
+            row = await pending.get()
+            if row is None:
+                await downloaded.put(None)
+                return
+            path = os.path.join(tmp_dir, str(row['id']))
+            try:
+                remote_path = await self.download(row['file_id'], path)
+            except Exception as e:
+                logger.error(f"Ошибка загрузки файла {row['file_id']} задания {row['task_id']}: {e}")
+                # Частично загруженный файл не попадает в архив и удаляется сразу
+                _remove(path)
+                await downloaded.put((row, None, str(e)))
+            else:
+                suffix = os.path.splitext(remote_path or '')[1].lower()[:10]
+                await downloaded.put((row, (path, suffix), None))
+
+    async def _write(self, downloaded: asyncio.Queue, archive: zipfile.ZipFile, writer, stats: dict,
+                     max_size: Optional[int]):
+        """Последовательная запись загруженных файлов в архив и манифест"""
+        finished = 0
+        while finished < self.concurrency:
+            item = await downloaded.get()
+            if item is None:
+                finished += 1
+                continue
+
+            row, file, error = item
+            name = ''
+            if file is not None:
+                path, suffix = file
+                name = f"task_{row['task_id']}/{row['id']}_{row['file_type']}{suffix}"
+                compression = zipfile.ZIP_STORED if suffix in STORED_SUFFIXES else zipfile.ZIP_DEFLATED
+                try:
+                    # ZipFile.write копирует файл блоками, не загружая его целиком
+                    await asyncio.to_thread(archive.write, path, name, compression)
+                    stats['files'] += 1
+                except OSError as e:
+                    logger.error(f"Ошибка записи файла {name} в архив: {e}")
+                    name, error = '', str(e)
+                finally:
+                    _remove(path)
+                if max_size is not None and archive.fp.tell() > max_size:
+                    raise ArchiveTooLarge(max_size)
+            if error is not None:
+                stats['failed'] += 1
+
+            writer.writerow((
+                row['id'], row['task_id'], row['created_at'], row['status'], row['creator_id'],
+                row['recipients'], row['pending_recipients'], row['file_type'], name, error or '', row['text']
+            ))
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,78 @@
+import json
+import pytest
+from telegram.error import RetryAfter
+from telegram.ext import ExtBot
+from telegram.request import BaseRequest
+from api_rate_limiter import BotApiRateLimiter
+from outbound import PRIORITY_BULK, PRIORITY_INTERACTIVE, AsyncRateLimiter
+
+class FakeRequest(BaseRequest):
+    """Bot API без сети: sendMessage возвращает сообщение (первые flood_errors вызовов - 429), остальные методы - 5"""
+    def __init__(self, flood_errors=0):
+        self.calls = []
+        self.flood_errors = flood_errors
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        endpoint = url.rsplit('/', 1)[-1]
+        self.calls.append(endpoint)
+        if endpoint == 'sendMessage' and self.flood_errors:
+            self.flood_errors -= 1
+            return 429, json.dumps({
+                'ok': False, 'error_code': 429, 'description': 'Too Many Requests',
+                'parameters': {'retry_after': 0.01},
+            }).encode()
+        if not endpoint.startswith('send'):
+            return 200, json.dumps({'ok': True, 'result': 5}).encode()
+        params = request_data.parameters if request_data else {}
+        result = {
+            'message_id': len(self.calls), 'date': 0, 'text': params.get('text', ''),
+            'chat': {'id': params.get('chat_id', 0), 'type': 'group', 'title': 'Чат'},
+        }
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+class RecordingLimiter(AsyncRateLimiter):
+    """AsyncRateLimiter, запоминающий запрошенные разрешения"""
+    def __init__(self):
+        super().__init__()
+        self.acquired = []
+
+    async def acquire(self, chat_id, priority=PRIORITY_INTERACTIVE):
+        self.acquired.append((chat_id, priority))
+        await super().acquire(chat_id, priority)
+
+@pytest.mark.asyncio
+async def test_all_messages_share_limiter_with_priority():
+    """Проверка: ответы и рассылки идут через один ограничитель, служебные запросы - мимо"""
+    limiter = RecordingLimiter()
+    bot = ExtBot('1:token', request=FakeRequest(), rate_limiter=BotApiRateLimiter(limiter))
+
+    await bot.send_message(-100, "ответ")
+    await bot.send_message(-200, "рассылка", rate_limit_args=PRIORITY_BULK)
+    assert await bot.get_chat_member_count(-100) == 5
+
+    assert limiter.acquired == [(-100, PRIORITY_INTERACTIVE), (-200, PRIORITY_BULK)]
+
+@pytest.mark.asyncio
+async def test_flood_limit_is_retried():
+    """Проверка повтора запроса после ответа 429 и отказа после max_retries"""
+    request = FakeRequest(flood_errors=2)
+    bot = ExtBot('1:token', request=request, rate_limiter=BotApiRateLimiter(AsyncRateLimiter()))
+    message = await bot.send_message(-100, "ответ")
+    assert message.text == "ответ"
+    assert request.calls == ['sendMessage'] * 3
+
+    request = FakeRequest(flood_errors=5)
+    bot = ExtBot('1:token', request=request, rate_limiter=BotApiRateLimiter(AsyncRateLimiter(), max_retries=1))
+    with pytest.raises(RetryAfter):
+        await bot.send_message(-100, "ответ")
+    assert request.calls == ['sendMessage'] * 2
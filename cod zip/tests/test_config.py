@@ -0,0 +1,17 @@
+import os
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_settings_read_from_dotenv(tmp_path):
+    """Проверка чтения настроек из .env рабочего каталога при импорте config"""
+    (tmp_path / '.env').write_text("WEBHOOK_PORT=9443\nLIST_PAGE_SIZE=7\n", encoding='utf-8')
+    env = {key: value for key, value in os.environ.items() if key not in ('WEBHOOK_PORT', 'LIST_PAGE_SIZE')}
+    env['PYTHONPATH'] = PROJECT_DIR
+
+    result = subprocess.run(
+        [sys.executable, '-c', "import config; print(config.WEBHOOK_PORT, config.LIST_PAGE_SIZE)"],
+        cwd=tmp_path, env=env, capture_output=True, text=True, check=True
+    )
+    assert result.stdout.split() == ['9443', '7']
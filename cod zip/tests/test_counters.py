@@ -0,0 +1,61 @@
+import sqlite3
+from migrations import SCHEMA_VERSION, migrate
+
+def count(db, query, params=()):
+    return db.execute_query(query, params)[0]['count']
+
+def test_counters_follow_writes(temp_db):
+    """Проверка триггеров: счетчики совпадают с COUNT(*) после вставок, изменений и удалений"""
+    for chat_id in (-1, -2, -3):
+        temp_db.execute_query("INSERT INTO chats (chat_id, title, is_group) VALUES (?, 'Чат', 1)", (chat_id,))
+    temp_db.execute_query("INSERT INTO chat_groups (id, name) VALUES (1, 'Группа')")
+    temp_db.execute_query("INSERT INTO group_chats (group_id, chat_id) VALUES (1, -1), (1, -2)")
+    first = temp_db.create_task('Первое', 1)
+    second = temp_db.create_task('Второе', 1)
+    temp_db.add_task_recipients(first, [-1, -2, -3])
+    temp_db.add_task_recipients(second, group_ids=[1])
+    temp_db.update_recipient_statuses([('responded', 10, first, -1), ('failed', None, first, -2)])
+    temp_db.execute_query("UPDATE tasks SET status = 'completed' WHERE id = ?", (second,))
+    temp_db.execute_query("DELETE FROM group_chats WHERE chat_id = -2")
+    temp_db.execute_query("DELETE FROM chats WHERE chat_id = -3")
+
+    assert temp_db.get_totals() == {
+        'chats': count(temp_db, "SELECT COUNT(*) AS count FROM chats"),
+        'chat_groups': 1,
+        'tasks': 2,
+        'active_tasks': count(temp_db, "SELECT COUNT(*) AS count FROM tasks WHERE status = 'active'"),
+    }
+    assert temp_db.get_totals()['chats'] == 2
+    assert temp_db.get_recipient_counts([first, second]) == {
+        first: {'pending': 1, 'failed': 1, 'responded': 1},
+        second: {'pending': 2},
+    }
+    assert temp_db.get_group_chat_counts([1, 2]) == {1: 1, 2: 0}
+
+def test_migration_backfills_counters(tmp_path):
+    """Проверка начального заполнения счетчиков для базы с данными"""
+    conn = sqlite3.connect(tmp_path / 'old.db', isolation_level=None)
+    migrate(conn)
+    conn.execute("INSERT INTO chats (chat_id, title, is_group) VALUES (-1, 'Чат', 1)")
+    conn.execute("INSERT INTO tasks (id, text, creator_id, status) VALUES (1, 'Задание', 1, 'active')")
+    conn.execute("INSERT INTO task_recipients (task_id, chat_id, status) VALUES (1, -1, 'responded')")
+    # База версии 6: счетчиков и триггеров еще нет
+    conn.execute("DROP TABLE counters")
+    conn.execute("PRAGMA user_version = 6")
+
+    assert migrate(conn) == SCHEMA_VERSION - 6
+    rows = conn.execute("SELECT scope_id, name, value FROM counters WHERE value != 0 ORDER BY scope_id, name").fetchall()
+    assert rows == [(0, 'active_tasks', 1), (0, 'chats', 1), (0, 'tasks', 1), (1, 'recipients_responded', 1)]
+    conn.close()
+
+def test_recipient_counters_match_prefix_literally(temp_db):
+    """Проверка отбора счетчиков получателей по префиксу без подстановочного '_'"""
+    task_id = temp_db.create_task('Задание', 1)
+    temp_db.execute_query("INSERT INTO chats (chat_id, title, is_group) VALUES (-1, 'Чат', 1)")
+    temp_db.add_task_recipients(task_id, [-1])
+    temp_db.execute_query("INSERT INTO counters (scope_id, name, value) VALUES (?, 'recipientsXpending', 5)", (task_id,))
+    temp_db.execute_query("INSERT INTO task_media (task_id, file_id, file_type) VALUES (?, 'file', 'photo')", (task_id,))
+
+    assert temp_db.get_recipient_counts([task_id]) == {task_id: {'pending': 1}}
+    row, = temp_db.get_report_media_batch(0, 10)
+    assert row['recipients'] == 1
@@ -1,3 +1,4 @@
+import logging
 import pytest
 from database import Database
 
@@ -55,3 +56,322 @@ def test_add_task(temp_db):
     task_chats = temp_db.get_task_chats(task_id)
     assert len(task_chats) == len(chat_ids)
     assert task_chats[0]['chat_id'] == chat_ids[0]
+
+def test_connection_pool_reuses_connections(temp_db):
+    """Проверка повторного использования соединений из пула"""
+    with temp_db.connection() as first:
+        pass
+    with temp_db.connection() as second:
+        pass
+
+    assert first is second
+
+def test_connection_pool_is_bounded(tmp_path):
+    """Проверка ограничения размера пула"""
+    import sqlite3
+
+    db = Database(str(tmp_path / "pool.db"), pool_size=2, pool_timeout=0.1)
+    with db.connection(), db.connection():
+        with pytest.raises(sqlite3.OperationalError):
+            with db.connection():
+                pass
+    db.close()
+
+def test_connection_pool_concurrent_queries(tmp_path):
+    """Проверка выполнения запросов из нескольких потоков"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    db = Database(str(tmp_path / "pool.db"), pool_size=3)
+    db.execute_query(
+        "INSERT INTO chats (chat_id, title, is_group) VALUES (?, ?, ?)",
+        (1, "Chat", False)
+    )
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(
+            lambda _: db.execute_query("SELECT chat_id FROM chats"), range(100)
+        ))
+
+    assert all(rows == [{'chat_id': 1}] for rows in results)
+    assert db._pool_created <= 3
+    db.close()
+
+def test_wal_storage_profile(tmp_path):
+    """Проверка профиля хранения WAL"""
+    db = Database(str(tmp_path / "wal.db"), storage_profile='wal')
+
+    assert db.execute_query("PRAGMA journal_mode")[0]['journal_mode'] == 'wal'
+    assert db.execute_query("PRAGMA busy_timeout")[0]['timeout'] == 5000
+    db.close()
+
+def test_unknown_storage_profile(tmp_path):
+    """Проверка неизвестного профиля хранения"""
+    with pytest.raises(ValueError):
+        Database(str(tmp_path / "bad.db"), storage_profile='unknown')
+
+def test_single_writer_group_commit(tmp_path):
+    """Проверка записи через выделенный поток из нескольких потоков"""
+    import sqlite3
+    from concurrent.futures import ThreadPoolExecutor
+
+    db = Database(str(tmp_path / "wal.db"), storage_profile='wal')
+
+    def add_chat(chat_id):
+        db.execute_query(
+            "INSERT INTO chats (chat_id, title, is_group) VALUES (?, ?, ?)",
+            (chat_id, f"Chat {chat_id}", False)
+        )
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(add_chat, range(200)))
+
+    # Ошибка одного запроса не откатывает остальные в той же транзакции
+    with pytest.raises(sqlite3.IntegrityError):
+        add_chat(0)
+
+    assert db.execute_query("SELECT COUNT(*) AS count FROM chats")[0]['count'] == 200
+    db.close()
+
+def test_get_active_tasks_with_media(temp_db):
+    """Проверка сборки активных заданий с медиафайлами задания и ответов"""
+    for chat_id in (1, 2):
+        temp_db.execute_query(
+            "INSERT INTO chats (chat_id, title, is_group) VALUES (?, ?, ?)",
+            (chat_id, f"Chat {chat_id}", True)
+        )
+    task_id = temp_db.create_task("Test Task", creator_id=42)
+    closed_id = temp_db.create_task("Closed Task", creator_id=42)
+    temp_db.execute_query("UPDATE tasks SET status = 'closed' WHERE id = ?", (closed_id,))
+    for chat_id in (1, 2):
+        temp_db.add_task_recipient(task_id, chat_id)
+    temp_db.execute_query(
+        "INSERT INTO task_media (task_id, file_id, file_type) VALUES (?, ?, ?)",
+        (task_id, "task-file", "document")
+    )
+    temp_db.execute_query(
+        "INSERT INTO response_media (task_id, chat_id, file_id, file_type) VALUES (?, ?, ?, ?)",
+        (task_id, 2, "response-file", "photo")
+    )
+
+    tasks = temp_db.get_active_tasks()
+
+    assert list(tasks) == [task_id]
+    assert tasks[task_id]['media'] == [{'file_id': "task-file", 'file_type': "document"}]
+    assert tasks[task_id]['recipients'][1]['media'] == []
+    assert tasks[task_id]['recipients'][2]['media'] == [
+        {'file_id': "response-file", 'file_type': "photo"}
+    ]
+
+# Горячие запросы: методы Database, которые вызывают обработчики. SQL берется
+# из трассировки соединений при вызове метода, поэтому проверяется тот запрос,
+# который выполняется на самом деле
+PAGE_CURSOR = ('2026-01-01 00:00:00', 1)
+HOT_METHODS = {
+    'active_tasks': lambda db: db.get_active_tasks(),
+    'chats_page': lambda db: db.get_chats_page(),
+    'chats_page_next': lambda db: db.get_chats_page(PAGE_CURSOR),
+    'chats_page_prev': lambda db: db.get_chats_page(PAGE_CURSOR, backward=True),
+    'all_tasks_page': lambda db: db.get_tasks_page(PAGE_CURSOR),
+    'active_tasks_page': lambda db: db.get_tasks_page(PAGE_CURSOR, status='active'),
+    'my_tasks_page': lambda db: db.get_tasks_page(PAGE_CURSOR, backward=True, creator_id=1),
+    'task_media': lambda db: db.get_task_media(1),
+    'report_media_batch': lambda db: db.get_report_media_batch(0, 100, created_from='2026-01-01'),
+    'media_file_id': lambda db: db.get_media_file_id('uniq'),
+    'recipient_statuses': lambda db: db.get_recipient_statuses(1),
+    'task_by_message': lambda db: db.get_task_by_message(-1, 10),
+    'totals': lambda db: db.get_totals(),
+    'recipient_counts': lambda db: db.get_recipient_counts([1, 2]),
+    'group_chat_counts': lambda db: db.get_group_chat_counts([1, 2]),
+    'user_state': lambda db: db.load_user_state(1),
+}
+
+def trace_reads(db, monkeypatch, method):
+    """SELECT-запросы, выполненные методом, с подставленными параметрами"""
+    statements = []
+    acquire = db._acquire_connection
+
+    def traced_acquire():
+        conn = acquire()
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    monkeypatch.setattr(db, '_acquire_connection', traced_acquire)
+    method(db)
+    monkeypatch.undo()
+    return [sql for sql in statements if sql.lstrip().upper().startswith('SELECT')]
+
+@pytest.mark.parametrize('name', sorted(HOT_METHODS))
+def test_hot_queries_use_indexes(temp_db, monkeypatch, name):
+    """Проверка, что горячие запросы не используют полное сканирование таблиц"""
+    import re
+
+    statements = trace_reads(temp_db, monkeypatch, HOT_METHODS[name])
+    assert statements, f"{name}: метод не выполнил ни одного запроса"
+    for sql in statements:
+        plan = temp_db.execute_query(f"EXPLAIN QUERY PLAN {sql}")
+        details = [row['detail'] for row in plan]
+
+        full_scans = [d for d in details if re.match(r'SCAN \w+$', d)]
+        assert not full_scans, f"{name}: полное сканирование таблицы {full_scans} в {sql}"
+        assert 'USE TEMP B-TREE FOR ORDER BY' not in details, f"{name}: сортировка без индекса в {sql}"
+
+def test_indexes_created_by_migrations(temp_db):
+    """Проверка создания индексов миграциями схемы"""
+    from migrations import SCHEMA_VERSION
+
+    assert temp_db.execute_query("PRAGMA user_version")[0]['user_version'] == SCHEMA_VERSION
+    indexes = {row['name'] for row in temp_db.execute_query(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'"
+    )}
+    assert 'idx_tasks_active_created_at' in indexes
+
+@pytest.mark.parametrize('storage_profile', ['default', 'wal'])
+def test_add_task_recipients_bulk(tmp_path, storage_profile):
+    """Проверка массового добавления получателей из чатов и групп"""
+    db = Database(str(tmp_path / "bulk.db"), storage_profile=storage_profile)
+    with db.connection() as conn:
+        conn.executemany(
+            "INSERT INTO chats (chat_id, title, is_group) VALUES (?, ?, ?)",
+            [(chat_id, f"Chat {chat_id}", True) for chat_id in range(1, 2001)]
+        )
+        conn.execute("INSERT INTO chat_groups (id, name) VALUES (1, 'Group')")
+        conn.executemany(
+            "INSERT INTO group_chats (group_id, chat_id) VALUES (1, ?)",
+            [(chat_id,) for chat_id in range(1, 2001)]
+        )
+        conn.commit()
+    task_id = db.create_task("Broadcast", creator_id=1)
+
+    inserted = db.add_task_recipients(task_id, chat_ids=[5], group_ids=[1])
+
+    assert inserted == 2000
+    rows = db.execute_query(
+        "SELECT chat_id, group_id FROM task_recipients WHERE task_id = ? AND chat_id IN (5, 6)",
+        (task_id,)
+    )
+    assert rows == [{'chat_id': 5, 'group_id': None}, {'chat_id': 6, 'group_id': 1}]
+    # Повторная рассылка тем же получателям ничего не добавляет
+    assert db.add_task_recipients(task_id, group_ids=[1]) == 0
+    db.close()
+
+@pytest.mark.asyncio
+async def test_async_database_concurrent_updates(tmp_path):
+    """Проверка, что 100 одновременных обновлений обрабатываются параллельно"""
+    import asyncio
+    import time
+    from database import AsyncDatabase
+
+    query_delay = 0.02
+
+    class SlowDatabase(Database):
+        """База данных с медленным вводом-выводом"""
+        def execute_query(self, query, params=None):
+            time.sleep(query_delay)
+            return super().execute_query(query, params)
+
+    db = SlowDatabase(str(tmp_path / "async.db"), pool_size=20)
+    async_db = AsyncDatabase(db)
+
+    async def fake_add_chat_update(chat_id):
+        # Та же последовательность запросов, что и в /addchat
+        if await async_db.fetch_one("SELECT chat_id FROM chats WHERE chat_id = ?", (chat_id,)):
+            return
+        await async_db.execute(
+            "INSERT INTO chats (chat_id, title, is_group) VALUES (?, ?, ?)",
+            (chat_id, f"Chat {chat_id}", True)
+        )
+
+    started = time.perf_counter()
+    await asyncio.gather(*(fake_add_chat_update(chat_id) for chat_id in range(100)))
+    elapsed = time.perf_counter() - started
+
+    serial_time = 100 * 2 * query_delay
+    assert elapsed < serial_time / 4
+    assert (await async_db.fetch_one("SELECT COUNT(*) AS count FROM chats"))['count'] == 100
+    async_db.close()
+    db.close()
+
+class RecordingHandler(logging.Handler):
+    """Обработчик, сохраняющий записи журнала в списке"""
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+@pytest.fixture
+def query_log():
+    """Записи журнала запросов независимо от настройки корневого логгера"""
+    query_logger = logging.getLogger('database.queries')
+    handler = RecordingHandler()
+    level = query_logger.level
+    query_logger.addHandler(handler)
+    query_logger.setLevel(logging.DEBUG)
+    yield handler.records
+    query_logger.removeHandler(handler)
+    query_logger.setLevel(level)
+
+def test_query_logging_is_sampled_and_redacted(tmp_path, query_log):
+    """Проверка журнала медленных запросов, выборки и скрытия параметров"""
+    db = Database(str(tmp_path / "log.db"), slow_query_threshold=10, query_log_sample_rate=0)
+    query_log.clear()
+    db.execute_query("SELECT * FROM chats WHERE title = ?", ("секретное название",))
+    assert not query_log
+
+    # Порог 0: каждый запрос считается медленным
+    db.slow_query_threshold = 0
+    db.execute_query("SELECT *\n  FROM chats WHERE title = ?", ("секретное название",))
+    record, = query_log
+    assert record.levelno == logging.WARNING
+    assert record.sql == "SELECT * FROM chats WHERE title = ?"
+    assert record.params == "(<str:18>)"
+    assert "секретное" not in record.getMessage()
+
+    query_log.clear()
+    db.slow_query_threshold = 10
+    db.query_log_sample_rate = 1
+    db.execute_query("SELECT COUNT(*) AS count FROM chats")
+    record, = query_log
+    assert record.levelno == logging.DEBUG
+    assert record.rows == 1
+    db.close()
+
+def test_keyset_pagination(temp_db):
+    """Проверка постраничного вывода чатов вперед и назад по курсору"""
+    from database import Page
+    from pagination import decode_cursor, encode_cursor, page_markup
+
+    temp_db.execute_query("DELETE FROM chats")
+    for n in range(25):
+        temp_db.execute_query(
+            "INSERT INTO chats (chat_id, title, is_group, added_at) VALUES (?, ?, 0, ?)",
+            (-1000 - n, f"Чат {n}", f"2024-02-26 12:00:{n // 2:02d}")
+        )
+
+    def key(row):
+        return row['added_at'], row['chat_id']
+
+    first = temp_db.get_chats_page(limit=10)
+    assert [row['title'] for row in first.rows[:3]] == ["Чат 24", "Чат 22", "Чат 23"]
+    assert (first.has_prev, first.has_next) == (False, True)
+
+    # Обход всех страниц вперед дает все чаты в порядке убывания ключа без повторов
+    seen, page = list(first.rows), first
+    while page.has_next:
+        page = temp_db.get_chats_page(key(page.rows[-1]), limit=10)
+        seen.extend(page.rows)
+    assert len(seen) == 25
+    assert [key(row) for row in seen] == sorted((key(row) for row in seen), reverse=True)
+    assert (page.has_prev, page.has_next) == (True, False)
+
+    # Возврат назад от последней страницы
+    previous = temp_db.get_chats_page(key(page.rows[0]), backward=True, limit=10)
+    assert previous.rows == seen[10:20]
+    assert (previous.has_prev, previous.has_next) == (True, True)
+
+    markup = page_markup('c', previous, 'added_at', 'chat_id')
+    assert decode_cursor(encode_cursor('c', True, "2024-02-26 12:00:05", -1010)) == \
+        ('c', True, ("2024-02-26 12:00:05", -1010))
+    assert '"callback_data":"pg:c:p:' in markup and '"callback_data":"pg:c:n:' in markup
+    assert page_markup('c', Page([], False, False), 'added_at', 'chat_id') is None
@@ -0,0 +1,88 @@
+import asyncio
+import pytest
+from delivery_status import DeliveryTracker
+
+def create_task(db, task_id, chat_ids):
+    db.execute_query("INSERT INTO tasks (id, text, creator_id) VALUES (?, 'Задание', 1)", (task_id,))
+    for chat_id in chat_ids:
+        db.execute_query("INSERT INTO chats (chat_id, title, is_group) VALUES (?, 'Чат', 1)", (chat_id,))
+    db.add_task_recipients(task_id, chat_ids)
+
+def stored_statuses(db, task_id):
+    rows = db.execute_query(
+        "SELECT chat_id, status, message_id FROM task_recipients WHERE task_id = ? ORDER BY chat_id", (task_id,)
+    )
+    return [(row['chat_id'], row['status'], row['message_id']) for row in rows]
+
+def test_transitions_are_buffered_and_counted(temp_db):
+    """Проверка переходов статусов и записи схлопнутых переходов одной пачкой"""
+    create_task(temp_db, 1, [-1, -2, -3])
+    tracker = DeliveryTracker(temp_db)
+
+    assert tracker.mark(1, -1, 'sent', message_id=10) is True
+    assert tracker.mark(1, -1, 'delivered') is True
+    assert tracker.mark(1, -2, 'failed') is True
+    assert tracker.mark(1, -1, 'responded') is True
+    # Переход назад и чат, не являющийся получателем, игнорируются
+    assert tracker.mark(1, -1, 'delivered') is False
+    assert tracker.mark(1, -99, 'delivered') is False
+    with pytest.raises(ValueError):
+        tracker.mark(1, -3, 'read')
+
+    assert len(tracker) == 2
+    assert stored_statuses(temp_db, 1)[0][1] == 'pending'
+
+    assert tracker.flush() == 2
+    assert tracker.flush() == 0
+    assert stored_statuses(temp_db, 1) == [(-3, 'pending', None), (-2, 'failed', None), (-1, 'responded', 10)]
+    assert temp_db.get_task_by_message(-1, 10) == 1
+
+def test_task_found_by_any_message_before_flush(temp_db):
+    """Проверка поиска задания по любому сообщению до и после записи пачки"""
+    create_task(temp_db, 1, [-1])
+    tracker = DeliveryTracker(temp_db)
+
+    tracker.add_messages(1, -1, [10, 11, 12])
+    assert tracker.mark(1, -1, 'delivered', message_id=10) is True
+    assert temp_db.get_task_by_message(-1, 11) is None
+    assert tracker.find_task(-1, 11) == 1
+    assert tracker.find_task(-1, 13) is None
+
+    tracker.flush()
+    assert [temp_db.get_task_by_message(-1, message_id) for message_id in (10, 11, 12)] == [1, 1, 1]
+    assert tracker.find_task(-1, 12) == 1
+
+def test_reload_keeps_unflushed_transitions(temp_db):
+    """Проверка статусов задания, вытесненного из памяти до записи переходов"""
+    create_task(temp_db, 1, [-1, -2])
+    create_task(temp_db, 2, [])
+    tracker = DeliveryTracker(temp_db, max_tasks=1)
+
+    tracker.mark(1, -1, 'delivered')
+    tracker.load_task(2)
+    # Перечитанные статусы учитывают незаписанный переход: отметка назад не проходит
+    assert tracker.mark(1, -1, 'sent') is False
+    assert tracker.mark(1, -2, 'sent') is True
+
+def test_run_flushes_when_buffer_is_full(temp_db):
+    """Проверка сброса по размеру пачки, не дожидаясь таймера"""
+    create_task(temp_db, 1, [-1, -2])
+    tracker = DeliveryTracker(temp_db, flush_size=2, flush_interval=60)
+
+    async def offload(func):
+        return await asyncio.to_thread(func)
+
+    async def scenario():
+        runner = asyncio.create_task(tracker.run(offload))
+        await asyncio.sleep(0)
+        tracker.mark(1, -1, 'delivered')
+        tracker.mark(1, -2, 'delivered')
+        for _ in range(100):
+            if not len(tracker):
+                break
+            await asyncio.sleep(0.01)
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert [status for _, status, _ in stored_statuses(temp_db, 1)] == ['delivered', 'delivered']
@@ -0,0 +1,53 @@
+import pytest
+import threading
+from types import SimpleNamespace
+from dispatcher import ChatOrderedDispatcher, update_key
+
+def test_update_key():
+    """Проверка определения ключа упорядочивания"""
+    message = SimpleNamespace(chat=SimpleNamespace(id=-100), from_user=SimpleNamespace(id=7))
+    callback = SimpleNamespace(message=message, from_user=SimpleNamespace(id=7))
+    inline_query = SimpleNamespace(from_user=SimpleNamespace(id=7))
+
+    assert update_key(message) == -100
+    assert update_key(callback) == -100
+    assert update_key(inline_query) == 7
+    assert update_key(object()) is None
+
+def test_order_preserved_within_chat():
+    """Проверка порядка обработки обновлений одного чата"""
+    dispatcher = ChatOrderedDispatcher(num_workers=4)
+    processed = []
+
+    for n in range(200):
+        dispatcher.submit(42, processed.append, n)
+    dispatcher.stop()
+
+    assert processed == list(range(200))
+
+def test_slow_chat_does_not_block_other_chats():
+    """Проверка, что медленный чат не задерживает другие чаты"""
+    dispatcher = ChatOrderedDispatcher(num_workers=2)
+    release_slow_chat = threading.Event()
+    other_chat_done = threading.Event()
+
+    dispatcher.submit(0, release_slow_chat.wait, 5)
+    dispatcher.submit(1, other_chat_done.set)
+
+    assert other_chat_done.wait(1)
+    release_slow_chat.set()
+    dispatcher.stop()
+
+def test_worker_survives_handler_error():
+    """Проверка продолжения работы после ошибки обработчика"""
+    dispatcher = ChatOrderedDispatcher(num_workers=1)
+    processed = []
+
+    def failing():
+        raise RuntimeError("boom")
+
+    dispatcher.submit(1, failing)
+    dispatcher.submit(1, processed.append, 'next')
+    dispatcher.stop()
+
+    assert processed == ['next']
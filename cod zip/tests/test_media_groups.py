@@ -0,0 +1,73 @@
+import asyncio
+from media_groups import CAPTION_LIMIT, MediaGroupBuffer, plan_delivery
+
+def media(*file_types):
+    return [{'file_id': f'file-{n}', 'file_type': file_type} for n, file_type in enumerate(file_types)]
+
+def test_buffer_flushes_album_once():
+    """Проверка сбора файлов альбома в один вызов после окна ожидания"""
+    flushed = []
+
+    async def flush(media_group_id, items):
+        flushed.append((media_group_id, items))
+
+    async def scenario():
+        buffer = MediaGroupBuffer(flush, window=0.05)
+        for n in range(3):
+            buffer.add('album-1', n)
+            await asyncio.sleep(0.02)
+        buffer.add('album-2', 'x')
+        assert flushed == []
+        await asyncio.sleep(0.1)
+        assert len(buffer) == 0
+
+    asyncio.run(scenario())
+    assert sorted(flushed) == [('album-1', [0, 1, 2]), ('album-2', ['x'])]
+
+def test_buffer_drain_flushes_pending_albums():
+    """Проверка немедленной обработки альбомов при остановке"""
+    flushed = []
+
+    async def flush(media_group_id, items):
+        flushed.append(media_group_id)
+
+    async def scenario():
+        buffer = MediaGroupBuffer(flush, window=60)
+        buffer.add('album', 1)
+        await buffer.drain()
+
+    asyncio.run(scenario())
+    assert flushed == ['album']
+
+def test_plan_delivery_groups_files():
+    """Проверка отправки альбома одним sendMediaGroup с подписью у первого файла"""
+    steps = plan_delivery('Задание', media('photo', 'video', 'photo'))
+    assert [kind for kind, _ in steps] == ['group']
+    assert steps[0][1][0]['caption'] == 'Задание'
+    assert all(not item.get('caption') for item in steps[0][1][1:])
+
+    # Документы не смешиваются с фото, альбомы делятся по 10 файлов
+    steps = plan_delivery('Задание', media(*['photo'] * 11, 'document'))
+    assert [kind for kind, _ in steps] == ['group', 'single', 'single']
+    assert len(steps[0][1]) == 10
+    assert steps[1][1]['file_id'] == 'file-10'
+    assert steps[2][1] == {'file_id': 'file-11', 'file_type': 'document', 'caption': None}
+
+def test_plan_delivery_text():
+    """Проверка отправки текста отдельным сообщением"""
+    assert plan_delivery('Только текст', []) == [('text', 'Только текст')]
+    long_text = 'x' * (CAPTION_LIMIT + 1)
+    steps = plan_delivery(long_text, media('photo'))
+    assert steps[0] == ('text', long_text)
+    assert steps[1] == ('single', {'file_id': 'file-0', 'file_type': 'photo', 'caption': None})
+
+def test_create_task_with_media(temp_db):
+    """Проверка сохранения задания с альбомом одной транзакцией"""
+    album = [
+        {'file_unique_id': f'uniq-{n}', 'file_id': f'file-{n}', 'file_type': 'photo'}
+        for n in range(3)
+    ]
+    task_id = temp_db.create_task_with_media('Задание', 1, album + album[:1])
+
+    assert [row['file_id'] for row in temp_db.get_task_media(task_id)] == ['file-0', 'file-1', 'file-2']
+    assert temp_db.execute_query("SELECT SUM(ref_count) AS refs FROM media_files")[0]['refs'] == 3
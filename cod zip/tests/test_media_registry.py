@@ -0,0 +1,44 @@
+from media_registry import MediaRegistry
+
+def create_tasks(db, *task_ids):
+    for task_id in task_ids:
+        db.execute_query("INSERT INTO tasks (id, text, creator_id) VALUES (?, 'Задание', 1)", (task_id,))
+
+def ref_count(db, file_unique_id):
+    return db.execute_query(
+        "SELECT ref_count FROM media_files WHERE file_unique_id = ?", (file_unique_id,)
+    )[0]['ref_count']
+
+def test_same_file_is_stored_once(temp_db):
+    """Проверка дедупликации файлов по file_unique_id и подсчета ссылок"""
+    create_tasks(temp_db, 1, 2)
+    registry = MediaRegistry(temp_db)
+
+    assert registry.add_task_media(1, 'uniq-a', 'file-a-1', 'document') is True
+    assert registry.add_task_media(1, 'uniq-a', 'file-a-2', 'document') is False
+    assert registry.add_task_media(2, 'uniq-a', 'file-a-3', 'document') is True
+    assert registry.add_response_media(1, -100, 'uniq-a', 'file-a-4', 'document') is True
+
+    assert temp_db.execute_query("SELECT COUNT(*) AS count FROM media_files")[0]['count'] == 1
+    assert temp_db.execute_query("SELECT COUNT(*) AS count FROM task_media")[0]['count'] == 2
+    assert ref_count(temp_db, 'uniq-a') == 3
+    # Для отправки используется последний полученный file_id
+    assert registry.get_file_id('uniq-a') == 'file-a-4'
+    assert temp_db.get_media_file_id('uniq-a') == 'file-a-4'
+
+def test_active_tasks_use_latest_file_id(temp_db):
+    """Проверка: активные задания отдают актуальный file_id из реестра"""
+    create_tasks(temp_db, 1)
+    temp_db.execute_query("INSERT INTO chats (chat_id, title, is_group) VALUES (-100, 'Чат', 1)")
+    temp_db.add_task_recipients(1, [-100])
+    registry = MediaRegistry(temp_db)
+    registry.add_task_media(1, 'uniq-a', 'file-a-1', 'photo')
+    registry.add_response_media(1, -100, 'uniq-b', 'file-b-1', 'document')
+    # Тот же файл получен повторно с новым file_id
+    registry.add_response_media(1, -100, 'uniq-a', 'file-a-2', 'photo')
+    registry.add_task_media(1, 'uniq-b', 'file-b-2', 'document')
+
+    task = temp_db.get_active_tasks()[1]
+    assert [media['file_id'] for media in task['media']] == ['file-a-2', 'file-b-2']
+    assert [media['file_id'] for media in task['recipients'][-100]['media']] == ['file-b-2', 'file-a-2']
+    assert registry.get_file_id('unknown') is None
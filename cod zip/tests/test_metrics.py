@@ -0,0 +1,87 @@
+import pytest
+import asyncio
+import urllib.request
+from metrics import (
+    HANDLER_ERRORS, HANDLER_LATENCY, HANDLER_REQUESTS, DB_QUERY_LATENCY,
+    MetricsRegistry, MetricsServer, format_stats, instrument_handler,
+    normalize_query, observe_query, record_handler_error
+)
+
+def test_prometheus_text_format():
+    """Проверка экспорта счетчиков и гистограмм в формате Prometheus"""
+    registry = MetricsRegistry()
+    counter = registry.counter('requests_total', 'Запросы', ('handler',))
+    histogram = registry.histogram('duration_seconds', 'Длительность', ('handler',), buckets=(0.1, 1.0))
+    registry.gauge('queue_depth', 'Очередь', lambda: 3)
+
+    counter.inc(handler='start')
+    counter.inc(2, handler='start')
+    histogram.observe(0.05, handler='start')
+    histogram.observe(0.5, handler='start')
+    histogram.observe(5, handler='start')
+
+    text = registry.render()
+    assert '# TYPE requests_total counter' in text
+    assert 'requests_total{handler="start"} 3' in text
+    assert 'duration_seconds_bucket{handler="start",le="0.1"} 1' in text
+    assert 'duration_seconds_bucket{handler="start",le="1.0"} 2' in text
+    assert 'duration_seconds_bucket{handler="start",le="+Inf"} 3' in text
+    assert 'duration_seconds_count{handler="start"} 3' in text
+    assert 'queue_depth 3' in text
+    assert histogram.quantile(0.5, handler='start') == 1.0
+
+def test_normalize_query():
+    """Проверка нормализации SQL для меток метрик"""
+    assert normalize_query("SELECT *\n  FROM chats WHERE chat_id = 42") == "SELECT * FROM chats WHERE chat_id = ?"
+    assert normalize_query("SELECT 1 FROM t WHERE s = 'it''s' AND id IN (?, ?, ?)") == \
+        "SELECT ? FROM t WHERE s = ? AND id IN (?)"
+
+def test_instrument_sync_handler():
+    """Проверка учета вызовов и перехваченных ошибок синхронного обработчика"""
+    @instrument_handler('test_sync')
+    def handler(fail):
+        if fail:
+            record_handler_error()
+
+    calls = HANDLER_REQUESTS.value(handler='test_sync')
+    errors = HANDLER_ERRORS.value(handler='test_sync')
+    handler(False)
+    handler(True)
+
+    assert HANDLER_REQUESTS.value(handler='test_sync') == calls + 2
+    assert HANDLER_ERRORS.value(handler='test_sync') == errors + 1
+    assert HANDLER_LATENCY.quantile(0.5, handler='test_sync') is not None
+
+def test_instrument_async_handler_counts_exceptions():
+    """Проверка учета исключений асинхронного обработчика"""
+    @instrument_handler('test_async')
+    async def handler():
+        raise ValueError("boom")
+
+    errors = HANDLER_ERRORS.value(handler='test_async')
+    with pytest.raises(ValueError):
+        asyncio.run(handler())
+    assert HANDLER_ERRORS.value(handler='test_async') == errors + 1
+    assert HANDLER_REQUESTS.value(handler='test_async') >= 1
+
+def test_database_query_observer(temp_db):
+    """Проверка учета времени execute_query по нормализованному запросу"""
+    temp_db.add_query_observer(observe_query)
+    temp_db.execute_query("SELECT COUNT(*) AS count FROM chats WHERE chat_id > 100")
+
+    label = "SELECT COUNT(*) AS count FROM chats WHERE chat_id > ?"
+    assert DB_QUERY_LATENCY.quantile(1.0, query=label) is not None
+    assert label in format_stats()
+
+def test_metrics_endpoint():
+    """Проверка эндпоинта /metrics"""
+    registry = MetricsRegistry()
+    registry.counter('hits_total', 'Обращения').inc()
+    server = MetricsServer(port=0, registry=registry).start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics") as response:
+            body = response.read().decode('utf-8')
+            assert response.headers['Content-Type'].startswith('text/plain')
+        assert 'hits_total 1' in body
+    finally:
+        server.stop()
@@ -0,0 +1,71 @@
+import pytest
+import sqlite3
+from database import Database
+from migrations import SCHEMA_VERSION, add_column, get_schema_version, migrate
+
+def test_fresh_database_migrated(tmp_path):
+    """Проверка применения всех миграций к новой базе"""
+    conn = sqlite3.connect(str(tmp_path / "fresh.db"))
+
+    assert migrate(conn) == SCHEMA_VERSION
+    assert get_schema_version(conn) == SCHEMA_VERSION
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {'chats', 'tasks', 'task_recipients', 'task_media', 'response_media'} <= tables
+    conn.close()
+
+def test_warm_start_reads_only_user_version(tmp_path):
+    """Проверка, что актуальная база проверяется одним чтением PRAGMA"""
+    db_path = str(tmp_path / "warm.db")
+    Database(db_path).close()
+
+    conn = sqlite3.connect(db_path)
+    statements = []
+    conn.set_trace_callback(statements.append)
+
+    assert migrate(conn) == 0
+    assert statements == ["PRAGMA user_version"]
+    conn.close()
+
+def test_legacy_database_upgraded(tmp_path):
+    """Проверка обновления базы, созданной до появления миграций"""
+    db_path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE chats (chat_id INTEGER PRIMARY KEY, title TEXT NOT NULL, "
+                 "is_group BOOLEAN NOT NULL, added_at TIMESTAMP DEFAULT (datetime('now')))")
+    conn.execute("INSERT INTO chats (chat_id, title, is_group) VALUES (1, 'Chat', 0)")
+    conn.commit()
+    conn.close()
+
+    db = Database(db_path)
+
+    assert db.execute_query("PRAGMA user_version")[0]['user_version'] == SCHEMA_VERSION
+    assert db.execute_query("SELECT chat_id FROM chats") == [{'chat_id': 1}]
+    db.close()
+
+def test_add_column_is_idempotent(tmp_path):
+    """Проверка повторного добавления столбца"""
+    conn = sqlite3.connect(str(tmp_path / "columns.db"))
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY)")
+    step = add_column('items', 'note', "TEXT DEFAULT ''")
+
+    step(conn)
+    step(conn)
+
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(items)")]
+    assert columns == ['id', 'note']
+    conn.close()
+
+def test_task_messages_backfilled(tmp_path):
+    """Проверка переноса сохраненных ID сообщений заданий в task_messages"""
+    conn = sqlite3.connect(str(tmp_path / "messages.db"), isolation_level=None)
+    migrate(conn)
+    conn.execute("INSERT INTO tasks (id, text, creator_id) VALUES (1, 'Задание', 1)")
+    conn.execute("INSERT INTO task_recipients (task_id, chat_id, message_id) VALUES (1, -1, 10)")
+    conn.execute("INSERT INTO task_recipients (task_id, chat_id) VALUES (1, -2)")
+    # База версии 7: сохранялся только ID первого сообщения задания
+    conn.execute("DROP TABLE task_messages")
+    conn.execute("PRAGMA user_version = 7")
+
+    assert migrate(conn) == 1
+    assert conn.execute("SELECT chat_id, message_id, task_id FROM task_messages").fetchall() == [(-1, 10, 1)]
+    conn.close()
@@ -1,5 +1,5 @@
 import pytest
-from navigation_manager import NavigationManager
+from navigation_manager import HISTORY_SIZE, NavigationManager, SQLiteStateStore, StateStore
 
 def test_navigation_manager_initialization():
     """Проверка инициализации менеджера навигации"""
@@ -52,3 +52,92 @@ def test_clear_user_state():
     assert 'navigation_history' in user_data
     assert 'state' in user_data
     assert 'temp_data' not in user_data
+
+def test_route_dispatch():
+    """Проверка маршрутизации кнопок меню с учетом состояния"""
+    nav = NavigationManager()
+
+    @nav.route("🔙 Отмена", "🔙 Назад")
+    def back(update):
+        return 'back'
+
+    @nav.route("🔙 Назад", state='selecting_recipients')
+    def back_to_recipients(update):
+        return 'recipients'
+
+    assert nav.resolve(None, "🔙 Отмена") is back
+    assert nav.resolve('settings', "🔙 Назад") is back
+    assert nav.resolve('selecting_recipients', "🔙 Назад") is back_to_recipients
+    assert nav.resolve(None, "произвольный текст") is None
+
+    with pytest.raises(ValueError):
+        nav.add_route("🔙 Отмена", back)
+
+def test_state_history_is_capped():
+    """Проверка перехода между состояниями и ограничения истории"""
+    nav = NavigationManager()
+    assert nav.get_state(1) == 'main_menu'
+
+    nav.set_state(1, 'settings')
+    nav.set_state(1, 'statistics')
+    assert nav.get_state(1) == 'statistics'
+    assert nav.go_back(1) == 'settings'
+
+    for _ in range(HISTORY_SIZE):
+        nav.set_state(1, 'awaiting_task_text')
+        nav.set_state(1, 'creating_chat_group')
+    assert len(nav.store.get(1).history) == HISTORY_SIZE
+
+    with pytest.raises(ValueError):
+        nav.set_state(1, 'unknown')
+
+def test_state_store_lru_and_ttl():
+    """Проверка вытеснения LRU и сброса состояний неактивных пользователей"""
+    now = [1000.0]
+    store = StateStore(cache_size=2, ttl=60, clock=lambda: now[0])
+    nav = NavigationManager(store)
+
+    nav.set_state(1, 'settings')
+    nav.set_state(2, 'settings')
+    nav.get_state(1)
+    nav.set_state(3, 'settings')
+    assert len(store) == 2
+    assert store.peek(2) is None
+    assert store.peek(1) is not None
+
+    now[0] += 61
+    assert nav.get_state(1) == 'main_menu'
+    assert store.peek(3) is None
+
+def test_sqlite_state_store_survives_restart(temp_db):
+    """Проверка восстановления состояния из базы данных после перезапуска"""
+    nav = NavigationManager(SQLiteStateStore(temp_db))
+    nav.set_state(42, 'settings')
+    nav.set_state(42, 'awaiting_task_text')
+    nav.set_state(43, 'settings')
+    nav.reset_state(43)
+
+    restarted = NavigationManager(SQLiteStateStore(temp_db))
+    assert restarted.store.peek(42) is None
+    assert restarted.get_state(42) == 'awaiting_task_text'
+    assert restarted.go_back(42) == 'settings'
+    assert restarted.get_state(43) == 'main_menu'
+
+    # Устаревшие состояния удаляются из таблицы
+    assert restarted.store.purge_expired() == 0
+    restarted.store.ttl = -1
+    assert restarted.store.purge_expired() == 1
+
+def test_reply_markup_cache():
+    """Проверка кэширования JSON разметки клавиатуры и его сброса"""
+    import json
+    nav = NavigationManager()
+    markup = nav.get_reply_markup('awaiting_task_text')
+    assert json.loads(markup) == {'keyboard': [[{'text': "🔙 Отмена"}]], 'resize_keyboard': True}
+    assert nav.get_reply_markup('awaiting_task_text') is markup
+    assert nav.get_reply_markup('awaiting_task_text', locale='en') == markup
+    assert nav.get_reply_markup('unknown') is None
+
+    nav.set_menu('awaiting_task_text', [["🔙 Назад"]], "Текст задания:")
+    assert json.loads(nav.get_reply_markup('awaiting_task_text'))['keyboard'] == [[{'text': "🔙 Назад"}]]
+    assert json.loads(nav.get_reply_markup('awaiting_task_text', locale='en'))['keyboard'] == [[{'text': "🔙 Назад"}]]
@@ -0,0 +1,216 @@
+import asyncio
+import pytest
+import threading
+import time
+from outbound import (
+    CHAT_BURST, AsyncRateLimiter, OutboundScheduler, TokenBucket, get_retry_after,
+    PRIORITY_BULK, PRIORITY_INTERACTIVE
+)
+
+class FakeRetryAfter(Exception):
+    """Ответ 429 в стиле python-telegram-bot"""
+    def __init__(self, retry_after):
+        super().__init__(f"Flood control exceeded. Retry in {retry_after} seconds")
+        self.retry_after = retry_after
+
+class FakeSender:
+    """Поддельный Bot API: запоминает отправленные сообщения и время отправки"""
+    def __init__(self):
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def send_message(self, chat_id, text):
+        with self.lock:
+            self.sent.append((chat_id, text, time.monotonic()))
+        return {'chat_id': chat_id, 'text': text}
+
+def test_token_bucket():
+    """Проверка пополнения корзины токенов"""
+    bucket = TokenBucket(rate=2.0, capacity=2, now=0.0)
+    bucket.consume(0.0)
+    bucket.consume(0.0)
+    assert bucket.wait_time(0.0) == pytest.approx(0.5)
+    assert bucket.wait_time(0.5) == 0.0
+    assert bucket.is_full(1.0)
+
+def test_get_retry_after():
+    """Проверка извлечения паузы из ответов 429"""
+    telebot_error = Exception("Too Many Requests")
+    telebot_error.error_code = 429
+    telebot_error.result_json = {'parameters': {'retry_after': 3}}
+
+    assert get_retry_after(FakeRetryAfter(2)) == 2.0
+    assert get_retry_after(telebot_error) == 3.0
+    assert get_retry_after(ValueError("boom")) is None
+
+def test_global_rate_limit():
+    """Проверка общего лимита на бота"""
+    sender = FakeSender()
+    scheduler = OutboundScheduler(global_rate=20, chat_rate=100, chat_burst=100)
+    futures = [
+        scheduler.submit(sender.send_message, chat_id, "hi", chat_id=chat_id, priority=PRIORITY_BULK)
+        for chat_id in range(40)
+    ]
+    for future in futures:
+        assert future.result(5)['text'] == "hi"
+    scheduler.stop()
+
+    # 20 сообщений уходят сразу, остальные 20 - со скоростью 20 в секунду
+    times = sorted(t for _, _, t in sender.sent)
+    assert times[-1] - times[0] >= 0.9
+
+def test_per_chat_rate_limit():
+    """Проверка лимита на чат"""
+    sender = FakeSender()
+    scheduler = OutboundScheduler(chat_rate=10, chat_burst=1)
+    futures = [scheduler.submit(sender.send_message, 7, n, chat_id=7) for n in range(5)]
+    for future in futures:
+        future.result(5)
+    scheduler.stop()
+
+    assert [text for _, text, _ in sender.sent] == list(range(5))
+    times = [t for _, _, t in sender.sent]
+    assert all(b - a >= 0.08 for a, b in zip(times, times[1:]))
+
+def test_chat_order_preserved_within_burst():
+    """Проверка порядка сообщений чата, отправляемых серией с лимитами по умолчанию"""
+    sender = FakeSender()
+    in_flight = []
+
+    def slow_send(chat_id, n):
+        # Первые сообщения отправляются дольше: параллельная отправка их бы обогнала
+        in_flight.append(n)
+        assert in_flight == [n], f"одновременная отправка в чат: {in_flight}"
+        time.sleep(0.05 / (n + 1))
+        in_flight.remove(n)
+        return sender.send_message(chat_id, n)
+
+    scheduler = OutboundScheduler()
+    futures = [scheduler.submit(slow_send, 7, n, chat_id=7) for n in range(CHAT_BURST)]
+    futures.append(scheduler.submit(sender.send_message, 8, "other", chat_id=8))
+    for future in futures:
+        future.result(5)
+    scheduler.stop()
+
+    assert [text for chat_id, text, _ in sender.sent if chat_id == 7] == list(range(CHAT_BURST))
+    # Другой чат не ждет завершения серии
+    assert [text for _, text, _ in sender.sent].index("other") < CHAT_BURST
+
+def test_group_rate_limit():
+    """Проверка дополнительного лимита для групп"""
+    sender = FakeSender()
+    scheduler = OutboundScheduler(chat_rate=100, chat_burst=100, group_rate=5, group_burst=2)
+    futures = [scheduler.submit(sender.send_message, -100, n, chat_id=-100) for n in range(4)]
+    for future in futures:
+        future.result(5)
+    scheduler.stop()
+
+    times = [t for _, _, t in sender.sent]
+    assert times[-1] - times[0] >= 0.35
+
+def test_interactive_before_bulk():
+    """Проверка приоритета интерактивных ответов над рассылкой"""
+    sender = FakeSender()
+    scheduler = OutboundScheduler(global_rate=10, chat_rate=100, chat_burst=100)
+    done = []
+    bulk = scheduler.broadcast(sender.send_message, range(1, 31), "bulk",
+                               on_done=lambda sent, failed: done.append((sent, failed)))
+    reply = scheduler.submit(sender.send_message, 999, "reply", chat_id=999, priority=PRIORITY_INTERACTIVE)
+    reply.result(5)
+
+    # Ответ обгоняет большую часть рассылки
+    position = [text for _, text, _ in sender.sent].index("reply")
+    assert position <= 12
+    assert scheduler.queue_depth > 0
+    assert done == []
+    for future in bulk:
+        future.result(10)
+    assert scheduler.queue_depth == 0
+    scheduler.stop()
+    assert done == [(30, 0)]
+
+def test_retry_after_is_honoured():
+    """Проверка повтора после ответа 429 с паузой retry_after"""
+    sender = FakeSender()
+    attempts = []
+
+    def flaky_send(chat_id, text):
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise FakeRetryAfter(0.3)
+        return sender.send_message(chat_id, text)
+
+    scheduler = OutboundScheduler()
+    future = scheduler.submit(flaky_send, 5, "hello", chat_id=5)
+    assert future.result(5) == {'chat_id': 5, 'text': "hello"}
+    stats = scheduler.stats()
+    scheduler.stop()
+
+    assert attempts[1] - attempts[0] >= 0.3
+    assert stats['retried'] == 1
+    assert stats['sent'] == 1
+
+def test_errors_are_reported_through_future():
+    """Проверка передачи ошибок отправки в Future"""
+    def failing_send(chat_id, text):
+        raise ValueError("chat not found")
+
+    scheduler = OutboundScheduler()
+    future = scheduler.submit(failing_send, 5, "hello", chat_id=5)
+    with pytest.raises(ValueError):
+        future.result(5)
+    assert scheduler.stats()['failed'] == 1
+    scheduler.stop()
+
+def test_stop_cancels_pending_messages():
+    """Проверка отмены ожидающих сообщений при остановке"""
+    sender = FakeSender()
+    scheduler = OutboundScheduler(chat_rate=0.1, chat_burst=1)
+    futures = [scheduler.submit(sender.send_message, 1, n, chat_id=1) for n in range(3)]
+    futures[0].result(5)
+    scheduler.stop()
+
+    assert all(future.cancelled() for future in futures[1:])
+    with pytest.raises(RuntimeError):
+        scheduler.submit(sender.send_message, 1, "late", chat_id=1)
+
+def test_async_rate_limiter():
+    """Проверка общего лимита, лимита чата и паузы после 429 в цикле событий"""
+    limiter = AsyncRateLimiter(global_rate=20, chat_rate=100, chat_burst=100)
+
+    async def scenario():
+        started = time.monotonic()
+        await asyncio.gather(*(limiter.acquire(-100 - n) for n in range(40)))
+        spread = time.monotonic() - started
+
+        limiter.pause(5, 0.3)
+        paused = time.monotonic()
+        await limiter.acquire(6)
+        other = time.monotonic() - paused
+        await limiter.acquire(5)
+        return spread, other, time.monotonic() - paused
+
+    spread, other, waited = asyncio.run(scenario())
+    # Первые 20 сообщений уходят сразу, остальные 20 - со скоростью 20/с
+    assert spread >= 0.9
+    assert other < 0.2
+    assert waited >= 0.3
+
+def test_async_interactive_reply_overtakes_bulk():
+    """Проверка: интерактивные ответы отправляются раньше уже ожидающей массовой рассылки"""
+    limiter = AsyncRateLimiter(global_rate=20, chat_rate=100, chat_burst=100)
+    order = []
+
+    async def send(chat_id, priority):
+        await limiter.acquire(chat_id, priority)
+        order.append(chat_id)
+
+    async def scenario():
+        bulk = [asyncio.create_task(send(-100 - n, PRIORITY_BULK)) for n in range(40)]
+        await asyncio.sleep(0.1)
+        await asyncio.gather(*(send(chat_id, PRIORITY_INTERACTIVE) for chat_id in range(1, 6)))
+        await asyncio.gather(*bulk)
+
+    asyncio.run(scenario())
+    # Около 22 сообщений рассылки ушли до ответов, ответы - сразу следом
+    assert max(order.index(chat_id) for chat_id in range(1, 6)) < 28
@@ -0,0 +1,186 @@
+import importlib.util
+import os
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+import pytest
+from telegram import Update, User
+from telegram.error import RetryAfter
+from telegram.ext import Application, ExtBot
+from api_rate_limiter import BotApiRateLimiter
+from outbound import PRIORITY_BULK, AsyncRateLimiter
+
+ATTACHED_HANDLERS = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'attached_assets', 'handlers.py')
+ADMIN_CHAT_ID = 5171183387
+
+@pytest.fixture
+def handlers(tmp_path, monkeypatch):
+    """Обработчики python-telegram-bot из attached_assets с временной базой данных"""
+    import config
+    monkeypatch.setattr(config, 'DB_PATH', str(tmp_path / 'bot.db'))
+    spec = importlib.util.spec_from_file_location('ptb_handlers', ATTACHED_HANDLERS)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    yield module
+    module.async_db.close()
+    module.db.close()
+
+class OfflineBot(ExtBot):
+    """Бот без обращения к Bot API при инициализации"""
+    async def get_me(self, *args, **kwargs):
+        self._bot_user = User(1, 'Test', True, username='test_bot')
+        return self._bot_user
+
+class FakeBot:
+    """Поддельный Bot API: запоминает сообщения, первые вызовы в чат могут завершиться ошибкой
+
+    Как ExtBot, передает запросы через ограничитель с rate_limit_args.
+    """
+    def __init__(self, errors=None):
+        self.id = 1
+        self.sent = []
+        self.priorities = []
+        self.errors = dict(errors or {})
+        self.rate_limiter = BotApiRateLimiter(AsyncRateLimiter())
+
+    async def send_message(self, chat_id, text, rate_limit_args=None, **kwargs):
+        self.priorities.append(rate_limit_args)
+        return await self.rate_limiter.process_request(
+            self._send_message, (chat_id, text), {}, 'sendMessage', {'chat_id': chat_id}, rate_limit_args
+        )
+
+    async def _send_message(self, chat_id, text):
+        error = self.errors.pop(chat_id, None)
+        if error is not None:
+            raise error
+        self.sent.append((chat_id, text))
+        return SimpleNamespace(message_id=100 + len(self.sent))
+
+    async def send_media_group(self, chat_id, media, rate_limit_args=None, **kwargs):
+        self.priorities.append(rate_limit_args)
+        messages = []
+        for item in media:
+            self.sent.append((chat_id, item.media))
+            messages.append(SimpleNamespace(message_id=100 + len(self.sent)))
+        return messages
+
+def create_task(db, chat_ids):
+    for chat_id in chat_ids:
+        db.execute_query("INSERT INTO chats (chat_id, title, is_group) VALUES (?, 'Чат', 1)", (chat_id,))
+    task_id = db.create_task('Задание', ADMIN_CHAT_ID)
+    db.add_task_recipients(task_id, chat_ids)
+    return task_id
+
+def message_update(user_id=ADMIN_CHAT_ID, text=''):
+    update = MagicMock()
+    update.effective_user.id = user_id
+    update.effective_chat.id = user_id
+    update.message.text = text
+    update.message.reply_text = AsyncMock()
+    return update
+
+@pytest.mark.asyncio
+async def test_deliver_task_retries_after_flood_limit(handlers):
+    """Проверка повтора отправки после ответа 429 вместо отметки об ошибке"""
+    task_id = create_task(handlers.db, [-1, -2])
+    bot = FakeBot(errors={-1: RetryAfter(0)})
+
+    assert await handlers.deliver_task(bot, task_id, [-1, -2]) == (2, 0)
+    assert sorted(chat_id for chat_id, _ in bot.sent) == [-2, -1]
+    assert bot.priorities == [PRIORITY_BULK, PRIORITY_BULK]
+    handlers.delivery_tracker.flush()
+    assert {row['status'] for row in handlers.db.get_recipient_statuses(task_id)} == {'delivered'}
+
+@pytest.mark.asyncio
+async def test_send_to_all_chats_runs_in_background(handlers):
+    """Проверка ответа администратору до завершения рассылки"""
+    task_id = create_task(handlers.db, [-1, -2, -3])
+    bot = FakeBot()
+    background = []
+    update = message_update(text="👥 Все чаты")
+    context = MagicMock()
+    context.bot = bot
+    context.user_data = {'draft_task_id': task_id}
+    context.application.create_task = lambda coroutine, update=None: background.append(coroutine)
+
+    await handlers.send_task_to_all_chats(update, context)
+    update.message.reply_text.assert_awaited_once()
+    assert "Отправляем задание" in update.message.reply_text.await_args.args[0]
+    assert bot.sent == [] and len(background) == 1
+
+    await background[0]
+    assert bot.sent[-1] == (ADMIN_CHAT_ID, f"✅ Задание #{task_id} отправлено в чаты: 3, ошибок: 0")
+
+@pytest.mark.asyncio
+async def test_reply_to_album_before_flush(handlers):
+    """Проверка ответа на любое сообщение альбома до записи статусов в базу"""
+    media = [
+        {'file_unique_id': f'uniq-{n}', 'file_id': f'file-{n}', 'file_type': 'photo'} for n in range(2)
+    ]
+    task_id = handlers.media_registry.create_task_with_media('Задание', ADMIN_CHAT_ID, media)
+    handlers.db.execute_query("INSERT INTO chats (chat_id, title, is_group) VALUES (-1, 'Чат', 1)")
+    handlers.db.add_task_recipients(task_id, [-1])
+    bot = FakeBot()
+    assert await handlers.deliver_task(bot, task_id, [-1]) == (1, 0)
+
+    update = message_update(user_id=7, text='Готово')
+    update.effective_chat.id = -1
+    update.message.photo = []
+    update.message.document = update.message.video = update.message.audio = None
+    update.message.reply_to_message.message_id = 102
+    await handlers.handle_task_response(update, MagicMock())
+    update.message.reply_text.assert_awaited_once_with(f"✅ Ответ на задание #{task_id} принят")
+
+    handlers.delivery_tracker.flush()
+    assert handlers.db.get_task_by_message(-1, 101) == task_id
+    assert handlers.db.get_task_by_message(-1, 102) == task_id
+    assert handlers.db.get_recipient_statuses(task_id)[0]['status'] == 'responded'
+
+def group_message(bot, update_id, reply_from=None):
+    """Сообщение в группе, при reply_from - ответ на сообщение этого пользователя"""
+    message = {
+        'message_id': update_id, 'date': 0, 'text': 'Готово',
+        'chat': {'id': -100, 'type': 'supergroup', 'title': 'Группа'},
+        'from': {'id': 7, 'is_bot': False, 'first_name': 'User'},
+    }
+    if reply_from is not None:
+        message['reply_to_message'] = {
+            'message_id': 50, 'date': 0, 'text': 'Задание',
+            'chat': message['chat'], 'from': {'id': reply_from, 'is_bot': True, 'first_name': 'Bot'},
+        }
+    return Update.de_json({'update_id': update_id, 'message': message}, bot)
+
+@pytest.mark.asyncio
+async def test_task_responses_do_not_shadow_group_handlers(handlers):
+    """Проверка: обработчик ответов на задания не перехватывает другие сообщения групп"""
+    application = Application.builder().bot(OfflineBot('1:token')).updater(None).build()
+    handlers.register_handlers(application)
+    async with application:
+        response_handler, = application.handlers[1]
+        assert response_handler.callback is handlers.handle_task_response
+        assert all(handler.callback is not handlers.handle_task_response for handler in application.handlers[0])
+
+        bot = application.bot
+        assert response_handler.check_update(group_message(bot, 1, reply_from=bot.id))
+        assert not response_handler.check_update(group_message(bot, 2, reply_from=99))
+        assert not response_handler.check_update(group_message(bot, 3))
+
+
+@pytest.mark.asyncio
+async def test_settings_statistics_active_tasks(handlers, monkeypatch):
+    """Проверка перехода Настройки -> Статистика -> Активные задания через кнопки меню"""
+    monkeypatch.setattr(handlers, 'is_admin', lambda user_id: True)
+    db = handlers.db
+    task_id = create_task(db, [-1, -2, -3])
+    db.update_recipient_statuses([('delivered', 10, task_id, -1), ('responded', 11, task_id, -2)])
+    context = MagicMock()
+
+    replies = []
+    for text in ("⚙️ Настройки", "📊 Статистика", "📊 Активные задания"):
+        update = message_update(text=text)
+        await handlers.handle_text_message(update, context)
+        replies.append(update.message.reply_text.await_args.args[0])
+
+    assert replies[0] == "Настройки:"
+    assert replies[1] == handlers.nav_manager.menu_states['statistics']['text']
+    assert f"Задание #{task_id}" in replies[2]
+    assert "Получателей: 3, ожидают: 1, доставлено: 1, ошибок: 0, ответили: 1" in replies[2]
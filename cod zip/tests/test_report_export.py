@@ -0,0 +1,114 @@
+import asyncio
+import csv
+import io
+import os
+import zipfile
+import pytest
+from database import AsyncDatabase
+from report_export import MANIFEST_NAME, ArchiveTooLarge, ReportExporter, parse_export_args
+
+def fill_reports(db, tasks=3, files_per_task=4):
+    """Задания с файлами отчетов и получателями"""
+    for task in range(1, tasks + 1):
+        db.execute_query(
+            "INSERT INTO tasks (id, text, creator_id, created_at) VALUES (?, ?, 1, ?)",
+            (task, f"Задание {task}", f"2024-02-0{task} 10:00:00")
+        )
+        db.execute_query("INSERT INTO task_recipients (task_id, chat_id) VALUES (?, -100)", (task,))
+        for n in range(files_per_task):
+            db.execute_query(
+                "INSERT INTO task_media (task_id, file_id, file_type) VALUES (?, ?, 'document')",
+                (task, f"file-{task}-{n}")
+            )
+
+def run_export(db, tmp_path, download, concurrency=3, **filters):
+    async def run():
+        async_db = AsyncDatabase(db)
+        try:
+            exporter = ReportExporter(async_db, download, concurrency=concurrency, batch_size=5)
+            return await exporter.export(str(tmp_path / 'reports.zip'), **filters)
+        finally:
+            async_db.close()
+    return asyncio.run(run())
+
+def test_export_writes_files_and_manifest(temp_db, tmp_path):
+    """Проверка записи загруженных файлов и манифеста в архив"""
+    fill_reports(temp_db)
+    active = 0
+    peak = 0
+
+    async def download(file_id, path):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.001)
+        active -= 1
+        if file_id == 'file-2-1':
+            raise RuntimeError("файл недоступен")
+        with open(path, 'wb') as f:
+            f.write(file_id.encode() * 100)
+        return f"documents/{file_id}.txt"
+
+    stats = run_export(temp_db, tmp_path, download)
+    assert stats == {'files': 11, 'failed': 1}
+    assert peak <= 3
+
+    with zipfile.ZipFile(tmp_path / 'reports.zip') as archive:
+        names = archive.namelist()
+        assert len(names) == 12
+        assert archive.read('task_1/1_document.txt') == b'file-1-0' * 100
+        manifest = list(csv.DictReader(io.TextIOWrapper(archive.open(MANIFEST_NAME), encoding='utf-8-sig')))
+
+    assert len(manifest) == 12
+    failed, = [row for row in manifest if row['error']]
+    assert failed['file'] == '' and failed['task_id'] == '2'
+    assert {row['recipients'] for row in manifest} == {'1'}
+    assert {row['pending_recipients'] for row in manifest} == {'1'}
+
+def test_export_filters(temp_db, tmp_path):
+    """Проверка отбора файлов по заданию и диапазону дат"""
+    fill_reports(temp_db)
+
+    async def download(file_id, path):
+        open(path, 'wb').close()
+        return None
+
+    assert run_export(temp_db, tmp_path, download, **parse_export_args(['3']))['files'] == 4
+    assert run_export(temp_db, tmp_path, download, **parse_export_args(['2024-02-01', '2024-02-02']))['files'] == 8
+    assert parse_export_args([]) == {}
+    with pytest.raises(ValueError):
+        parse_export_args(['2024-02-02', '2024-02-01'])
+
+def test_export_stops_when_archive_exceeds_limit(temp_db, tmp_path):
+    """Проверка прерывания сборки, как только архив превышает max_size"""
+    fill_reports(temp_db, files_per_task=10)
+    downloads = []
+
+    async def download(file_id, path):
+        downloads.append(file_id)
+        with open(path, 'wb') as f:
+            f.write(os.urandom(10_000))
+        return f"documents/{file_id}.bin"
+
+    with pytest.raises(ArchiveTooLarge):
+        run_export(temp_db, tmp_path, download, max_size=25_000)
+    assert len(downloads) < 30
+
+def test_failed_download_removes_partial_file(temp_db, tmp_path):
+    """Проверка удаления частично загруженного файла при ошибке загрузки"""
+    fill_reports(temp_db, tasks=1, files_per_task=2)
+    paths = []
+
+    async def download(file_id, path):
+        if paths:
+            # Единственный загрузчик берет следующий файл после обработки ошибки
+            assert not os.path.exists(paths[0])
+        paths.append(path)
+        with open(path, 'wb') as f:
+            f.write(b'partial')
+        if len(paths) == 1:
+            raise ConnectionError("обрыв соединения")
+        return None
+
+    assert run_export(temp_db, tmp_path, download, concurrency=1) == {'files': 1, 'failed': 1}
+
@@ -0,0 +1,84 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+import pytest
+from telegram import Chat, Message, Update, User
+from telegram.ext import Application, ExtBot, MessageHandler, filters
+from update_processor import ChatOrderedUpdateProcessor
+
+HANDLER_DELAY = 0.05
+
+class OfflineBot(ExtBot):
+    """Бот без обращения к Bot API при инициализации"""
+    async def get_me(self, *args, **kwargs):
+        self._bot_user = User(1, 'Test', True, username='test_bot')
+        return self._bot_user
+
+def message_update(update_id, chat_id):
+    message = Message(
+        update_id, datetime.now(timezone.utc), Chat(chat_id, Chat.SUPERGROUP),
+        from_user=User(chat_id, 'User', False), text=f"сообщение {update_id}"
+    )
+    return Update(update_id, message=message)
+
+@pytest.mark.asyncio
+async def test_application_processes_chats_concurrently_in_order():
+    """Проверка Application: чаты обрабатываются параллельно, сообщения чата - по порядку"""
+    processor = ChatOrderedUpdateProcessor(16)
+    application = (
+        Application.builder()
+        .bot(OfflineBot('1:token'))
+        .updater(None)
+        .concurrent_updates(processor)
+        .build()
+    )
+    events = []
+
+    async def handler(update, context):
+        events.append(('start', update.effective_chat.id, update.update_id))
+        await asyncio.sleep(HANDLER_DELAY)
+        events.append(('end', update.effective_chat.id, update.update_id))
+
+    application.add_handler(MessageHandler(filters.TEXT, handler))
+    updates = [message_update(n, -100 - n % 4) for n in range(1, 13)]
+
+    async with application:
+        await application.start()
+        started = time.perf_counter()
+        for update in updates:
+            await application.update_queue.put(update)
+        while len(events) < 2 * len(updates):
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - started
+        await application.stop()
+
+    # 4 чата по 3 сообщения: три последовательных шага вместо двенадцати
+    assert elapsed < len(updates) * HANDLER_DELAY / 2
+    for chat_id in {update.effective_chat.id for update in updates}:
+        chat_events = [(kind, update_id) for kind, event_chat, update_id in events if event_chat == chat_id]
+        update_ids = sorted({update_id for _, update_id in chat_events})
+        assert chat_events == [(kind, update_id) for update_id in update_ids for kind in ('start', 'end')]
+    assert len(processor) == 0
+
+@pytest.mark.asyncio
+async def test_busy_chat_does_not_take_all_slots():
+    """Проверка: очередь одного чата не задерживает обновления другого чата"""
+    processor = ChatOrderedUpdateProcessor(2)
+    finished = {}
+
+    async def handle(update):
+        await asyncio.sleep(HANDLER_DELAY)
+        finished[update.update_id] = time.perf_counter()
+
+    burst = [message_update(n, -100) for n in range(1, 21)]
+    other = message_update(100, -200)
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(processor.process_update(update, handle(update))) for update in burst]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(processor.process_update(other, handle(other))))
+    await asyncio.gather(*tasks)
+
+    # Другой чат обрабатывается сразу, а не после двадцати обновлений первого
+    assert finished[100] - started < 3 * HANDLER_DELAY
+    assert [n for n in sorted(finished, key=finished.get) if n != 100] == list(range(1, 21))
+    assert len(processor) == 0
@@ -4,7 +4,12 @@ from utils import (
     is_valid_file_size,
     generate_report_id,
     format_report_info,
-    is_admin
+    is_admin,
+    reload_admin_ids,
+    ChatAdminCache,
+    setup_logging,
+    stop_logging,
+    SensitiveFormatter
 )
 
 def test_valid_report_format():
@@ -45,9 +50,181 @@ def test_format_report_info():
 
 def test_is_admin():
     """Проверка функции определения администратора"""
-    import os
     with pytest.MonkeyPatch.context() as m:
-        m.setenv('ADMIN_ID', '5171183387,123456')
+        m.setenv('ADMIN_ID', '5171183387, 123456,abc')
+        assert reload_admin_ids() == frozenset({5171183387, 123456})
         assert is_admin(5171183387) is True
         assert is_admin(123456) is True
         assert is_admin(999999) is False
+    reload_admin_ids()
+
+def test_chat_admin_cache_ttl():
+    """Проверка кэширования администраторов группы на время TTL"""
+    now = [0.0]
+    calls = []
+
+    def fetch(chat_id):
+        calls.append(chat_id)
+        if len(calls) == 3:
+            raise RuntimeError("Bot API недоступен")
+        return [1, 2]
+
+    cache = ChatAdminCache(fetch, ttl=60, clock=lambda: now[0])
+    assert cache.is_admin(-100, 1) is True
+    assert cache.is_admin(-100, 3) is False
+    assert calls == [-100]
+
+    now[0] = 61
+    assert cache.is_admin(-100, 2) is True
+    assert len(calls) == 2
+
+    # При ошибке запроса используется последний полученный список
+    now[0] = 122
+    assert cache.is_admin(-100, 1) is True
+    cache.invalidate(-100)
+    assert cache.is_admin(-100, 1) is True
+    assert len(calls) == 4
+
+@pytest.fixture
+def restore_root_logger():
+    """Восстановление корневого логгера после setup_logging"""
+    import logging
+    root_logger = logging.getLogger()
+    handlers, level = root_logger.handlers[:], root_logger.level
+    yield
+    stop_logging()
+    root_logger.handlers[:] = handlers
+    root_logger.setLevel(level)
+
+def test_setup_logging_json_lines(tmp_path, restore_root_logger):
+    """Проверка записи логов через очередь в формате JSON Lines"""
+    import json
+    import logging
+    log_file = tmp_path / 'logs' / 'bot.log'
+    setup_logging(str(log_file), json_lines=True, console=False)
+    logging.getLogger('test').info("Запрос %s", 42, extra={'duration_ms': 1.5})
+    stop_logging()
+
+    entry = json.loads(log_file.read_text(encoding='utf-8').splitlines()[-1])
+    assert entry['message'] == "Запрос 42"
+    assert entry['level'] == 'INFO'
+    assert entry['logger'] == 'test'
+    assert entry['duration_ms'] == 1.5
+
+def test_json_formatter_redacts_extra_fields():
+    """Проверка маскирования конфиденциальных данных в дополнительных полях JSON"""
+    import json
+    import logging
+    from utils import JsonFormatter
+    record = logging.LogRecord('test', logging.INFO, __file__, 1, "Запрос", None, None)
+    record.sql = "UPDATE settings SET value = 'x' WHERE key = 'api_key'; -- token=abc123"
+    record.params = ('user', {'password': 'qwerty'})
+    record.secret_token = 'abc123'
+    record.duration_ms = 1.5
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert 'abc123' not in entry['sql'] and 'token=[СКРЫТО]' in entry['sql']
+    assert 'qwerty' not in entry['params']
+    assert entry['secret_token'] == '[СКРЫТО]'
+    assert entry['duration_ms'] == 1.5
+
+def test_setup_logging_compresses_rotated_files(tmp_path, restore_root_logger):
+    """Проверка ротации по размеру со сжатием старых файлов"""
+    import gzip
+    import logging
+    log_file = tmp_path / 'bot.log'
+    setup_logging(str(log_file), max_bytes=500, backup_count=2, console=False)
+    for n in range(50):
+        logging.getLogger('test').warning("Сообщение номер %d", n)
+    stop_logging()
+
+    rotated = tmp_path / 'bot.log.1.gz'
+    assert rotated.exists()
+    assert not (tmp_path / 'bot.log.3.gz').exists()
+    assert 'Сообщение номер' in gzip.decompress(rotated.read_bytes()).decode('utf-8')
+
+def test_setup_logging_replaces_listener(tmp_path, restore_root_logger):
+    """Проверка повторной настройки: прежний обработчик останавливается, остановка идемпотентна"""
+    import logging
+    first = setup_logging(str(tmp_path / 'first.log'), console=False)
+    second = setup_logging(str(tmp_path / 'second.log'), console=False)
+    assert first._thread is None
+    logging.getLogger('test').warning("Сообщение")
+    stop_logging()
+    stop_logging()
+
+    assert second._thread is None
+    assert len(logging.getLogger().handlers) == 1
+    assert (tmp_path / 'first.log').read_text(encoding='utf-8') == ''
+    assert 'Сообщение' in (tmp_path / 'second.log').read_text(encoding='utf-8')
+
+def test_sensitive_formatter_redacts_values():
+    """Проверка маскирования значений конфиденциальных полей"""
+    import logging
+    formatter = SensitiveFormatter('%(message)s')
+
+    def render(msg, *args, exc_info=None):
+        return formatter.format(logging.LogRecord('test', logging.INFO, __file__, 1, msg, args or None, exc_info))
+
+    assert render("Подключение: db_password=qwerty, user=admin") == "Подключение: db_password=[СКРЫТО], user=admin"
+    assert render("Настройки: %s", {'api_key': 'sk-123'}) == "Настройки: {'api_key': '[СКРЫТО]'}"
+    assert render("Запрос %s", "https://api.telegram.org/bot123456:AAHdqTcvCH1vGWJxfSeofSAs0K5PALDsaw/getMe") == \
+        "Запрос https://api.telegram.org/bot123456:[СКРЫТО]/getMe"
+    assert render("BOT_TOKEN успешно загружен") == "BOT_TOKEN успешно загружен"
+    assert render("mypassword=abc") == "mypassword=abc"
+    # Повторная запись того же шаблона берет результат проверки из кэша
+    assert render("Пользователь %s в чате %s", 1, -100) == "Пользователь 1 в чате -100"
+    assert render("Пользователь %s в чате %s", 2, -100) == "Пользователь 2 в чате -100"
+
+    try:
+        raise ValueError("token=abc123")
+    except ValueError:
+        import sys
+        text = render("Ошибка", exc_info=sys.exc_info())
+    assert 'abc123' not in text
+    assert 'token=[СКРЫТО]' in text
+
+def test_sensitive_formatter_caches_templates(monkeypatch):
+    """Проверка кэша шаблонов: записи без аргументов и с числовыми аргументами, вытеснение LRU"""
+    import logging
+    import utils
+    monkeypatch.setattr(utils, '_REDACTION_CACHE_SIZE', 2)
+    formatter = SensitiveFormatter('%(message)s')
+
+    def render(msg, *args):
+        return formatter.format(logging.LogRecord('test', logging.INFO, __file__, 1, msg, args or None, None))
+
+    assert render("Ответ: token=abc123") == "Ответ: token=[СКРЫТО]"
+    assert render("Ответ: token=abc123") == "Ответ: token=[СКРЫТО]"
+    assert render("Ответ получен") == "Ответ получен"
+    assert formatter._cache == {"Ответ: token=abc123": False, "Ответ получен": True}
+    # Строковые аргументы проверяются в тексте и не кэшируются
+    assert render("Пользователь %s", "password=qwerty") == "Пользователь password=[СКРЫТО]"
+    assert list(formatter._cache) == ["Ответ: token=abc123", "Ответ получен"]
+
+    render("Пользователь %s", 1)
+    render("Чат %s", -100)
+    render("Пользователь %s", 2)
+    assert list(formatter._cache) == ["Чат %s", "Пользователь %s"]
+
+def test_setup_logging_redacts_before_queue(tmp_path, restore_root_logger):
+    """Проверка маскирования в QueueHandler до подстановки аргументов"""
+    import logging
+    log_file = tmp_path / 'bot.log'
+    setup_logging(str(log_file), console=False)
+    log = logging.getLogger('test')
+    log.info("Пользователь %s в чате %s", 1, -100)
+    log.info("Пользователь %s в чате %s", 2, -100)
+    log.warning("Подключение: api_key=%s", "sk-123")
+    try:
+        raise ValueError("token=abc123")
+    except ValueError:
+        log.exception("Ошибка запроса")
+    formatter = logging.getLogger().handlers[0].formatter
+    stop_logging()
+
+    text = log_file.read_text(encoding='utf-8')
+    assert "Пользователь 2 в чате -100" in text
+    assert "api_key=[СКРЫТО]" in text and 'sk-123' not in text
+    assert "token=[СКРЫТО]" in text and 'abc123' not in text
+    assert list(formatter._cache) == ["Пользователь %s в чате %s", "Ошибка запроса"]
@@ -0,0 +1,108 @@
+import pytest
+import json
+import urllib.error
+import urllib.request
+from webhook_server import WebhookServer
+
+SECRET = "test-secret"
+
+# Записанное обновление Telegram с командой /start
+START_UPDATE = {
+    "update_id": 100000001,
+    "message": {
+        "message_id": 1,
+        "from": {"id": 5171183387, "is_bot": False, "first_name": "Test", "username": "test_user"},
+        "chat": {"id": 5171183387, "first_name": "Test", "username": "test_user", "type": "private"},
+        "date": 1700000000,
+        "text": "/start",
+        "entities": [{"offset": 0, "length": 6, "type": "bot_command"}]
+    }
+}
+
+@pytest.fixture
+def webhook():
+    received = []
+    server = WebhookServer(received.append, SECRET, host='127.0.0.1', port=0)
+    thread = server.run_in_thread()
+    yield server, received
+    server.shutdown()
+    thread.join(5)
+
+def post(server, body, secret=SECRET, path='/webhook', method='POST'):
+    """Отправка запроса webhook, возвращает HTTP-статус"""
+    headers = {'Content-Type': 'application/json'}
+    if secret is not None:
+        headers['X-Telegram-Bot-Api-Secret-Token'] = secret
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{server.port}{path}", data=body, headers=headers, method=method
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+def test_recorded_update_delivered(webhook):
+    """Проверка передачи записанного обновления обработчику"""
+    server, received = webhook
+
+    assert post(server, json.dumps(START_UPDATE).encode()) == 200
+    assert received == [START_UPDATE]
+
+def test_wrong_secret_rejected(webhook):
+    """Проверка отклонения запросов с неверным секретом"""
+    server, received = webhook
+
+    assert post(server, json.dumps(START_UPDATE).encode(), secret='wrong') == 403
+    assert post(server, json.dumps(START_UPDATE).encode(), secret=None) == 403
+    assert received == []
+
+def test_invalid_requests(webhook):
+    """Проверка ответов на некорректные запросы"""
+    server, received = webhook
+
+    assert post(server, b'not json') == 400
+    assert post(server, json.dumps(START_UPDATE).encode(), path='/other') == 404
+    assert post(server, None, method='GET') == 405
+    assert received == []
+
+def test_secret_required():
+    """Проверка обязательности секретного токена"""
+    with pytest.raises(ValueError):
+        WebhookServer(lambda update: None, '')
+
+def raw_request(server, head):
+    """Отправка запроса без тела через сокет, возвращает HTTP-статус"""
+    import socket
+
+    with socket.create_connection(('127.0.0.1', server.port), timeout=5) as sock:
+        sock.sendall(head.encode('latin-1') + b'\r\n')
+        status_line = sock.makefile('rb').readline().decode('latin-1')
+    return int(status_line.split()[1])
+
+@pytest.mark.parametrize('header, status', [
+    ('Content-Length: abc', 400),
+    ('Content-Length: -5', 400),
+    ('Content-Length: 1_0', 400),
+    ('Transfer-Encoding: chunked', 400),
+    ('Content-Length: 99999999', 413),
+])
+def test_invalid_content_length(webhook, header, status):
+    """Проверка ответа 400/413 на некорректную или слишком большую длину тела"""
+    server, received = webhook
+
+    head = f"POST /webhook HTTP/1.1\r\nHost: localhost\r\nX-Telegram-Bot-Api-Secret-Token: {SECRET}\r\n{header}\r\n"
+    assert raw_request(server, head) == status
+    assert received == []
+
+@pytest.mark.parametrize('headers', [
+    'X-Long: ' + 'a' * 20_000 + '\r\n',
+    ''.join(f'X-Header-{n}: {"b" * 500}\r\n' for n in range(40)),
+    ''.join(f'X-Header-{n}: 1\r\n' for n in range(150)),
+])
+def test_oversized_headers_rejected(webhook, headers):
+    """Проверка ответа 431 на слишком длинные или многочисленные заголовки до проверки токена"""
+    server, received = webhook
+
+    assert raw_request(server, f"POST /webhook HTTP/1.1\r\nHost: localhost\r\n{headers}") == 431
+    assert received == []
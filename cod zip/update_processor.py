@@ -0,0 +1,68 @@
+"""
+Параллельная обработка обновлений python-telegram-bot с сохранением порядка внутри чата
+
+Обновления разных чатов обрабатываются одновременно (не больше
+max_concurrent_updates), а обновления одного чата - строго по очереди в
+порядке поступления, как ChatOrderedDispatcher в pyTelegramBotAPI.
+Обновление ждет своей очереди в чате до того, как занять слот обработки,
+поэтому очередь одного активного чата не расходует слоты остальных.
+"""
+import asyncio
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+def update_key(update: object) -> Optional[int]:
+    """Ключ упорядочивания обновления: ID чата, иначе ID пользователя"""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return None
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Обработчик обновлений: одновременно разные чаты, внутри чата - по очереди"""
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # Ключ -> [блокировка, число обновлений ключа в обработке или ожидании]
+        self._locks: Dict[int, list] = {}
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        """Обработка обновления: сначала очередь чата, затем слот из max_concurrent_updates"""
+        key = update_key(update)
+        if key is None:
+            async with self._semaphore:
+                await self.do_process_update(update, coroutine)
+            return
+
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            # asyncio.Lock пропускает ожидающих в порядке очереди
+            async with entry[0]:
+                async with self._semaphore:
+                    await self.do_process_update(update, coroutine)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
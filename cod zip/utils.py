@@ -1,35 +1,218 @@
 import os
+import atexit
+import gzip
+import json
+import queue
+import re
+import shutil
+import time
+from collections import OrderedDict
 from datetime import datetime
 from typing import Optional
 import logging
-from config import ALLOWED_REPORT_FORMATS, MAX_REPORT_SIZE
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from config import (
+    ADMIN_IDS, ALLOWED_REPORT_FORMATS, CHAT_ADMIN_CACHE_TTL, MAX_REPORT_SIZE, LOG_BACKUP_COUNT, LOG_FILE, LOG_FORMAT, LOG_JSON,
+    LOG_LEVEL, LOG_MAX_BYTES, LOG_ROTATE_WHEN
+)
 
 logger = logging.getLogger(__name__)
 
-def setup_logging():
-    """Настройка системы логирования"""
-    class SensitiveFormatter(logging.Formatter):
-        def __init__(self, fmt=None, datefmt=None):
-            super().__init__(fmt, datefmt)
-            self.sensitive_keys = ['bot_token', 'api_key', 'password']
-
-        def format(self, record):
-            message = super().format(record)
-            for key in self.sensitive_keys:
-                if key in message.lower():
-                    message = message.replace(getattr(record, 'msg', ''), '[СКРЫТО]')
-            return message
-
-    formatter = SensitiveFormatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Ключи, значения которых скрываются в логах
+SENSITIVE_KEYS = ('bot_token', 'token', 'api_key', 'password', 'secret', 'secret_token')
+REDACTED = '[СКРЫТО]'
+# Максимальное число кэшированных шаблонов сообщений (вытеснение LRU)
+_REDACTION_CACHE_SIZE = 1024
+# Аргументы, которые при подстановке в шаблон не могут содержать секретов
+_SAFE_ARG_TYPES = frozenset((int, float, bool, type(None)))
+
+def _case_insensitive(text: str) -> str:
+    return ''.join(f'[{c.lower()}{c.upper()}]' if c.isalpha() else re.escape(c) for c in text)
+
+def build_redaction_pattern(keys=SENSITIVE_KEYS) -> re.Pattern:
+    """Одно регулярное выражение для всех ключей и токенов Telegram
+
+    Выражение начинается с класса символов (первые буквы ключей и ':'), что
+    позволяет движку re быстро пропускать остальной текст. Флаг IGNORECASE
+    не используется: на кириллице он в несколько раз медленнее явных классов.
+    """
+    keys = sorted(keys, key=len, reverse=True)
+    first_chars = ''.join(sorted({c for key in keys for c in (key[0].lower(), key[0].upper())}))
+    # Первая буква уже поглощена классом, ветка ключа проверяет ее просмотром назад
+    rest = '|'.join(f'(?<={_case_insensitive(key[0])}){_case_insensitive(key[1:])}' for key in keys)
+    return re.compile(
+        rf'[{re.escape(first_chars)}:](?:'
+        # секретная часть токена бота 123456:ABC..., например в URL запроса к Bot API
+        r'(?<=\d{5}:)[\w-]{30,}'
+        # ключ=значение, ключ: значение, "ключ": "значение"; перед ключом допустим
+        # префикс через подчеркивание (db_password), но не буква или цифра
+        rf'|(?<![^\W_].)(?:{rest})["\']?\s*[:=]\s*["\']?(?P<value>[^\s"\'&,;}}]+))'
     )
 
-    handler = logging.StreamHandler()
-    handler.setFormatter(formatter)
+class SensitiveFormatter(logging.Formatter):
+    """Форматтер, скрывающий значения конфиденциальных полей
+
+    При redact_message=False текст сообщения не проверяется: так форматируются
+    записи, уже замаскированные перед постановкой в очередь (setup_logging).
+    """
+    def __init__(self, fmt=None, datefmt=None, sensitive_keys=SENSITIVE_KEYS, redact_message: bool = True):
+        super().__init__(fmt, datefmt)
+        self.sensitive_keys = list(sensitive_keys)
+        self.redact_message = redact_message
+        self._pattern = build_redaction_pattern(self.sensitive_keys)
+        # Шаблон сообщения (record.msg) -> в нем нет конфиденциальных данных
+        self._cache: OrderedDict = OrderedDict()
+
+    def redact(self, text: str) -> str:
+        """Замена значений конфиденциальных полей на REDACTED"""
+        return self._pattern.sub(self._replace, text)
+
+    @staticmethod
+    def _replace(match) -> str:
+        value_start = match.start('value')
+        if value_start < 0:
+            # Токен бота: идентификатор до ':' сохраняется
+            return ':' + REDACTED
+        return match.string[match.start():value_start] + REDACTED
+
+    def formatMessage(self, record):
+        if not self.redact_message:
+            return super().formatMessage(record)
+        args = record.args
+        if isinstance(record.msg, str) and (
+                not args or (isinstance(args, tuple) and _SAFE_ARG_TYPES.issuperset(map(type, args)))):
+            # Без аргументов или только числовые аргументы: секрет может находиться
+            # лишь в шаблоне, результат проверки шаблона кэшируется
+            if not self._is_clean_template(record.msg):
+                record.message = self.redact(record.message)
+        else:
+            # Строковые и прочие аргументы проверяются в готовом тексте
+            record.message = self.redact(record.message)
+        return super().formatMessage(record)
+
+    def _is_clean_template(self, template: str) -> bool:
+        clean = self._cache.get(template)
+        if clean is not None:
+            self._cache.move_to_end(template)
+            return clean
+        clean = self._cache[template] = self._pattern.search(template) is None
+        if len(self._cache) > _REDACTION_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return clean
+
+    def formatException(self, ei):
+        return self.redact(super().formatException(ei))
+
+# Стандартные атрибуты LogRecord, не попадающие в дополнительные поля JSON
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+class JsonFormatter(SensitiveFormatter):
+    """Форматтер JSON Lines: одна запись лога - один JSON-объект"""
+    def format(self, record):
+        message = super().format(record)
+        entry = {
+            'time': self.formatTime(record, self.datefmt),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': message,
+        }
+        # Структурированные поля из extra=... (например, sql и duration_ms)
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = self._redact_field(key, value)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+    def _redact_field(self, key: str, value):
+        """Значение дополнительного поля без конфиденциальных данных"""
+        if key.lower() in self.sensitive_keys:
+            return REDACTED
+        if isinstance(value, str):
+            return self.redact(value)
+        if type(value) in _SAFE_ARG_TYPES:
+            return value
+        # Параметры запроса, словари и объекты проверяются в сериализованном виде
+        text = json.dumps(value, ensure_ascii=False, default=str)
+        redacted = self.redact(text)
+        return value if redacted == text else redacted
+
+def _gzip_namer(name: str) -> str:
+    return name + '.gz'
+
+def _gzip_rotator(source: str, dest: str):
+    """Сжатие ротированного файла лога"""
+    with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+# Фоновый обработчик очереди логов, запущенный последним вызовом setup_logging
+_listener: Optional[QueueListener] = None
+
+def stop_logging():
+    """Остановка фонового обработчика логов с дозаписью очереди; повторный вызов ничего не делает"""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is None:
+        return
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+# Оставшиеся в очереди записи дописываются при завершении процесса
+atexit.register(stop_logging)
+
+def setup_logging(log_file: Optional[str] = LOG_FILE, level: str = LOG_LEVEL,
+                  max_bytes: int = LOG_MAX_BYTES, backup_count: int = LOG_BACKUP_COUNT,
+                  when: str = LOG_ROTATE_WHEN, json_lines: bool = LOG_JSON,
+                  console: bool = True) -> QueueListener:
+    """Настройка системы логирования
+
+    Потоки бота только помещают записи в очередь, файл и консоль обслуживает
+    фоновый QueueListener. Маскирование выполняет QueueHandler до подстановки
+    аргументов, пока доступен кэшируемый шаблон сообщения; фоновый поток лишь
+    оформляет готовый текст. Файл ротируется по размеру (или по времени, если
+    задан when), ротированные файлы сжимаются gzip. Обработчик предыдущего
+    вызова останавливается.
+    """
+    global _listener
+    stop_logging()
+    if json_lines:
+        # Дополнительные поля QueueHandler не изменяет, они маскируются при записи
+        formatter = JsonFormatter(redact_message=False)
+    else:
+        formatter = logging.Formatter(LOG_FORMAT)
+
+    handlers = []
+    if log_file:
+        log_dir = os.path.dirname(log_file)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        if when:
+            file_handler = TimedRotatingFileHandler(log_file, when=when, backupCount=backup_count,
+                                                    encoding='utf-8')
+        else:
+            file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count,
+                                               encoding='utf-8')
+        file_handler.namer = _gzip_namer
+        file_handler.rotator = _gzip_rotator
+        handlers.append(file_handler)
+    if console:
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listener = listener
 
     root_logger = logging.getLogger()
-    root_logger.setLevel(logging.INFO)
-    root_logger.addHandler(handler)
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.setLevel(level)
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.setFormatter(SensitiveFormatter())
+    root_logger.addHandler(queue_handler)
+    return listener
 
 def is_valid_report_format(filename: str) -> bool:
     """Проверка допустимого формата файла отчета"""
@@ -67,11 +250,69 @@ def format_report_info(report: dict) -> str:
         logger.error(f"Ошибка при форматировании информации отчета: {e}")
         return "Ошибка при получении информации об отчете"
 
+def parse_admin_ids(value: str) -> frozenset:
+    """Разбор списка ID администраторов, разделенных запятыми"""
+    admin_ids = set()
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            admin_ids.add(int(part))
+        except ValueError:
+            logger.error(f"Некорректный ID администратора: {part!r}")
+    return frozenset(admin_ids)
+
+# Неизменяемое множество администраторов бота, заменяется целиком в reload_admin_ids
+_admin_ids = frozenset()
+
+def reload_admin_ids() -> frozenset:
+    """Повторное чтение ID администраторов из ADMIN_ID и config.ADMIN_IDS"""
+    global _admin_ids
+    _admin_ids = parse_admin_ids(os.environ.get('ADMIN_ID', '')) | frozenset(ADMIN_IDS)
+    logger.info(f"Загружено администраторов: {len(_admin_ids)}")
+    return _admin_ids
+
 def is_admin(user_id: int) -> bool:
     """Проверка является ли пользователь администратором"""
-    try:
-        admin_ids = os.environ.get('ADMIN_ID', '').split(',')
-        return str(user_id) in admin_ids
-    except Exception as e:
-        logger.error(f"Ошибка при проверке прав администратора: {e}")
-        return False
\ No newline at end of file
+    return user_id in _admin_ids
+
+class ChatAdminCache:
+    """Администраторы групп из getChatAdministrators с ограниченным временем жизни
+
+    fetch(chat_id) возвращает ID администраторов чата. При ошибке запроса
+    используется последний полученный список.
+    """
+    def __init__(self, fetch, ttl: float = CHAT_ADMIN_CACHE_TTL, clock=time.monotonic):
+        self._fetch = fetch
+        self.ttl = ttl
+        self._clock = clock
+        # chat_id -> (время устаревания, frozenset ID администраторов)
+        self._entries = {}
+
+    def get(self, chat_id: int) -> frozenset:
+        """ID администраторов чата"""
+        entry = self._entries.get(chat_id)
+        now = self._clock()
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        try:
+            admin_ids = frozenset(self._fetch(chat_id))
+        except Exception as e:
+            logger.error(f"Ошибка при получении администраторов чата {chat_id}: {e}")
+            return entry[1] if entry is not None else frozenset()
+        self._entries[chat_id] = (now + self.ttl, admin_ids)
+        return admin_ids
+
+    def is_admin(self, chat_id: int, user_id: int) -> bool:
+        """Проверка является ли пользователь администратором чата"""
+        return user_id in self.get(chat_id)
+
+    def invalidate(self, chat_id: Optional[int] = None):
+        """Сброс кэша для одного чата или всех чатов"""
+        if chat_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(chat_id, None)
+
+reload_admin_ids()
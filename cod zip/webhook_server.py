@@ -0,0 +1,192 @@
+"""
+Встроенный асинхронный HTTP-приемник обновлений Telegram (webhook)
+
+Сервер принимает только HTTP без шифрования: в интернет его публикует
+обратный прокси с TLS (nginx, Caddy и т.п.), а сам сервер слушает локальный адрес.
+"""
+import asyncio
+import hmac
+import json
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Заголовок с секретом, который Telegram передает в каждом запросе webhook
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+# Максимальный размер тела запроса
+MAX_BODY_SIZE = 1024 * 1024
+# Ограничения строки запроса и заголовков: читаются до проверки секретного токена
+MAX_HEADER_SIZE = 16 * 1024
+MAX_HEADERS = 100
+# Время ожидания следующего запроса в keep-alive соединении (в секундах)
+KEEP_ALIVE_TIMEOUT = 75
+
+_REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    403: 'Forbidden',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    431: 'Request Header Fields Too Large',
+    500: 'Internal Server Error',
+}
+
+
+class WebhookServer:
+    """HTTP-сервер на asyncio, передающий обновления в обработчик on_update"""
+
+    def __init__(self, on_update: Callable[[Dict[str, Any]], None], secret_token: str,
+                 host: str = '0.0.0.0', port: int = 8443, path: str = '/webhook'):
+        if not secret_token:
+            raise ValueError("Для режима webhook необходим секретный токен")
+        self.on_update = on_update
+        self.secret_token = secret_token
+        self.host = host
+        self.port = port
+        self.path = path
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopped: Optional[asyncio.Event] = None
+        self._started = threading.Event()
+
+    async def start(self):
+        """Запуск сервера"""
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        # Строка длиннее limit не буферизуется: readline завершается ошибкой
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port, limit=MAX_HEADER_SIZE
+        )
+        # При port=0 система выбирает свободный порт
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Webhook сервер слушает {self.host}:{self.port}{self.path}")
+        self._started.set()
+
+    async def serve_forever(self):
+        """Запуск сервера и ожидание остановки"""
+        await self.start()
+        try:
+            await self._stopped.wait()
+        finally:
+            self._server.close()
+            await self._server.wait_closed()
+            logger.info("Webhook сервер остановлен")
+
+    def run(self):
+        """Блокирующий запуск сервера в текущем потоке"""
+        asyncio.run(self.serve_forever())
+
+    def shutdown(self):
+        """Потокобезопасная остановка сервера"""
+        if self._loop is not None and self._stopped is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+
+    def run_in_thread(self) -> threading.Thread:
+        """Запуск сервера в фоновом потоке, возвращает поток после старта"""
+        thread = threading.Thread(target=self.run, name='webhook-server', daemon=True)
+        thread.start()
+        self._started.wait()
+        return thread
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Обработка HTTP/1.1 соединения с поддержкой keep-alive"""
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), KEEP_ALIVE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if request is None:
+                    break
+
+                method, target, headers, body, rejected = request
+                if rejected is not None:
+                    status, keep_alive = rejected, False
+                else:
+                    status = self._dispatch(method, target, headers, body)
+                    keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write(self._response(status, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except Exception as e:
+            logger.error(f"Ошибка webhook соединения: {e}", exc_info=True)
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader
+                            ) -> Optional[Tuple[str, str, Dict[str, str], bytes, Optional[int]]]:
+        """Чтение одного HTTP-запроса; последний элемент - статус отказа без чтения тела"""
+        try:
+            request_line = await reader.readline()
+        except ValueError:
+            # Строка превысила лимит буфера (LimitOverrunError внутри readline)
+            return '', '', {}, b'', 431
+        if not request_line:
+            return None
+        parts = request_line.decode('latin-1').split(' ', 2)
+        if len(parts) != 3:
+            return None
+        method, target, _ = parts
+
+        headers = {}
+        size = len(request_line)
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                return method, target, headers, b'', 431
+            if line in (b'\r\n', b'\n', b''):
+                break
+            size += len(line)
+            if size > MAX_HEADER_SIZE or len(headers) >= MAX_HEADERS:
+                return method, target, headers, b'', 431
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        # Без корректной длины тело не отделить от следующего запроса, поэтому
+        # соединение закрывается; chunked-кодирование Telegram не использует
+        raw_length = headers.get('content-length', '0').strip()
+        if not (raw_length.isascii() and raw_length.isdigit()) or 'transfer-encoding' in headers:
+            return method, target, headers, b'', 400
+        length = int(raw_length)
+        if length > MAX_BODY_SIZE:
+            return method, target, headers, b'', 413
+        body = await reader.readexactly(length) if length else b''
+        return method, target, headers, body, None
+
+    def _dispatch(self, method: str, target: str, headers: Dict[str, str], body: bytes) -> int:
+        """Проверка запроса и передача обновления обработчику, возвращает HTTP-статус"""
+        if target.split('?', 1)[0] != self.path:
+            return 404
+        if method != 'POST':
+            return 405
+        received_token = headers.get(SECRET_HEADER, '').encode('latin-1')
+        if not hmac.compare_digest(received_token, self.secret_token.encode('utf-8')):
+            logger.warning("Отклонен webhook запрос с неверным секретным токеном")
+            return 403
+
+        try:
+            update = json.loads(body)
+        except ValueError:
+            return 400
+        if not isinstance(update, dict):
+            return 400
+
+        try:
+            self.on_update(update)
+        except Exception as e:
+            logger.error(f"Ошибка обработки webhook обновления: {e}", exc_info=True)
+            return 500
+        return 200
+
+    @staticmethod
+    def _response(status: int, keep_alive: bool) -> bytes:
+        """Формирование HTTP-ответа без тела"""
+        connection = 'keep-alive' if keep_alive else 'close'
+        return (f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+                f"Content-Length: 0\r\n"
+                f"Connection: {connection}\r\n\r\n").encode('latin-1')